@@ -0,0 +1,53 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.modules.face_recognition.face_gallery import FaceGallery
+from src.modules.face_recognition.face_index import IVFIndex, benchmark_index
+from src.modules.face_recognition.face_store import FaceEncodingStore
+
+def load_gallery_data(faces_dir):
+    matrix, _, _, _ = FaceEncodingStore(faces_dir).load()
+    return np.asarray(matrix, dtype=np.float32)
+
+def synthetic_gallery(base, size, seed=0):
+    """Nhân bản gallery thật (hoặc sinh ngẫu nhiên) lên kích thước mong muốn"""
+    rng = np.random.default_rng(seed)
+    if len(base) == 0:
+        centers = rng.normal(0, 0.1, (max(1, size // 5), 128)).astype(np.float32)
+    else:
+        centers = base
+    picks = rng.integers(0, len(centers), size)
+    return centers[picks] + rng.normal(0, 0.05, (size, 128)).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--faces-dir', default=str(PROJECT_ROOT / 'data' / 'faces'))
+    parser.add_argument('--size', type=int, default=None, help='Synthetic gallery size (default: real gallery)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    base = load_gallery_data(args.faces_dir)
+    matrix = synthetic_gallery(base, args.size) if args.size else base
+    ids = [str(i) for i in range(len(matrix))]
+
+    print('Index,NProbe,Size,Recall@1,ExactMs,IndexMs,Speedup,AvgCandidates')
+    for n_probe in args.nprobe:
+        gallery = FaceGallery(index=IVFIndex(n_probe=n_probe), index_min_size=1)
+        gallery.set(matrix, ids, ids)
+        r = benchmark_index(gallery, n_queries=args.queries)
+        if not r:
+            print('Gallery is empty')
+            return
+        print(f"{r['index']},{n_probe},{r['gallery_size']},{r['recall_at_1']:.3f},"
+              f"{r['exact_ms_per_query']:.3f},{r['index_ms_per_query']:.3f},{r['speedup']:.1f},{r['avg_candidates']:.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Camera Capture - Đọc camera độ trễ thấp, không trả frame cũ trong buffer driver
+"""
+
+import threading
+import time
+
+import cv2
+
+
+def fourcc_to_str(value):
+    """Giá trị CAP_PROP_FOURCC (float) -> chuỗi 4 ký tự, ví dụ 'MJPG'"""
+    code = int(value)
+    return ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00')
+
+
+class CameraCapture:
+    """
+    Thread grabber gọi grab() liên tục để buffer của driver luôn rỗng, chỉ retrieve()
+    (decode) frame mới nhất khi có consumer đang chờ. Mỗi frame kèm thời điểm grab
+    (time.monotonic) để các stage sau đo được tuổi của frame.
+    grab()/retrieve() chỉ được gọi trên thread grabber (VideoCapture không thread-safe).
+    Thiết bị chỉ được release sau khi thread grabber đã thoát; nếu grab() còn đang kẹt
+    (camera USB chậm / bị rút) thì chính thread grabber release khi grab() trả về.
+    """
+
+    def __init__(self, index=0, width=640, height=480, fps=30, fourcc='MJPG', buffer_size=1, max_failures=30):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.max_failures = max_failures
+        self.capture = None
+        self.negotiated = {}
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0
+        self._read_seq = 0
+        self._waiting = 0
+        self._thread = None
+        self._running = False
+        self._grabber_done = True
+        self._release_on_exit = False
+        self.stats = {'grabbed': 0, 'retrieved': 0, 'skipped': 0, 'failures': 0}
+
+    def open(self):
+        """Mở camera, cấu hình và chạy thread grabber. Returns: True nếu thành công"""
+        self.capture = cv2.VideoCapture(self.index)
+        if not self.capture.isOpened():
+            return False
+
+        # FOURCC trước kích thước: một số driver chỉ cho độ phân giải/FPS cao với MJPEG
+        if self.fourcc:
+            self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self.capture.set(cv2.CAP_PROP_FPS, self.fps)
+        buffer_ok = self.buffer_size > 0 and self.capture.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+
+        # Giá trị thực tế backend chấp nhận
+        self.negotiated = {
+            'fourcc': fourcc_to_str(self.capture.get(cv2.CAP_PROP_FOURCC)),
+            'width': int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': self.capture.get(cv2.CAP_PROP_FPS),
+            'buffer_size': int(self.capture.get(cv2.CAP_PROP_BUFFERSIZE)) if buffer_ok else None,
+        }
+
+        self._running = True
+        self._grabber_done = False
+        self._release_on_exit = False
+        self._thread = threading.Thread(target=self._grab_loop, name="camera-grabber", daemon=True)
+        self._thread.start()
+        return True
+
+    def is_opened(self):
+        return self._running and self.capture is not None and self.capture.isOpened()
+
+    def _grab_loop(self):
+        capture = self.capture
+        try:
+            self._grab_frames(capture)
+        finally:
+            with self._cond:
+                self._grabber_done = True
+                release = self._release_on_exit
+                self._cond.notify_all()
+            if release:
+                capture.release()
+
+    def _grab_frames(self, capture):
+        failures = 0
+        while self._running:
+            grabbed = capture.grab()
+            if not self._running:
+                break
+            if not grabbed:
+                failures += 1
+                self.stats['failures'] += 1
+                if failures >= self.max_failures:
+                    print("[CAMERA] Grab failed repeatedly, stopping grabber")
+                    self._running = False
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            timestamp = time.monotonic()
+            self.stats['grabbed'] += 1
+
+            with self._cond:
+                wanted = self._waiting > 0 or self._frame is None
+            if not wanted:
+                # Không ai chờ: bỏ qua, không tốn công decode
+                self.stats['skipped'] += 1
+                continue
+
+            ret, frame = capture.retrieve()
+            if not self._running:
+                break
+            if not ret:
+                continue
+            self.stats['retrieved'] += 1
+            with self._cond:
+                self._frame = frame
+                self._timestamp = timestamp
+                self._seq += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Frame mới hơn frame đã trả lần trước.
+        Returns: (frame, timestamp) hoặc (None, None) nếu hết timeout / camera dừng
+        """
+        with self._cond:
+            self._waiting += 1
+            try:
+                ready = self._cond.wait_for(lambda: self._seq > self._read_seq or not self._running, timeout)
+                if not ready or self._seq <= self._read_seq:
+                    return None, None
+                self._read_seq = self._seq
+                return self._frame, self._timestamp
+            finally:
+                self._waiting -= 1
+
+    def release(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        with self._cond:
+            capture, self.capture = self.capture, None
+            if capture is not None and not self._grabber_done:
+                # grab() vẫn đang kẹt: để thread grabber release khi nó thoát
+                print("[CAMERA] Grabber still blocked, device will be released when it returns")
+                self._release_on_exit = True
+                capture = None
+        if capture is not None:
+            capture.release()
@@ -28,13 +28,64 @@ FACE_RECOGNITION_TOLERANCE = float(os.getenv('FACE_RECOGNITION_TOLERANCE', 0.55)
 FACE_RECOGNITION_MODEL = os.getenv('FACE_RECOGNITION_MODEL', 'hog')  # set 'cnn' via env for higher accuracy
 FACE_MATCH_MARGIN = float(os.getenv('FACE_MATCH_MARGIN', 0.06))
 STRICT_FOLDER_EXISTENCE = os.getenv('STRICT_FOLDER_EXISTENCE', 'true').lower() == 'true'
+IDENTITY_POLL_INTERVAL = float(os.getenv('IDENTITY_POLL_INTERVAL', 2.0))  # Giây giữa các lần kiểm tra thư mục faces (khi không có inotify)
 MIN_FACE_DISTANCE = float(os.getenv('MIN_FACE_DISTANCE', 100))  # Khoảng cách tối thiểu giữa 2 khuôn mặt (pixels)
+FACE_NMS_IOU = float(os.getenv('FACE_NMS_IOU', 0.4))  # IoU tối đa giữa 2 box detect trước khi bị coi là trùng
 MIN_CONFIDENCE_THRESHOLD = float(os.getenv('MIN_CONFIDENCE_THRESHOLD', 0.50))  # 0.50 = lỏng hơn để dễ nhận diện
 MIN_FACE_SIZE = int(os.getenv('MIN_FACE_SIZE', 80))  # Kích thước tối thiểu của khuôn mặt (pixels)
 FACE_DETECTION_UPSAMPLE = int(os.getenv('FACE_DETECTION_UPSAMPLE', 1))  # Số lần upsample khi detect (1=nhanh, 2=chính xác hơn)
+FACE_DETECTION_SCALE = float(os.getenv('FACE_DETECTION_SCALE', 0.5))  # Tỉ lệ resize frame khi quét toàn frame
+FACE_FULL_SCAN_INTERVAL = max(1, int(os.getenv('FACE_FULL_SCAN_INTERVAL', 10)))  # Quét toàn frame mỗi K frame, còn lại chỉ quét ROI
+FACE_ROI_EXPAND = float(os.getenv('FACE_ROI_EXPAND', 0.5))  # Nới rộng box cũ (theo kích thước box) mỗi phía để làm ROI
+FACE_ROI_SCALE = float(os.getenv('FACE_ROI_SCALE', 1.0))  # Tỉ lệ resize ROI (1.0 = độ phân giải gốc)
+FACE_ROI_MOTION_THRESHOLD = float(os.getenv('FACE_ROI_MOTION_THRESHOLD', 0.01))  # Tỉ lệ pixel chuyển động ngoài ROI để quét toàn frame
 ENABLE_PREPROCESSING = os.getenv('ENABLE_PREPROCESSING', 'false').lower() == 'true'  # Tắt preprocessing mặc định
+PREPROCESS_MODE = os.getenv('PREPROCESS_MODE', 'fast').lower()  # fast (LUT + CLAHE + khử nhiễu cục bộ) | full (NLM toàn frame, chậm)
+PREPROCESS_DENOISE = os.getenv('PREPROCESS_DENOISE', 'roi').lower()  # roi (chỉ quanh khuôn mặt) | downscale | off
+PREPROCESS_DENOISE_SCALE = float(os.getenv('PREPROCESS_DENOISE_SCALE', 0.5))  # Tỉ lệ thu nhỏ khi denoise='downscale'
 FACE_CHANGE_THRESHOLD = float(os.getenv('FACE_CHANGE_THRESHOLD', 0.55))  # Ngưỡng để xác định người KHÁC (distance)
 
+# Face quality gate (không encode crop kém chất lượng)
+FACE_QUALITY_ENABLED = os.getenv('FACE_QUALITY_ENABLED', 'true').lower() == 'true'
+FACE_QUALITY_MIN_SHARPNESS = float(os.getenv('FACE_QUALITY_MIN_SHARPNESS', 40.0))  # Phương sai Laplacian tối thiểu (crop 96x96)
+FACE_QUALITY_MIN_BRIGHTNESS = float(os.getenv('FACE_QUALITY_MIN_BRIGHTNESS', 40))  # Độ sáng trung bình crop
+FACE_QUALITY_MAX_BRIGHTNESS = float(os.getenv('FACE_QUALITY_MAX_BRIGHTNESS', 220))
+FACE_QUALITY_MIN_SIZE = int(os.getenv('FACE_QUALITY_MIN_SIZE', MIN_FACE_SIZE))  # Cạnh nhỏ nhất của box để encode
+FACE_QUALITY_MAX_YAW = float(os.getenv('FACE_QUALITY_MAX_YAW', 35))  # Góc quay tối đa (độ) từ landmark, 0 = không kiểm tra
+
+# Face search index settings
+FACE_INDEX_TYPE = os.getenv('FACE_INDEX_TYPE', 'auto').lower()  # auto | exact | ivf
+FACE_INDEX_MIN_SIZE = int(os.getenv('FACE_INDEX_MIN_SIZE', 20000))  # Dưới ngưỡng này (auto) vẫn quét chính xác toàn bộ
+FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', 8))  # Số cụm IVF được quét cho mỗi query
+FACE_PROTOTYPE_PRUNING = os.getenv('FACE_PROTOTYPE_PRUNING', 'true').lower() == 'true'  # Loại cả người theo centroid/bán kính trước khi quét sample
+FACE_JOURNAL_COMPACT_EVERY = int(os.getenv('FACE_JOURNAL_COMPACT_EVERY', 200))  # Gộp journal encoding vào snapshot sau N record (0 = không tự gộp)
+FACE_REBUILD_WORKERS = int(os.getenv('FACE_REBUILD_WORKERS', 0))  # Số process khi build lại gallery từ ảnh (0 = số CPU)
+FACE_HOT_SET_SIZE = int(os.getenv('FACE_HOT_SET_SIZE', 64))  # Số người vừa gặp được so khớp trước gallery (0 = tắt)
+FACE_HOT_SET_TTL = float(os.getenv('FACE_HOT_SET_TTL', 300))  # Giây giữ một người trong hot set kể từ lần gặp cuối
+FACE_HOT_SET_DISTANCE = float(os.getenv('FACE_HOT_SET_DISTANCE', 0.45))  # Distance tối đa để tin kết quả hot set (chặt hơn tolerance)
+
+# Face tracking settings
+FACE_TRACKING_ENABLED = os.getenv('FACE_TRACKING_ENABLED', 'true').lower() == 'true'  # Identity đi theo track, không encode lại mỗi frame
+FACE_TRACK_REENCODE_INTERVAL = int(os.getenv('FACE_TRACK_REENCODE_INTERVAL', 10))  # Encode lại sau N frame
+FACE_TRACK_IOU_THRESHOLD = float(os.getenv('FACE_TRACK_IOU_THRESHOLD', 0.3))  # IoU tối thiểu để ghép box vào track
+FACE_TRACK_REENCODE_IOU = float(os.getenv('FACE_TRACK_REENCODE_IOU', 0.5))  # IoU thấp hơn => track kém tin cậy, encode lại
+FACE_TRACK_MAX_MISSES = int(os.getenv('FACE_TRACK_MAX_MISSES', 5))  # Số frame mất dấu trước khi xóa track
+FACE_TRACKER_BACKEND = os.getenv('FACE_TRACKER_BACKEND', 'none').lower()  # none | kcf | csrt | mosse | mil (OpenCV correlation tracker)
+FACE_DETECT_INTERVAL = max(1, int(os.getenv('FACE_DETECT_INTERVAL', 1)))  # Với OpenCV tracker: chỉ detect mỗi N frame (chỉ khi không dùng worker pool)
+
+# Face worker processes (detect + encode song song trên nhiều CPU core)
+FACE_WORKER_PROCESSES = int(os.getenv('FACE_WORKER_PROCESSES', 0))  # 0 = tắt, chạy trong process chính
+FACE_WORKER_TIMEOUT = float(os.getenv('FACE_WORKER_TIMEOUT', 10.0))  # Giây chờ kết quả một frame trước khi bỏ qua
+
+# Motion gating settings (bỏ qua face pipeline khi cảnh không đổi)
+MOTION_GATING_ENABLED = os.getenv('MOTION_GATING_ENABLED', 'true').lower() == 'true'
+MOTION_MODE = os.getenv('MOTION_MODE', 'diff').lower()  # diff (frame differencing) | background (running average)
+MOTION_PIXEL_THRESHOLD = int(os.getenv('MOTION_PIXEL_THRESHOLD', 25))  # Chênh lệch mức xám để coi là pixel thay đổi
+MOTION_GATE_THRESHOLD = float(os.getenv('MOTION_GATE_THRESHOLD', 0.005))  # Tỉ lệ pixel thay đổi để coi là có chuyển động
+MOTION_BACKGROUND_ALPHA = float(os.getenv('MOTION_BACKGROUND_ALPHA', 0.05))  # Tốc độ cập nhật background model
+MOTION_HOLD_SEC = float(os.getenv('MOTION_HOLD_SEC', 1.0))  # Tiếp tục nhận diện sau khi hết chuyển động
+MOTION_REFRESH_SEC = float(os.getenv('MOTION_REFRESH_SEC', 5.0))  # Làm mới định kỳ khi cảnh đứng yên (0 = tắt)
+
 # Voice recognition settings
 VOICE_CONFIDENCE_THRESHOLD = float(os.getenv('VOICE_CONFIDENCE_THRESHOLD', 0.7))
 VOICE_PROCESSING_INTERVAL = 0.2  # seconds
@@ -58,9 +109,28 @@ USE_GOOGLE_CLOUD_VOICE = os.getenv('USE_GOOGLE_CLOUD_VOICE', 'false').lower() ==
 UI_WINDOW_NAME = os.getenv('UI_WINDOW_NAME', 'AI Receptionist')
 UI_WINDOW_WIDTH = int(os.getenv('UI_WINDOW_WIDTH', 800))
 UI_WINDOW_HEIGHT = int(os.getenv('UI_WINDOW_HEIGHT', 600))
+HEADLESS = os.getenv('HEADLESS', 'false').lower() == 'true'  # Không dùng cv2.imshow/waitKey (máy không gắn màn hình)
+
+# Live view qua HTTP (MJPEG + JSON status + lệnh điều khiển), mặc định bật khi HEADLESS
+LIVE_VIEW_ENABLED = os.getenv('LIVE_VIEW_ENABLED', str(HEADLESS)).lower() == 'true'
+LIVE_VIEW_HOST = os.getenv('LIVE_VIEW_HOST', '127.0.0.1')  # '0.0.0.0' để xem từ máy khác trong mạng
+LIVE_VIEW_PORT = int(os.getenv('LIVE_VIEW_PORT', 8080))
+LIVE_VIEW_MAX_FPS = float(os.getenv('LIVE_VIEW_MAX_FPS', 10))  # Giới hạn số lần encode JPEG mỗi giây
+LIVE_VIEW_JPEG_QUALITY = int(os.getenv('LIVE_VIEW_JPEG_QUALITY', 80))
+LIVE_VIEW_TOKEN = os.getenv('LIVE_VIEW_TOKEN', '')  # Token cho POST /command (header X-Auth-Token); bắt buộc khi HOST không phải loopback
 
 # Performance settings
-TARGET_FPS = int(os.getenv('TARGET_FPS', 60))  # Target FPS for smoother performance
+TARGET_FPS = int(os.getenv('TARGET_FPS', 60))  # Target FPS for smoother performance (nhịp hiển thị và FPS yêu cầu camera)
+RECOGNITION_FPS = float(os.getenv('RECOGNITION_FPS', 10))  # Nhịp nhận diện bình thường
+RECOGNITION_FPS_MIN = float(os.getenv('RECOGNITION_FPS_MIN', 3))  # Khi chỉ có người quen đã ổn định
+RECOGNITION_FPS_MAX = float(os.getenv('RECOGNITION_FPS_MAX', 30))  # Khi đang đăng ký hoặc có track mới (0 = không giới hạn)
+RECOGNITION_BOOST_SEC = float(os.getenv('RECOGNITION_BOOST_SEC', 2.0))  # Giữ nhịp cao bao lâu sau khi có track mới
+RECOGNITION_SETTLE_SEC = float(os.getenv('RECOGNITION_SETTLE_SEC', 3.0))  # Tập track không đổi bao lâu thì coi là ổn định
+FPS_REPORT_INTERVAL = float(os.getenv('FPS_REPORT_INTERVAL', 60))  # Giây giữa các lần log FPS đạt được (0 = chỉ log khi thoát)
+RENDER_INTERPOLATION = os.getenv('RENDER_INTERPOLATION', 'true').lower() == 'true'  # Dự đoán vị trí box giữa các lần nhận diện (vận tốc không đổi)
+RENDER_MAX_EXTRAPOLATION = float(os.getenv('RENDER_MAX_EXTRAPOLATION', 0.5))  # Giây tối đa ngoại suy box sau kết quả cuối
+CAMERA_FOURCC = os.getenv('CAMERA_FOURCC', 'MJPG')  # Định dạng yêu cầu camera ('' = mặc định của driver)
+CAMERA_BUFFER_SIZE = int(os.getenv('CAMERA_BUFFER_SIZE', 1))  # Số frame buffer trong driver (0 = không đặt)
 
 # Greeting messages
 GREETINGS = {
@@ -10,6 +10,7 @@ import uuid
 import os
 from pathlib import Path
 from ..core.config import FACES_DIR, VOICES_DIR
+from ..utils.frame import as_frame
 
 
 class InlineRegistration:
@@ -149,14 +150,15 @@ class InlineRegistration:
         if current_time - self._last_capture_time < 1.2:  # Cooldown 1.2s (nhanh hơn)
             return
         
-        # Phát hiện khuôn mặt
+        # Phát hiện khuôn mặt (dùng lại view RGB thu nhỏ của frame nếu đã có)
+        frame = as_frame(frame)
         faces = self.face_module.detect_faces(frame)
         
         if faces and len(faces) > 0:
             # Lưu ảnh
             timestamp = int(time.time())
             image_path = self.user_dir / f"{timestamp}.jpg"
-            success = cv2.imwrite(str(image_path), frame)
+            success = cv2.imwrite(str(image_path), frame.image)
             
             if not success:
                 self.logger.error(f"Loi luu anh: {image_path}")
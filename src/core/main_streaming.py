@@ -14,12 +14,21 @@ from pathlib import Path
 from .config import *
 from ..utils.logger import setup_logger, Logger
 from ..modules.face_recognition.face_recognition_module import FaceRecognitionModule
+from ..modules.face_recognition.motion_detector import MotionDetector, MotionGate
 from ..modules.voice_recognition.voice_recognition_module import VoiceRecognitionModule
 from ..modules.tts.streaming_tts_module import StreamingTTSModule
 from ..modules.ai_chatbot.ai_chatbot_integration import AIReceptionistChatbot  # AI Chatbot
 from ..ui.ui import UI as ReceptionistUI
-from ..utils.utils import load_face_encodings, load_voice_patterns, resize_image, draw_text_with_background
+from ..ui.result_interpolator import ResultInterpolator
+from ..ui.live_view import LiveViewServer
+from ..utils.utils import load_voice_patterns, resize_image, draw_text_with_background
+from ..utils.frame import Frame, frame_stats
+from ..utils.text_renderer import default_renderer
+from ..utils.buffer_pool import display_buffers
 from .inline_registration import InlineRegistration
+from .pipeline import FramePipeline
+from .camera_capture import CameraCapture
+from .scheduler import FrameScheduler
 
 class StreamingAIReceptionist:
     """AI Receptionist với Streaming TTS và AI Chatbot"""
@@ -37,14 +46,14 @@ class StreamingAIReceptionist:
         # Sử dụng AI Chatbot với Streaming TTS
         self.ai_chatbot = AIReceptionistChatbot(tts_engine="auto")
         
-        # UI
-        self.ui = ReceptionistUI()
+        # UI (headless: không dùng HighGUI, chỉ compose overlay khi có người xem qua live view)
+        self.ui = ReceptionistUI(headless=HEADLESS)
+        self.live_view = None
         
         # Inline Registration Module
         self.registration = InlineRegistration(self.face_module, self.voice_module, self.system_logger, self.ui)
         
-        # Load data
-        self.face_encodings = load_face_encodings()
+        # Load data (face encodings đã được face_module load một lần, dùng chung)
         self.voice_patterns = load_voice_patterns()
         
         # State
@@ -73,25 +82,69 @@ class StreamingAIReceptionist:
         self.last_greet_log_time = 0.0
         self.unknown_debounce_sec = 2.0
         
+        # Motion gating: chỉ chạy face pipeline khi cảnh thay đổi
+        self.motion_gate = None
+        if MOTION_GATING_ENABLED:
+            self.motion_gate = MotionGate(
+                MotionDetector(
+                    pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                    mode=MOTION_MODE,
+                    background_alpha=MOTION_BACKGROUND_ALPHA
+                ),
+                threshold=MOTION_GATE_THRESHOLD,
+                hold_sec=MOTION_HOLD_SEC,
+                refresh_sec=MOTION_REFRESH_SEC
+            )
+        self.last_faces = []  # Kết quả gần nhất, dùng lại khi frame bị bỏ qua
+        
         # Camera
         self.camera = None
         
+        # Pipeline capture / recognition / render (khởi tạo trong run)
+        self.pipeline = None
+        self.state_lock = threading.RLock()  # Bảo vệ trạng thái nhận diện giữa recognition stage và phím tắt
+        
+        # Nhịp hiển thị (TARGET_FPS) và nhịp nhận diện thích ứng
+        self.scheduler = FrameScheduler(
+            target_fps=TARGET_FPS,
+            recognition_fps=RECOGNITION_FPS,
+            min_fps=RECOGNITION_FPS_MIN,
+            max_fps=RECOGNITION_FPS_MAX,
+            boost_sec=RECOGNITION_BOOST_SEC,
+            settle_sec=RECOGNITION_SETTLE_SEC
+        )
+        self.last_fps_report = time.time()
+        
+        # Box được dự đoán tới thời điểm của frame đang render, nên UI mượt dù nhận diện chậm hơn hiển thị
+        if RENDER_INTERPOLATION:
+            self.result_interpolator = ResultInterpolator(max_extrapolation=RENDER_MAX_EXTRAPOLATION)
+        else:
+            self.result_interpolator = ResultInterpolator(alpha=1.0, beta=0.0, max_extrapolation=0.0)
+        self._submitted_at = {}  # seq của worker pool -> thời điểm chụp frame
+        
         self.system_logger.info("Streaming AI Receptionist initialized")
     
     def start_camera(self):
         """Khởi động camera"""
         try:
-            self.camera = cv2.VideoCapture(0)
-            if not self.camera.isOpened():
+            if self.camera:
+                self.camera.release()
+            # Thread grabber luôn giữ frame mới nhất, buffer driver 1 frame, MJPEG nếu camera hỗ trợ
+            self.camera = CameraCapture(
+                index=0, width=640, height=480, fps=TARGET_FPS,
+                fourcc=CAMERA_FOURCC, buffer_size=CAMERA_BUFFER_SIZE
+            )
+            if not self.camera.open():
                 self.system_logger.error("Khong the mo camera")
                 return False
             
-            # Cấu hình camera
-            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            self.camera.set(cv2.CAP_PROP_FPS, 60)
-            
-            self.system_logger.info("📹 Camera đã sẵn sàng")
+            negotiated = self.camera.negotiated
+            self.system_logger.info(
+                f"📹 Camera đã sẵn sàng: {negotiated['width']}x{negotiated['height']} @ {negotiated['fps']:.0f} fps, "
+                f"fourcc={negotiated['fourcc'] or '?'}, buffer={negotiated['buffer_size']}"
+            )
+            if CAMERA_FOURCC and negotiated['fourcc'] != CAMERA_FOURCC:
+                self.system_logger.info(f"Camera không nhận fourcc {CAMERA_FOURCC}, dùng {negotiated['fourcc'] or 'mặc định'}")
             return True
             
         except Exception as e:
@@ -99,11 +152,12 @@ class StreamingAIReceptionist:
             return False
 
     
-    def process_face_recognition(self, frame):
+    def process_face_recognition(self, frame, faces_with_encodings=None):
         """Xử lý nhận diện khuôn mặt với logic: chỉ đăng ký khi có người KHÁC xuất hiện"""
         try:
-            # Detect faces và lấy encodings
-            faces_with_encodings = self.face_module.detect_faces_with_encodings(frame)
+            # Detect faces và lấy encodings (worker pool đã detect sẵn thì dùng luôn)
+            if faces_with_encodings is None:
+                faces_with_encodings = self.face_module.detect_faces_with_encodings(frame)
             
             if not faces_with_encodings:
                 # Không có khuôn mặt nào - không reset current_face
@@ -118,7 +172,6 @@ class StreamingAIReceptionist:
             unknown_faces = [face for face in faces if face.get('person_id', 'unknown') == 'unknown']
             self.metrics['face']['known'] += len(known_faces)
             self.metrics['face']['unknown'] += len(unknown_faces)
-            self.ui.update_recognition_results(faces)
             
             now = time.time()
             
@@ -357,25 +410,28 @@ class StreamingAIReceptionist:
 
     
     def reload_face_encodings(self):
-        """Reload face encodings sau khi có người dùng mới đăng ký"""
+        """Reload face encodings sau khi có người dùng mới đăng ký (chỉ áp dụng phần thay đổi)"""
         log_msg = "🔄 Đang reload face encodings..."
         self.system_logger.info(log_msg)
         self.ui.add_log_message(log_msg)
         
-        old_count = len(self.face_module.known_face_encodings)
-        self.face_module.load_known_faces()
+        changes = self.face_module.reload_changes()
+        affected = changes['persons']
         new_count = len(self.face_module.known_face_encodings)
         
-        if new_count > old_count:
-            msg = f"✅ Reload thành công! +{new_count - old_count} người dùng"
+        if affected:
+            msg = f"✅ Reload thành công! {len(affected)} người dùng thay đổi, +{changes['added']} encodings"
         else:
-            msg = f"✅ Reload xong. Tổng: {new_count} người dùng"
+            msg = f"✅ Reload xong. Tổng: {new_count} encodings"
         
         self.system_logger.info(msg)
         self.ui.add_log_message(msg)
         
-        # Reset trạng thái để nhận diện lại
-        self.greeted_people.clear()
+        # Chỉ reset trạng thái chào của những người bị ảnh hưởng
+        self.greeted_people -= affected
+        if self.current_person_id in affected:
+            self.current_face_encoding = None
+            self.current_person_id = None
         self.unknown_person_notified = False
         self.last_known_seen_time = 0
     
@@ -414,116 +470,50 @@ class StreamingAIReceptionist:
         voice_thread = threading.Thread(target=self._voice_worker, daemon=True)
         voice_thread.start()
         
+        # Pipeline: capture và recognition chạy trên thread riêng, main thread chỉ render
+        self.pipeline = FramePipeline(self._read_camera_frame, self._recognition_step, scheduler=self.scheduler)
+        self.pipeline.start()
+        
+        # Live view HTTP: MJPEG + status + lệnh thay phím tắt
+        if LIVE_VIEW_ENABLED:
+            self.live_view = LiveViewServer(
+                host=LIVE_VIEW_HOST,
+                port=LIVE_VIEW_PORT,
+                max_fps=LIVE_VIEW_MAX_FPS,
+                jpeg_quality=LIVE_VIEW_JPEG_QUALITY,
+                status_provider=self._live_status,
+                token=LIVE_VIEW_TOKEN
+            )
+            if self.live_view.start():
+                self.system_logger.info(f"Live view: http://{LIVE_VIEW_HOST}:{LIVE_VIEW_PORT}/")
+            else:
+                self.live_view = None
+        
         try:
             while self.running:
-                # Kiểm tra camera có hoạt động không
-                if not self.camera or not self.camera.isOpened():
-                    self.system_logger.warning("⚠️ Camera không hoạt động, đang restart...")
-                    if not self.start_camera():
-                        self.system_logger.error("❌ Không thể restart camera!")
-                        time.sleep(1)
-                    continue
-                
-                # Đọc frame từ camera
-                ret, frame = self.camera.read()
-                if not ret:
-                    self.system_logger.warning("⚠️ Không đọc được frame từ camera")
-                    time.sleep(0.1)
-                    continue
-                
-                # Xử lý face recognition
-                faces = self.process_face_recognition(frame)
+                frame = self.pipeline.next_render_frame()
+                wait_ms = 1
                 
-                # Xử lý đăng ký nếu đang active
-                if self.registration.is_active:
-                    should_cancel = self.registration.process(frame, faces)
-                    if should_cancel:
-                        # Phát hiện người quen -> Hủy đăng ký
-                        known_face = max([f for f in faces if f.get('person_id', 'unknown') != 'unknown'], 
-                                       key=lambda x: x.get('confidence', 0))
-                        cancel_msg = f"Xin chào {known_face['name']}! Hủy đăng ký và chuyển sang nhận diện bạn."
-                        self.ai_chatbot.tts.speak_immediate(cancel_msg)
-                        self.registration.cancel()
-                        # Cập nhật current face
-                        if 'encoding' in known_face:
-                            self._update_current_face(known_face['encoding'], known_face['person_id'])
-                        if known_face['person_id'] not in self.greeted_people:
-                            self.greeted_people.add(known_face['person_id'])
-                            self.metrics['greetings']['known'] += 1
+                if frame is not None:
+                    # Kiểm tra idle timeout
+                    self.check_idle_timeout()
                     
-                    # Kiểm tra nếu hoàn tất
-                    if self.registration.state:
-                        # Hoàn tất nếu đã chụp đủ ảnh (bỏ qua ghi âm nếu cần)
-                        if self.registration.state['step'] == 'capture_face' and self.registration.state['face_count'] >= self.registration.state['max_faces']:
-                            # Chuyển sang ghi âm
-                            pass  # Đã xử lý trong _process_face_capture
-                        
-                        # Xử lý trạng thái completed (sau khi chụp đủ 5 ảnh)
-                        elif self.registration.state['step'] == 'completed':
-                            if self.registration.complete():
-                                time.sleep(2)
-                                # Reload và reset
-                                self.reload_face_encodings()
-                                self.registration.reset()
-                                self.current_face_encoding = None
-                                self.current_person_id = None
-                                self.greeted_people.clear()
-                
-                # Kiểm tra idle timeout
-                self.check_idle_timeout()
-                
-                # Hiển thị UI
-                self.ui.update_frame(frame)
-                
-                # Xử lý input từ UI
-                text_input = self.ui.get_text_input()
-                if text_input:
-                    self.handle_text_input(text_input)
-                
-                # Hiển thị UI với overlay
-                self.ui.render()
+                    # Xử lý input từ UI
+                    text_input = self.ui.get_text_input()
+                    if text_input:
+                        self.handle_text_input(text_input)
+                    
+                    # Hiển thị UI với overlay (kết quả nhận diện mới nhất, box dự đoán tới thời điểm frame này)
+                    self._render(frame)
+                    
+                    # Chờ tới tick hiển thị kế tiếp (giữ TARGET_FPS)
+                    wait_ms = self.scheduler.render_wait_ms()
+                    self._report_fps()
                 
-                # Kiểm tra phím thoát
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q') or key == 27:  # 'q' hoặc ESC
+                # Kiểm tra phím / lệnh HTTP
+                key = self._next_key(wait_ms)
+                if not self._handle_key(key):
                     break
-                elif key == ord('s'):  # 's' để dừng giọng nói
-                    self.ai_chatbot.tts.stop_current_speech()
-                elif key == ord('h'):  # 'h' để help
-                    help_msg = "Phím tắt: Q=Thoát, S=Dừng giọng, H=Trợ giúp, R=Reload, C=Clear cache"
-                    self.ai_chatbot.tts.speak_immediate(help_msg)
-                elif key == ord('r'):  # 'r' để reload
-                    self.reload_face_encodings()
-                    msg = "Đã reload danh sách người dùng"
-                    self.ai_chatbot.tts.speak_immediate(msg)
-                elif key == ord('c'):  # 'c' để clear cache
-                    self.current_face_encoding = None
-                    self.current_person_id = None
-                    self.greeted_people.clear()
-                    msg = "Đã xóa cache nhận diện"
-                    self.system_logger.info(msg)
-                    self.ai_chatbot.tts.speak_immediate(msg)
-                elif key == ord('f'):  # 'f' để hoàn tất đăng ký sớm (finish)
-                    if self.registration.is_active and self.registration.state:
-                        if self.registration.state['face_count'] >= 3:
-                            log_msg = "Nguoi dung hoan tat dang ky som (phim F)"
-                            self.system_logger.info(log_msg)
-                            self.ui.add_log_message(log_msg)
-                            if self.registration.complete():
-                                time.sleep(2)
-                                self.reload_face_encodings()
-                                self.registration.reset()
-                                self.current_face_encoding = None
-                                self.current_person_id = None
-                                self.greeted_people.clear()
-                                self.registration.reset()
-                                self.current_face_encoding = None
-                                self.current_person_id = None
-                                self.greeted_people.clear()
-                        else:
-                            msg = f"Can it nhat 3 anh de hoan tat (hien co {self.registration.state['face_count']})"
-                            self.system_logger.info(msg)
-                            self.ui.add_log_message(msg)
         
         except KeyboardInterrupt:
             self.system_logger.info("⚠️ Nhận tín hiệu dừng từ người dùng")
@@ -534,6 +524,209 @@ class StreamingAIReceptionist:
         finally:
             self.cleanup()
     
+    def _render(self, frame):
+        """Compose overlay và hiển thị; headless chỉ compose khi live view cần frame mới"""
+        publish = self.live_view is not None and self.live_view.wants_frame()
+        if HEADLESS and not publish:
+            return
+        self.ui.update_frame(frame)
+        self.ui.update_recognition_results(self.result_interpolator.predict(frame.timestamp))
+        display_frame = self.ui.render()
+        if publish:
+            self.live_view.publish(display_frame)
+    
+    def _next_key(self, wait_ms):
+        """Phím kế tiếp (cv2.waitKey & 0xFF), lệnh từ live view được đổi thành phím tương ứng"""
+        if HEADLESS:
+            if self.live_view is not None:
+                return self.live_view.next_command(timeout=wait_ms / 1000.0)
+            time.sleep(wait_ms / 1000.0)
+            return 255
+        key = cv2.waitKey(wait_ms) & 0xFF
+        if key == 255 and self.live_view is not None:
+            key = self.live_view.next_command()
+        return key
+    
+    def _live_status(self):
+        """Trạng thái cho GET /status của live view"""
+        faces = [
+            {
+                'name': face.get('name'),
+                'person_id': face.get('person_id'),
+                'confidence': float(face.get('confidence') or 0.0),
+                'track_id': face.get('track_id'),
+            }
+            for face in self.last_faces
+        ]
+        return {
+            'running': self.running,
+            'headless': HEADLESS,
+            'session_sec': round(time.time() - self.session_start_time, 1),
+            'render_fps': round(self.scheduler.display.rate, 1),
+            'recognition_fps': round(self.scheduler.recognition.rate, 1),
+            'recognition_mode': self.scheduler.mode,
+            'faces': faces,
+            'current_person_id': self.current_person_id,
+            'registration_active': self.registration.is_active,
+            'viewers': self.live_view.viewers if self.live_view is not None else 0,
+        }
+    
+    def _report_fps(self):
+        """Log định kỳ FPS đạt được so với mục tiêu"""
+        if FPS_REPORT_INTERVAL <= 0 or time.time() - self.last_fps_report < FPS_REPORT_INTERVAL:
+            return
+        self.last_fps_report = time.time()
+        self.system_logger.info(f"FPS: {self.scheduler.report()}")
+        self.system_logger.info(f"Display buffers: {display_buffers.report()}")
+    
+    def _read_camera_frame(self):
+        """Stage capture: đọc một frame, tự restart camera nếu cần"""
+        # Kiểm tra camera có hoạt động không
+        if not self.camera or not self.camera.is_opened():
+            self.system_logger.warning("⚠️ Camera không hoạt động, đang restart...")
+            if not self.start_camera():
+                self.system_logger.error("❌ Không thể restart camera!")
+                time.sleep(1)
+            return None
+        
+        # Frame mới nhất từ thread grabber, kèm thời điểm chụp
+        image, captured_at = self.camera.read(timeout=1.0)
+        if image is None:
+            self.system_logger.warning("⚠️ Không đọc được frame từ camera")
+            return None
+        return Frame(image, captured_at)
+    
+    def _recognition_step(self, frame):
+        """Stage recognition: nhận diện và xử lý đăng ký trên frame mới nhất"""
+        with self.state_lock:
+            if self.face_module.worker_pool is not None and not self.registration.is_active:
+                faces = self._parallel_recognition_step(frame)
+            else:
+                faces = self._sequential_recognition_step(frame)
+            
+            # Nhịp nhận diện kế tiếp theo tình huống (đăng ký / track mới / người quen ổn định)
+            self.scheduler.observe(faces, registration=self.registration.is_active)
+            return faces
+    
+    def _sequential_recognition_step(self, frame):
+        """Nhận diện đồng bộ trên frame hiện tại và xử lý đăng ký nếu đang active"""
+        if self.face_module.worker_pool is not None:
+            # Đăng ký cần kết quả của chính frame này: chạy đồng bộ, bỏ kết quả cũ của worker
+            for seq, _ in self.face_module.collect_frame_results():
+                self._submitted_at.pop(seq, None)
+        
+        # Xử lý face recognition (bỏ qua khi cảnh đứng yên, luôn chạy khi đang đăng ký)
+        if self.motion_gate is None or self.motion_gate.should_process(frame, force=self.registration.is_active):
+            faces = self.process_face_recognition(frame)
+            self.last_faces = faces
+            self.result_interpolator.update(faces, frame.timestamp)
+        else:
+            faces = self.last_faces
+        
+        # Xử lý đăng ký nếu đang active
+        if self.registration.is_active:
+            self._process_registration(frame, faces)
+        
+        return faces
+    
+    def _parallel_recognition_step(self, frame):
+        """Chế độ worker pool: gửi frame mới, áp dụng các kết quả đã xong theo thứ tự frame"""
+        run_sync = False
+        if self.motion_gate is None or self.motion_gate.should_process(frame):
+            seq = self.face_module.submit_frame(frame)
+            if seq is not None:
+                self._submitted_at[seq] = frame.timestamp
+            else:
+                # Pool bận thì bỏ frame; frame không vừa slot (đổi độ phân giải...) thì xử lý đồng bộ
+                run_sync = not self.face_module.worker_pool.fits(frame.image)
+        
+        for seq, faces_with_encodings in self.face_module.collect_frame_results():
+            captured_at = self._submitted_at.pop(seq, frame.timestamp)
+            if faces_with_encodings is None:
+                continue  # Worker không trả kết quả kịp, frame bị bỏ qua
+            self.last_faces = self.process_face_recognition(frame, faces_with_encodings)
+            # Box thuộc về frame đã gửi đi (cũ hơn frame hiện tại), nên dùng đúng thời điểm chụp của nó
+            self.result_interpolator.update(self.last_faces, captured_at)
+        
+        if run_sync:
+            self.last_faces = self.process_face_recognition(frame)
+            self.result_interpolator.update(self.last_faces, frame.timestamp)
+        return self.last_faces
+    
+    def _process_registration(self, frame, faces):
+        """Xử lý một frame trong quá trình đăng ký inline"""
+        should_cancel = self.registration.process(frame, faces)
+        if should_cancel:
+            # Phát hiện người quen -> Hủy đăng ký
+            known_face = max([f for f in faces if f.get('person_id', 'unknown') != 'unknown'], 
+                           key=lambda x: x.get('confidence', 0))
+            cancel_msg = f"Xin chào {known_face['name']}! Hủy đăng ký và chuyển sang nhận diện bạn."
+            self.ai_chatbot.tts.speak_immediate(cancel_msg)
+            self.registration.cancel()
+            # Cập nhật current face
+            if 'encoding' in known_face:
+                self._update_current_face(known_face['encoding'], known_face['person_id'])
+            if known_face['person_id'] not in self.greeted_people:
+                self.greeted_people.add(known_face['person_id'])
+                self.metrics['greetings']['known'] += 1
+        
+        # Kiểm tra nếu hoàn tất
+        if self.registration.state:
+            # Hoàn tất nếu đã chụp đủ ảnh (bỏ qua ghi âm nếu cần)
+            if self.registration.state['step'] == 'capture_face' and self.registration.state['face_count'] >= self.registration.state['max_faces']:
+                # Chuyển sang ghi âm
+                pass  # Đã xử lý trong _process_face_capture
+            
+            # Xử lý trạng thái completed (sau khi chụp đủ 5 ảnh)
+            elif self.registration.state['step'] == 'completed':
+                self._finish_registration()
+    
+    def _finish_registration(self):
+        """Lưu đăng ký, reload gallery và reset trạng thái nhận diện"""
+        if self.registration.complete():
+            # Không sleep ở đây: hàm chạy khi đang giữ state_lock (thread nhận diện / phím F)
+            # Reload và reset
+            self.reload_face_encodings()
+            self.registration.reset()
+            self.current_face_encoding = None
+            self.current_person_id = None
+    
+    def _handle_key(self, key):
+        """Xử lý phím tắt. Trả về False nếu cần thoát"""
+        if key == ord('q') or key == 27:  # 'q' hoặc ESC
+            return False
+        elif key == ord('s'):  # 's' để dừng giọng nói
+            self.ai_chatbot.tts.stop_current_speech()
+        elif key == ord('h'):  # 'h' để help
+            help_msg = "Phím tắt: Q=Thoát, S=Dừng giọng, H=Trợ giúp, R=Reload, C=Clear cache"
+            self.ai_chatbot.tts.speak_immediate(help_msg)
+        elif key == ord('r'):  # 'r' để reload
+            with self.state_lock:
+                self.reload_face_encodings()
+            msg = "Đã reload danh sách người dùng"
+            self.ai_chatbot.tts.speak_immediate(msg)
+        elif key == ord('c'):  # 'c' để clear cache
+            with self.state_lock:
+                self.current_face_encoding = None
+                self.current_person_id = None
+                self.greeted_people.clear()
+            msg = "Đã xóa cache nhận diện"
+            self.system_logger.info(msg)
+            self.ai_chatbot.tts.speak_immediate(msg)
+        elif key == ord('f'):  # 'f' để hoàn tất đăng ký sớm (finish)
+            with self.state_lock:
+                if self.registration.is_active and self.registration.state:
+                    if self.registration.state['face_count'] >= 3:
+                        log_msg = "Nguoi dung hoan tat dang ky som (phim F)"
+                        self.system_logger.info(log_msg)
+                        self.ui.add_log_message(log_msg)
+                        self._finish_registration()
+                    else:
+                        msg = f"Can it nhat 3 anh de hoan tat (hien co {self.registration.state['face_count']})"
+                        self.system_logger.info(msg)
+                        self.ui.add_log_message(msg)
+        return True
+    
     def _voice_worker(self):
         """Worker thread cho voice recognition"""
         print("[VOICE] Voice worker thread started")
@@ -563,11 +756,20 @@ class StreamingAIReceptionist:
         while self.ai_chatbot.is_busy():
             time.sleep(0.1)
         
+        # Dừng pipeline trước khi giải phóng camera
+        if self.pipeline:
+            self.pipeline.stop()
+        
+        if self.live_view is not None:
+            self.live_view.stop()
+        
         # Cleanup
         if self.camera:
             self.camera.release()
+        self.face_module.close()
         
-        cv2.destroyAllWindows()
+        if not HEADLESS:
+            cv2.destroyAllWindows()
         
         # Stop AI chatbot
         self.ai_chatbot.stop()
@@ -580,6 +782,58 @@ class StreamingAIReceptionist:
             self.system_logger.info(
                 f"Metrics: faces_total={total_faces}, known_rate={face_known_rate:.2f}, voice_total={voice_total}, voice_recognize_rate={voice_recognize_rate:.2f}, greetings_known={self.metrics['greetings']['known']}, greetings_unknown={self.metrics['greetings']['unknown']}"
             )
+            self.system_logger.info(f"FPS: {self.scheduler.report()}")
+            if self.pipeline is not None:
+                stages = self.pipeline.stats()
+                self.system_logger.info(
+                    f"Pipeline: captured={stages['capture']['frames']}, recognized={stages['recognition']['processed']}, "
+                    f"recognition_dropped={stages['recognition']['dropped']}, render_dropped={stages['render']['dropped']}"
+                )
+                ages = ', '.join(f"{stage}={age:.1f}ms" for stage, age in stages['frame_age_ms'].items())
+                self.system_logger.info(f"Frame age: {ages}")
+            self.system_logger.info(f"Frame views: {frame_stats.report()}")
+            panels = ', '.join(
+                f"{name}={panel.stats['rebuilds']}/{panel.stats['composites']}"
+                for name, panel in (('log', self.ui.log_panel), ('messages', self.ui.message_panel),
+                                    ('registration', self.ui.registration_panel))
+            )
+            self.system_logger.info(f"UI panels (rebuilds/composites): {panels}")
+            self.system_logger.info(f"Display buffers: {display_buffers.report()}")
+            sprites = default_renderer.stats
+            self.system_logger.info(
+                f"Text sprites: hits={sprites['hits']}, misses={sprites['misses']}, evicted={sprites['evicted']}"
+            )
+            if self.live_view is not None:
+                view = self.live_view.stats
+                self.system_logger.info(
+                    f"Live view: encoded={view['encoded']}, sent={view['sent']}, commands={view['commands']}, peak_viewers={view['peak_viewers']}"
+                )
+            if self.camera is not None:
+                grabber = self.camera.stats
+                self.system_logger.info(
+                    f"Camera: grabbed={grabber['grabbed']}, retrieved={grabber['retrieved']}, skipped={grabber['skipped']}, failures={grabber['failures']}"
+                )
+            if self.face_module.worker_pool is not None:
+                workers = self.face_module.worker_pool.stats
+                self.system_logger.info(
+                    f"Face workers: submitted={workers['submitted']}, completed={workers['completed']}, dropped={workers['dropped']}, errors={workers['errors']}, lost={workers['lost']}, restarts={workers['restarts']}"
+                )
+            if self.face_module.recent_faces is not None:
+                hot = self.face_module.recent_faces.stats
+                lookups = max(1, hot['hits'] + hot['misses'])
+                self.system_logger.info(
+                    f"Face hot set: hits={hot['hits']}, misses={hot['misses']} ({100.0 * hot['hits'] / lookups:.1f}% hit), expired={hot['expired']}, evicted={hot['evicted']}"
+                )
+            if self.face_module.quality is not None:
+                quality = ', '.join(f"{reason}={count}" for reason, count in self.face_module.quality.stats.items())
+                self.system_logger.info(f"Face quality: {quality}")
+            if self.face_module.preprocessor is not None:
+                self.system_logger.info(f"Preprocessing: {self.face_module.preprocessor.timing_report()}")
+            if self.motion_gate is not None:
+                gate = self.motion_gate.stats
+                self.system_logger.info(
+                    f"Motion gate: processed={gate['processed']}, skipped={gate['skipped']}, last_score={gate['score']:.4f}, last_reason={gate['reason']}"
+                )
         except Exception:
             pass
         
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frame Pipeline - Tách capture / recognition / render thành các stage độc lập
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class LatestQueue:
+    """Queue có giới hạn, khi đầy thì bỏ phần tử cũ nhất; consumer luôn lấy phần tử mới nhất"""
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self.dropped = 0
+        self.put_count = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._seq += 1
+            self._items.append((self._seq, item))
+            self.put_count += 1
+            self._cond.notify_all()
+
+    def get_latest(self, timeout=None):
+        """Lấy phần tử mới nhất và bỏ các phần tử cũ hơn. Trả về (seq, item) hoặc (None, None)"""
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout):
+                return None, None
+            # Các frame cũ hơn không bao giờ được xử lý nữa
+            self.dropped += len(self._items) - 1
+            seq, item = self._items.pop()
+            self._items.clear()
+            return seq, item
+
+    def depth(self):
+        with self._cond:
+            return len(self._items)
+
+
+class StageThread(threading.Thread):
+    """Thread chạy lặp một hàm step cho tới khi stop()"""
+
+    def __init__(self, name, step, idle_sleep=0.0):
+        super().__init__(name=name, daemon=True)
+        self.step = step
+        self.idle_sleep = idle_sleep
+        self.running = False
+        self.processed = 0
+        self.errors = 0
+
+    def run(self):
+        self.running = True
+        while self.running:
+            try:
+                if self.step():
+                    self.processed += 1
+                elif self.idle_sleep:
+                    time.sleep(self.idle_sleep)
+            except Exception as e:
+                self.errors += 1
+                print(f"[PIPELINE] {self.name} error: {e}")
+                time.sleep(0.1)
+
+    def stop(self):
+        self.running = False
+
+
+class FramePipeline:
+    """
+    Pipeline 3 stage:
+    - capture: luôn giữ frame mới nhất từ camera; read_frame trả về Frame (kèm thời điểm chụp)
+    - recognition: lấy frame mới nhất hiện có (bỏ frame cũ), chạy process_frame; kết quả
+      được process_frame tự công bố (ResultInterpolator / state của module), pipeline không giữ
+    - render: main thread vẽ kết quả mới nhất lên frame mới nhất
+    Tốc độ hiển thị vì vậy không phụ thuộc vào thời gian nhận diện.
+    Tuổi frame (ms từ lúc chụp tới lúc bắt đầu nhận diện / render) được lưu trong frame_age.
+    """
+
+    def __init__(self, read_frame, process_frame, scheduler=None):
+        self.read_frame = read_frame
+        self.process_frame = process_frame
+        self.scheduler = scheduler  # FrameScheduler: nhịp của stage recognition (None = chạy hết tốc độ)
+        self.capture_queue = LatestQueue(maxsize=1)
+        self.recognition_queue = LatestQueue(maxsize=1)
+        self.latest_frame = None
+        self.frame_age = {}  # ms, trung bình trượt theo stage (recognition / render)
+        self.capture_stage = StageThread("capture", self._capture_step, idle_sleep=0.01)
+        self.recognition_stage = StageThread("recognition", self._recognition_step)
+
+    def _record_age(self, stage, captured_at, alpha=0.1):
+        age = (time.monotonic() - captured_at) * 1000.0
+        previous = self.frame_age.get(stage)
+        self.frame_age[stage] = age if previous is None else previous + alpha * (age - previous)
+
+    def _capture_step(self):
+        frame = self.read_frame()
+        if frame is None:
+            return False
+        # Cùng một Frame cho render và recognition: view dẫn xuất được dùng chung
+        self.capture_queue.put(frame)
+        self.recognition_queue.put(frame)
+        return True
+
+    def _recognition_step(self):
+        if self.scheduler is not None and not self.scheduler.wait_recognition():
+            return False
+        _, frame = self.recognition_queue.get_latest(timeout=0.1)
+        if frame is None:
+            return False
+        self._record_age('recognition', frame.timestamp)
+        started = time.monotonic()
+        self.process_frame(frame)
+        if self.scheduler is not None:
+            self.scheduler.recognition_done(started)
+        return True
+
+    def start(self):
+        self.capture_stage.start()
+        self.recognition_stage.start()
+
+    def stop(self, timeout=1.0):
+        self.capture_stage.stop()
+        self.recognition_stage.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        for stage in (self.capture_stage, self.recognition_stage):
+            if stage.is_alive():
+                stage.join(timeout)
+
+    def next_render_frame(self, timeout=0.05):
+        """Frame mới nhất cho stage render (None nếu chưa có frame mới)"""
+        _, frame = self.capture_queue.get_latest(timeout=timeout)
+        if frame is None:
+            return None
+        self._record_age('render', frame.timestamp)
+        self.latest_frame = frame
+        return frame
+
+    def stats(self):
+        """Độ sâu queue và số frame bị bỏ của từng stage"""
+        return {
+            'capture': {
+                'frames': self.capture_stage.processed,
+                'errors': self.capture_stage.errors,
+            },
+            'recognition': {
+                'queue_depth': self.recognition_queue.depth(),
+                'dropped': self.recognition_queue.dropped,
+                'processed': self.recognition_stage.processed,
+                'errors': self.recognition_stage.errors,
+            },
+            'render': {
+                'queue_depth': self.capture_queue.depth(),
+                'dropped': self.capture_queue.dropped,
+            },
+            'frame_age_ms': dict(self.frame_age),
+        }
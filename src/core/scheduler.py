@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frame Scheduler - Giữ nhịp hiển thị theo TARGET_FPS và nhịp nhận diện thích ứng
+"""
+
+import threading
+import time
+
+
+class RateMeter:
+    """Đếm tốc độ thực tế (lần/giây) theo cửa sổ trượt"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.count = 0
+        self.rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.count += 1
+        self._window_count += 1
+        elapsed = now - self._window_start
+        if elapsed >= self.window:
+            self.rate = self._window_count / elapsed
+            self._window_start = now
+            self._window_count = 0
+
+
+class FrameScheduler:
+    """
+    Hai nhịp độc lập (display trên main thread, recognition trên thread recognition):
+    - display: render theo deadline cố định 1/target_fps; trễ thì không đuổi theo (bỏ tick)
+    - recognition: nhịp thích ứng giữa min_fps và max_fps
+        boost   (max_fps): đang đăng ký hoặc vừa xuất hiện track mới
+        settled (min_fps): chỉ có người quen, tập track không đổi trong settle_sec
+        normal  (recognition_fps): các trường hợp còn lại
+      Khi một lần nhận diện lâu hơn chu kỳ (quá tải), lần kế tiếp được dời tới sau khi
+      xử lý xong và các frame đến trong lúc đó bị bỏ qua (LatestQueue chỉ giữ frame mới nhất).
+    """
+
+    MODES = ('boost', 'normal', 'settled')
+
+    def __init__(self, target_fps=30, recognition_fps=10, min_fps=3, max_fps=30,
+                 boost_sec=2.0, settle_sec=3.0):
+        self.target_fps = target_fps
+        self.recognition_fps = recognition_fps
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.boost_sec = boost_sec
+        self.settle_sec = settle_sec
+        self.display_interval = 1.0 / target_fps if target_fps > 0 else 0.0
+
+        self.mode = 'normal'
+        self._stop_event = threading.Event()
+        self._next_display = time.monotonic()
+        self._next_recognition = time.monotonic()
+        self._boost_until = 0.0
+        self._known_tracks = set()
+        self._tracks_changed_at = time.monotonic()
+
+        self.display = RateMeter()
+        self.recognition = RateMeter()
+        self.stats = {'display_late': 0, 'recognition_overload': 0, 'mode_changes': 0}
+        self.mode_time = {mode: 0.0 for mode in self.MODES}
+        self._mode_since = time.monotonic()
+
+    def recognition_interval(self):
+        fps = {'boost': self.max_fps, 'settled': self.min_fps}.get(self.mode, self.recognition_fps)
+        return 1.0 / fps if fps > 0 else 0.0
+
+    # --- Display ---
+    def render_wait_ms(self):
+        """Số ms chờ tới tick hiển thị kế tiếp (dùng cho cv2.waitKey), ít nhất 1"""
+        now = time.monotonic()
+        self.display.tick(now)
+        if self.display_interval <= 0:
+            return 1
+        self._next_display += self.display_interval
+        if self._next_display < now:
+            # Trễ hơn một chu kỳ: bỏ tick thay vì render dồn
+            self.stats['display_late'] += 1
+            self._next_display = now
+        return max(1, int((self._next_display - now) * 1000))
+
+    # --- Recognition ---
+    def wait_recognition(self, timeout=0.1):
+        """Chờ tới lượt nhận diện kế tiếp. Returns: True nếu đã tới lượt (False khi hết timeout hoặc stop)"""
+        delay = self._next_recognition - time.monotonic()
+        if delay > timeout:
+            self._stop_event.wait(timeout)
+            return False
+        if delay > 0:
+            self._stop_event.wait(delay)
+        return not self._stop_event.is_set()
+
+    def recognition_done(self, started):
+        """Gọi sau mỗi lần nhận diện; started = time.monotonic() lúc bắt đầu"""
+        now = time.monotonic()
+        self.recognition.tick(now)
+        interval = self.recognition_interval()
+        if now - started > interval:
+            self.stats['recognition_overload'] += 1
+            self._next_recognition = now
+        else:
+            self._next_recognition = started + interval
+
+    def observe(self, faces, registration=False):
+        """Cập nhật mode theo kết quả nhận diện mới nhất (list face_data)"""
+        now = time.monotonic()
+        tracks = {face.get('track_id') for face in faces if face.get('track_id') is not None}
+        if tracks - self._known_tracks:
+            # Có track mới: nhận diện dày hơn một lúc
+            self._boost_until = now + self.boost_sec
+        if tracks != self._known_tracks:
+            self._tracks_changed_at = now
+        self._known_tracks = tracks
+
+        all_known = bool(faces) and all(face.get('person_id', 'unknown') != 'unknown' for face in faces)
+        if registration or now < self._boost_until:
+            mode = 'boost'
+        elif all_known and now - self._tracks_changed_at >= self.settle_sec:
+            mode = 'settled'
+        else:
+            mode = 'normal'
+        self._set_mode(mode, now)
+
+    def _set_mode(self, mode, now):
+        if mode == self.mode:
+            return
+        self.mode_time[self.mode] += now - self._mode_since
+        self._mode_since = now
+        self.mode = mode
+        self.stats['mode_changes'] += 1
+
+    def stop(self):
+        self._stop_event.set()
+
+    def report(self):
+        """Chuỗi tóm tắt tốc độ đạt được so với mục tiêu"""
+        now = time.monotonic()
+        mode_time = dict(self.mode_time)
+        mode_time[self.mode] += now - self._mode_since
+        total = max(sum(mode_time.values()), 1e-6)
+        modes = ', '.join(f"{mode}={100.0 * seconds / total:.0f}%" for mode, seconds in mode_time.items())
+        interval = self.recognition_interval()
+        recognition_target = f"{1.0 / interval:.1f}" if interval > 0 else "max"
+        return (
+            f"render={self.display.rate:.1f}/{self.target_fps} fps (late={self.stats['display_late']}), "
+            f"recognition={self.recognition.rate:.1f}/{recognition_target} fps [{self.mode}] "
+            f"(overload={self.stats['recognition_overload']}), modes: {modes}"
+        )
@@ -0,0 +1,69 @@
+import numpy as np
+
+from .face_tracker import box_iou
+
+
+def as_boxes(locations):
+    """List box (top, right, bottom, left) -> mảng float32 (N x 4)"""
+    return np.asarray(locations, dtype=np.float32).reshape(-1, 4)
+
+
+def valid_face_mask(locations, min_size, min_ratio=0.6, max_ratio=1.4):
+    """Kiểm tra kích thước và tỷ lệ rộng/cao cho tất cả box cùng lúc. Returns: mảng bool"""
+    boxes = as_boxes(locations)
+    width = boxes[:, 1] - boxes[:, 3]
+    height = boxes[:, 2] - boxes[:, 0]
+    ratio = np.divide(width, height, out=np.zeros_like(width), where=height > 0)
+    return (width >= min_size) & (height >= min_size) & (ratio >= min_ratio) & (ratio <= max_ratio)
+
+
+def box_nms(locations, scores, iou_threshold):
+    """Greedy NMS theo IoU. Returns: index các box giữ lại, theo thứ tự tăng dần"""
+    boxes = as_boxes(locations)
+    n = len(boxes)
+    if n <= 1:
+        return np.arange(n)
+    iou = box_iou(boxes, boxes)
+    order = np.argsort(-np.asarray(scores, dtype=np.float32), kind='stable')
+    suppressed = np.zeros(n, dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return np.sort(np.asarray(keep, dtype=np.int64))
+
+
+def dedupe_identities(person_ids, confidences, locations, min_distance, unknown_id='unknown'):
+    """
+    Mỗi người đã biết chỉ giữ khuôn mặt có confidence cao nhất; các khuôn mặt unknown
+    có tâm cách nhau dưới min_distance thì chỉ giữ một (confidence cao hơn, hòa thì cái trước).
+    Returns: index các kết quả giữ lại, theo thứ tự tăng dần.
+    """
+    n = len(person_ids)
+    if n <= 1:
+        return np.arange(n)
+    ids = np.asarray(person_ids, dtype=object)
+    order = np.argsort(-np.asarray(confidences, dtype=np.float32), kind='stable')
+    unknown = ids == unknown_id
+
+    # Known: lần xuất hiện đầu tiên của mỗi id theo confidence giảm dần
+    known_order = order[~unknown[order]]
+    _, first = np.unique(ids[known_order].astype(str), return_index=True)
+    keep = list(known_order[first])
+
+    # Unknown: NMS theo khoảng cách tâm
+    unknown_order = order[unknown[order]]
+    if len(unknown_order):
+        boxes = as_boxes(locations)[unknown_order]
+        centers = np.stack([(boxes[:, 1] + boxes[:, 3]) / 2, (boxes[:, 0] + boxes[:, 2]) / 2], axis=1)
+        diff = centers[:, None, :] - centers[None, :, :]
+        close = np.einsum('ijk,ijk->ij', diff, diff) < min_distance * min_distance
+        suppressed = np.zeros(len(unknown_order), dtype=bool)
+        for j in range(len(unknown_order)):
+            if suppressed[j]:
+                continue
+            keep.append(unknown_order[j])
+            suppressed |= close[j]
+    return np.sort(np.asarray(keep, dtype=np.int64))
@@ -0,0 +1,266 @@
+import collections
+
+import numpy as np
+
+from .face_index import ExactIndex, PersonPrototypeIndex, squared_distances
+
+
+# Trạng thái gallery bất biến; mọi thay đổi dựng state mới rồi gán một tham chiếu
+GalleryState = collections.namedtuple(
+    'GalleryState', 'matrix sq_norms size ids names index index_built prototypes'
+)
+
+
+class FaceGallery:
+    """
+    Gallery khuôn mặt dạng ma trận float32 liên tục (N x 128) kèm norm của từng dòng.
+    Ma trận, norm, ids, names, index và prototypes nằm chung trong một GalleryState bất biến:
+    set/add/remove dựng state mới (index/prototypes là bản copy) rồi gán self._state một lần,
+    match đọc state một lần mỗi lượt nên không bao giờ ghép ma trận mới với ids/index cũ.
+    add chỉ ghi vào dòng/phần tử ngoài [:size] của state cũ. Chỉ có một writer tại một thời điểm.
+    """
+
+    def __init__(self, dim=128, index=None, index_min_size=0, use_prototypes=True):
+        self.dim = dim
+        self.index_min_size = index_min_size
+        self.index_version = 0
+        self._state = GalleryState(
+            matrix=np.empty((0, dim), dtype=np.float32),
+            sq_norms=np.empty((0,), dtype=np.float32),
+            size=0,
+            ids=[],
+            names=[],
+            index=index or ExactIndex(),
+            index_built=False,
+            prototypes=PersonPrototypeIndex() if use_prototypes else None
+        )
+
+    def __len__(self):
+        return self._state.size
+
+    def snapshot(self):
+        """State hiện tại; dùng chung cho nhiều lần đọc cần nhất quán (match rồi tra ids/names)"""
+        return self._state
+
+    @property
+    def encodings(self):
+        """View (N x dim) của các encoding hiện có"""
+        state = self._state
+        return state.matrix[:state.size]
+
+    @property
+    def sq_norms(self):
+        """Bình phương norm đã cache của từng encoding"""
+        state = self._state
+        return state.sq_norms[:state.size]
+
+    @property
+    def ids(self):
+        return self._state.ids
+
+    @property
+    def names(self):
+        return self._state.names
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def prototypes(self):
+        return self._state.prototypes
+
+    def index_active(self, state=None):
+        """Index xấp xỉ chỉ dùng khi gallery đủ lớn, còn lại quét chính xác"""
+        state = state or self._state
+        return state.index_built and state.index.kind != 'exact' and state.size >= self.index_min_size
+
+    def _indexed(self, state):
+        """State với index (bản copy) build lại trên toàn bộ gallery"""
+        if state.size >= max(1, self.index_min_size):
+            index = state.index.copy()
+            index.build(state.matrix[:state.size])
+            self.index_version += 1
+            return state._replace(index=index, index_built=True)
+        return state._replace(index_built=False)
+
+    def set_index(self, index, index_min_size=None):
+        """Gắn một index khác (ví dụ IVFIndex đã load từ đĩa)"""
+        if index_min_size is not None:
+            self.index_min_size = index_min_size
+        state = self._state
+        built = 0 < index.size <= state.size
+        if built and index.size < state.size:
+            index.add(index.size, state.matrix[index.size:state.size])
+        state = state._replace(index=index, index_built=built)
+        self._state = state if built else self._indexed(state)
+
+    def build_index(self):
+        """(Re)build index trên toàn bộ gallery"""
+        self._state = self._indexed(self._state)
+        return self._state.index_built
+
+    def set(self, encodings, ids, names, build_index=True, sq_norms=None):
+        """
+        Thay toàn bộ gallery bằng danh sách encoding mới. Ma trận float32 liên tục
+        (kể cả np.memmap) được dùng trực tiếp, không copy.
+        """
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        matrix = np.ascontiguousarray(matrix)
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+
+        ids = list(ids)
+        prototypes = self._state.prototypes
+        if prototypes is not None:
+            prototypes = PersonPrototypeIndex()
+            prototypes.build(matrix, ids)
+        state = self._state._replace(
+            matrix=matrix, sq_norms=sq_norms, size=len(matrix), ids=ids, names=list(names),
+            index_built=False, prototypes=prototypes
+        )
+        if build_index:
+            state = self._indexed(state)
+        # Dựng xong mới gán: frame loop thấy state cũ hoặc mới, không bao giờ dở dang
+        self._state = state
+
+    def add(self, encoding, person_id, person_name):
+        """Thêm một encoding, nới dung lượng theo cấp số nhân để add là O(1) khấu hao"""
+        row = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        state = self._state
+        size = state.size
+        matrix, sq_norms = state.matrix, state.sq_norms
+        if size == len(matrix) or not matrix.flags.writeable:
+            # Ma trận đầy hoặc là mmap chỉ đọc: chuyển sang bản copy trong RAM
+            capacity = max(16, 2 * len(matrix))
+            matrix = np.empty((capacity, self.dim), dtype=np.float32)
+            matrix[:size] = state.matrix[:size]
+            sq_norms = np.empty((capacity,), dtype=np.float32)
+            sq_norms[:size] = state.sq_norms[:size]
+
+        # Dòng mới nằm ngoài [:size] của state cũ nên ghi tại chỗ vẫn an toàn cho người đọc
+        matrix[size] = row
+        sq_norms[size] = float(np.dot(row, row))
+
+        # ids/names chỉ nối thêm: state cũ chỉ đọc [:size] của nó
+        state.ids.append(person_id)
+        state.names.append(person_name)
+
+        prototypes = state.prototypes
+        if prototypes is not None:
+            prototypes = prototypes.copy()
+            prototypes.add(size, matrix, person_id)
+        state = state._replace(matrix=matrix, sq_norms=sq_norms, size=size + 1, prototypes=prototypes)
+        if state.index_built:
+            index = state.index.copy()
+            index.add(size, matrix[size:size + 1])
+            state = state._replace(index=index)
+            if getattr(index, 'needs_rebuild', lambda: False)():
+                state = self._indexed(state)
+        elif state.size >= max(1, self.index_min_size):
+            state = self._indexed(state)
+        self._state = state
+        return size
+
+    def remove_persons(self, person_ids):
+        """Loại toàn bộ encoding của các người trong person_ids. Returns: số encoding bị xóa"""
+        state = self._state
+        keep = [i for i, person_id in enumerate(state.ids) if person_id not in person_ids]
+        removed = state.size - len(keep)
+        if removed:
+            rows = np.asarray(keep, dtype=np.int64)
+            self.set(
+                state.matrix[rows],
+                [state.ids[i] for i in keep],
+                [state.names[i] for i in keep],
+                build_index=state.index.kind != 'exact',
+                sq_norms=state.sq_norms[rows]
+            )
+        return removed
+
+    def person_rows(self, person_id, state=None):
+        """Index các dòng (sample) của một người"""
+        state = state or self._state
+        if state.prototypes is not None:
+            slot = state.prototypes.person_slots.get(person_id)
+            return state.prototypes.person_rows[slot] if slot is not None else np.empty((0,), dtype=np.int64)
+        return np.asarray([i for i, pid in enumerate(state.ids) if pid == person_id], dtype=np.int64)
+
+    def use_storage(self, matrix, sq_norms):
+        """Đổi mảng nền sang bản có cùng nội dung (ví dụ mmap sau khi compact), giữ nguyên index"""
+        state = self._state
+        if len(matrix) != state.size:
+            return False
+        self._state = state._replace(matrix=matrix, sq_norms=sq_norms)
+        return True
+
+    def distances(self, query_encodings, state=None):
+        """Khoảng cách Euclid (M x N) giữa các query và toàn bộ gallery"""
+        state = state or self._state
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.dim)
+        d2 = squared_distances(queries, state.matrix[:state.size], state.sq_norms[:state.size])
+        return np.sqrt(d2, out=d2)
+
+    def match(self, query_encodings, use_index=True, max_distance=None, state=None):
+        """
+        So khớp tất cả khuôn mặt trong frame với gallery trong một lượt.
+        Returns: (best_idx, best_dist, second_dist) - mỗi mảng dài M.
+        best_idx = -1 và dist = inf khi gallery rỗng.
+        Khi có max_distance, những người chắc chắn xa hơn ngưỡng bị loại theo
+        centroid/bán kính; face không còn ứng viên nào trả về best_idx = -1,
+        và second_dist chỉ tính trong các người còn lại.
+        state: snapshot() để tra ids/names của best_idx trên cùng state (mặc định state hiện tại).
+        """
+        state = state or self._state
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.dim)
+        m = len(queries)
+        best_idx = np.full(m, -1, dtype=np.int64)
+        best_dist = np.full(m, np.inf, dtype=np.float32)
+        second_dist = np.full(m, np.inf, dtype=np.float32)
+        if m == 0 or state.size == 0:
+            return best_idx, best_dist, second_dist
+
+        if use_index and self.index_active(state):
+            candidates = state.index.candidates(queries)
+            if candidates is not None:
+                self._match_candidates(state, queries, candidates, best_idx, best_dist, second_dist)
+                return best_idx, best_dist, second_dist
+
+        if use_index and max_distance is not None and state.prototypes is not None:
+            candidates = state.prototypes.candidates(queries, max_distance)
+            if candidates is not None:
+                self._match_candidates(state, queries, candidates, best_idx, best_dist, second_dist)
+                return best_idx, best_dist, second_dist
+
+        dists = self.distances(queries, state)
+        rows = np.arange(m)
+        if state.size == 1:
+            best_idx[:] = 0
+            best_dist[:] = dists[:, 0]
+            return best_idx, best_dist, second_dist
+
+        # kth=1: cột 0 là nhỏ nhất, cột 1 là nhỏ thứ hai
+        top2 = np.argpartition(dists, 1, axis=1)[:, :2]
+        best_idx[:] = top2[:, 0]
+        best_dist[:] = dists[rows, top2[:, 0]]
+        second_dist[:] = dists[rows, top2[:, 1]]
+        return best_idx, best_dist, second_dist
+
+    def _match_candidates(self, state, queries, candidates, best_idx, best_dist, second_dist):
+        """Re-rank chính xác các ứng viên do index trả về cho từng query"""
+        for i, rows in enumerate(candidates):
+            if rows is None:
+                # Index không lọc được: quét toàn bộ cho query này
+                rows = np.arange(state.size)
+            elif len(rows) == 0:
+                # Không còn ứng viên nào trong ngưỡng
+                continue
+            d2 = squared_distances(queries[i:i + 1], state.matrix[rows], state.sq_norms[rows])[0]
+            if len(rows) == 1:
+                best_idx[i] = rows[0]
+                best_dist[i] = np.sqrt(d2[0])
+                continue
+            top2 = np.argpartition(d2, 1)[:2]
+            best_idx[i] = rows[top2[0]]
+            best_dist[i] = np.sqrt(d2[top2[0]])
+            second_dist[i] = np.sqrt(d2[top2[1]])
@@ -0,0 +1,169 @@
+import hashlib
+import multiprocessing as mp
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from .face_store import atomic_write
+
+IMAGE_PATTERNS = ('*.jpg', '*.png')
+
+
+def encode_image_file(image_path):
+    """Decode ảnh và encode khuôn mặt đầu tiên (chạy trong process worker). Trả về float32 hoặc None"""
+    import face_recognition
+    from ...utils.utils import load_image_from_path
+
+    image = load_image_from_path(image_path)
+    if image is None:
+        return None
+    face_encodings = face_recognition.face_encodings(image)
+    if not face_encodings:
+        return None
+    return np.asarray(face_encodings[0], dtype=np.float32)
+
+
+def file_digest(path):
+    """Hash nội dung file (blake2b)"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GalleryBuilder:
+    """
+    Build lại gallery từ ảnh trong data/faces bằng process pool.
+    Encoding của từng ảnh được cache theo hash nội dung; file có mtime/size không
+    đổi thì không cần hash lại, nên lần build sau chỉ encode ảnh mới hoặc đã sửa.
+    """
+
+    def __init__(self, faces_dir, cache_path=None, workers=0):
+        self.faces_dir = Path(faces_dir)
+        self.cache_path = Path(cache_path) if cache_path else self.faces_dir / 'encodings.imgcache.pkl'
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.stats = {'images': 0, 'cached': 0, 'encoded': 0, 'no_face': 0}
+
+    def _load_cache(self):
+        """Cache: files {relpath: (mtime_ns, size, digest)}, encodings {digest: encoding hoặc None}"""
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path, 'rb') as f:
+                    cache = pickle.load(f)
+                return cache.get('files', {}), cache.get('encodings', {})
+            except Exception as e:
+                print(f"Error loading image encoding cache: {e}")
+        return {}, {}
+
+    def _save_cache(self, files, encodings):
+        try:
+            atomic_write(self.cache_path, pickle.dumps({'files': files, 'encodings': encodings}))
+        except Exception as e:
+            print(f"Error saving image encoding cache: {e}")
+
+    def _scan(self):
+        """Liệt kê (person_id, person_name, image_path) theo thứ tự thư mục"""
+        entries = []
+        for person_dir in sorted(d for d in self.faces_dir.iterdir() if d.is_dir()):
+            person_id = person_dir.name
+            person_name = person_id
+            metadata_file = person_dir / 'metadata.txt'
+            if metadata_file.exists():
+                with open(metadata_file, 'r', encoding='utf-8') as f:
+                    person_name = f.read().strip()
+            image_files = []
+            for pattern in IMAGE_PATTERNS:
+                image_files.extend(sorted(person_dir.glob(pattern)))
+            entries.extend((person_id, person_name, image_file) for image_file in image_files)
+        return entries
+
+    def _encode_all(self, paths):
+        """Encode các ảnh chưa có trong cache, song song nếu có nhiều ảnh. Returns: {path: encoding}"""
+        results = {}
+        if not paths:
+            return results
+        started = time.time()
+        total = len(paths)
+        step = max(1, total // 20)
+
+        def report(done):
+            if done % step == 0 or done == total:
+                elapsed = time.time() - started
+                print(f"[GALLERY] Encoded {done}/{total} images ({100 * done // total}%, {elapsed:.1f}s)")
+
+        if self.workers <= 1 or total == 1:
+            for done, path in enumerate(paths, 1):
+                results[path] = encode_image_file(path)
+                report(done)
+            return results
+
+        # spawn: dlib không an toàn với fork khi process đã có thread
+        with ProcessPoolExecutor(max_workers=min(self.workers, total), mp_context=mp.get_context('spawn')) as pool:
+            futures = {pool.submit(encode_image_file, str(path)): path for path in paths}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    print(f"Error encoding {path}: {e}")
+                    results[path] = None
+                report(done)
+        return results
+
+    def build(self):
+        """Returns: (encodings, ids, names) - mỗi ảnh có khuôn mặt cho một encoding"""
+        self.stats = {'images': 0, 'cached': 0, 'encoded': 0, 'no_face': 0}
+        files, encodings = self._load_cache()
+        entries = self._scan()
+        self.stats['images'] = len(entries)
+
+        digests = {}
+        pending = {}
+        for _, _, image_file in entries:
+            rel = image_file.relative_to(self.faces_dir).as_posix()
+            try:
+                st = image_file.stat()
+            except OSError:
+                continue
+            cached = files.get(rel)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                digest = cached[2]
+            else:
+                digest = file_digest(image_file)
+                files[rel] = (st.st_mtime_ns, st.st_size, digest)
+            digests[image_file] = digest
+            if digest not in encodings:
+                # Ảnh trùng nội dung chỉ encode một lần
+                pending.setdefault(digest, image_file)
+
+        self.stats['cached'] = len(digests) - len(pending)
+        self.stats['encoded'] = len(pending)
+        if pending:
+            print(f"[GALLERY] {len(pending)} new/changed images to encode ({self.stats['cached']} cached, {self.workers} workers)")
+        encoded = self._encode_all(list(pending.values()))
+        for digest, image_file in pending.items():
+            encodings[digest] = encoded.get(image_file)
+
+        # Bỏ cache của ảnh đã bị xóa
+        live_files = {image_file.relative_to(self.faces_dir).as_posix() for image_file in digests}
+        files = {rel: value for rel, value in files.items() if rel in live_files}
+        live_digests = set(digests.values())
+        encodings = {digest: value for digest, value in encodings.items() if digest in live_digests}
+        self._save_cache(files, encodings)
+
+        result_encodings, ids, names = [], [], []
+        for person_id, person_name, image_file in entries:
+            encoding = encodings.get(digests.get(image_file))
+            if encoding is None:
+                if image_file in digests:
+                    self.stats['no_face'] += 1
+                continue
+            result_encodings.append(encoding)
+            ids.append(person_id)
+            names.append(person_name)
+        return result_encodings, ids, names
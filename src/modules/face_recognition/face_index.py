@@ -0,0 +1,357 @@
+import copy
+import hashlib
+import io
+import time
+import numpy as np
+
+from .face_store import atomic_write
+
+
+def gallery_fingerprint(matrix, previous=''):
+    """
+    Dấu vân tay (blake2b) của các dòng đã index, nối tiếp dấu vân tay trước đó (previous),
+    để phát hiện file index lỗi thời kể cả khi dòng bị đổi chỗ hoặc sửa mà tổng không đổi
+    """
+    digest = hashlib.blake2b(previous.encode('ascii'), digest_size=20)
+    digest.update(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def chained_fingerprint(matrix, built_size):
+    """Dấu vân tay IVFIndex: các dòng lúc build, rồi nối từng dòng add() sau đó"""
+    fingerprint = gallery_fingerprint(matrix[:built_size])
+    for row in matrix[built_size:]:
+        fingerprint = gallery_fingerprint(row, fingerprint)
+    return fingerprint
+
+
+def squared_distances(queries, matrix, sq_norms=None):
+    """Bình phương khoảng cách (M x N), dùng ||q||^2 + ||g||^2 - 2 q.g"""
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+    q_sq = np.einsum('ij,ij->i', queries, queries)
+    d2 = queries @ matrix.T
+    d2 *= -2.0
+    d2 += q_sq[:, None]
+    d2 += sq_norms[None, :]
+    np.maximum(d2, 0.0, out=d2)
+    return d2
+
+
+class ExactIndex:
+    """Quét toàn bộ gallery (mặc định cho gallery nhỏ)"""
+
+    kind = 'exact'
+
+    def __init__(self):
+        self.size = 0
+
+    def build(self, matrix):
+        self.size = len(matrix)
+
+    def add(self, start, rows):
+        self.size = start + len(rows)
+
+    def copy(self):
+        index = ExactIndex()
+        index.size = self.size
+        return index
+
+    def candidates(self, queries, max_distance=None):
+        """None = không lọc, gallery sẽ quét toàn bộ"""
+        return None
+
+    def save(self, path):
+        pass
+
+
+class IVFIndex:
+    """
+    Inverted-file index thuần NumPy: k-means coarse quantizer chia gallery thành
+    n_lists cụm, query chỉ quét n_probe cụm gần nhất rồi gallery re-rank chính xác.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty((0,), dtype=np.int32)
+        self.lists = []
+        self.size = 0
+        self.built_size = 0
+        self.fingerprint = ''
+
+    def _train(self, matrix):
+        """K-means trên một mẫu của gallery"""
+        rng = np.random.default_rng(self.seed)
+        n = len(matrix)
+        n_lists = self.n_lists or int(np.clip(np.sqrt(n), 1, 4096))
+        n_lists = min(n_lists, n)
+
+        sample_size = min(n, 256 * n_lists)
+        sample = matrix[rng.choice(n, sample_size, replace=False)] if sample_size < n else matrix
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            labels = np.argmin(squared_distances(sample, centroids), axis=1)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Cụm rỗng: khởi tạo lại bằng điểm ngẫu nhiên
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+        return np.ascontiguousarray(centroids, dtype=np.float32)
+
+    def _assign(self, rows, chunk=8192):
+        labels = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), chunk):
+            block = rows[start:start + chunk]
+            labels[start:start + chunk] = np.argmin(squared_distances(block, self.centroids), axis=1)
+        return labels
+
+    def _rebuild_lists(self):
+        order = np.argsort(self.assignments, kind='stable').astype(np.int64)
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def build(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        self.size = len(matrix)
+        self.built_size = self.size
+        self.fingerprint = gallery_fingerprint(matrix)
+        if self.size == 0:
+            self.centroids = None
+            self.assignments = np.empty((0,), dtype=np.int32)
+            self.lists = []
+            return
+        self.centroids = self._train(matrix)
+        self.assignments = self._assign(matrix)
+        self._rebuild_lists()
+
+    def add(self, start, rows):
+        """Chèn tăng dần: gán các dòng mới vào cụm gần nhất, không huấn luyện lại"""
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        labels = self._assign(rows)
+        self.assignments = np.concatenate([self.assignments[:start], labels])
+        for offset, label in enumerate(labels.tolist()):
+            self.lists[label] = np.append(self.lists[label], start + offset)
+        self.size = start + len(rows)
+        # Dấu vân tay phủ mọi dòng đã gán cụm, không chỉ các dòng lúc build
+        for row in rows:
+            self.fingerprint = gallery_fingerprint(row, self.fingerprint)
+
+    def copy(self):
+        """Bản copy để gallery sửa mà không đụng index đang được đọc (build/add chỉ gán mảng mới)"""
+        index = copy.copy(self)
+        index.lists = list(self.lists)
+        return index
+
+    def needs_rebuild(self):
+        """Huấn luyện lại khi gallery đã tăng gấp đôi so với lần build trước"""
+        return self.size >= 2 * max(1, self.built_size)
+
+    def candidates(self, queries, max_distance=None):
+        """Trả về chỉ số các dòng trong n_probe cụm gần nhất cho từng query"""
+        if self.centroids is None:
+            return None
+        n_probe = min(self.n_probe, len(self.centroids))
+        d2 = squared_distances(queries, self.centroids)
+        probes = np.argpartition(d2, n_probe - 1, axis=1)[:, :n_probe]
+        results = []
+        for probe in probes:
+            rows = np.concatenate([self.lists[p] for p in probe])
+            # Các cụm được probe đều rỗng: để gallery quét toàn bộ
+            results.append(rows if len(rows) else None)
+        return results
+
+    def save(self, path):
+        """Ghi atomic (file tạm + fsync + os.replace): crash giữa chừng không để lại index cụt"""
+        if self.centroids is None:
+            return
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            n_probe=self.n_probe,
+            built_size=self.built_size,
+            fingerprint=self.fingerprint
+        )
+        atomic_write(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path, matrix=None, n_probe=None):
+        """
+        Load index đã lưu; trả về None nếu file hỏng/khác định dạng hoặc không khớp với gallery
+        hiện tại (gallery ngắn hơn số dòng đã gán cụm, hoặc dấu vân tay của các dòng đó khác)
+        """
+        try:
+            with np.load(path) as data:
+                centroids = data['centroids'].astype(np.float32)
+                assignments = data['assignments'].astype(np.int32)
+                built_size = int(data['built_size'])
+                saved_n_probe = int(data['n_probe'])
+                fingerprint = str(data['fingerprint'])
+        except Exception as e:
+            print(f"Error reading face index {path}: {e}")
+            return None
+        assigned = len(assignments)
+        if built_size > assigned:
+            return None
+        if matrix is not None:
+            if len(matrix) < assigned:
+                return None
+            if chained_fingerprint(matrix[:assigned], built_size) != fingerprint:
+                return None
+        index = cls(n_lists=len(centroids), n_probe=n_probe or saved_n_probe)
+        index.centroids = centroids
+        index.assignments = assignments
+        index.size = assigned
+        index.built_size = built_size
+        index.fingerprint = fingerprint
+        index._rebuild_lists()
+        return index
+
+
+class PersonPrototypeIndex:
+    """
+    Index cấp người: mỗi person_id có centroid và bán kính (khoảng cách xa nhất từ
+    centroid tới sample). Theo bất đẳng thức tam giác ||q - x|| >= ||q - c|| - r,
+    nên cả người bị loại khi cận dưới này đã vượt max_distance.
+    """
+
+    kind = 'prototype'
+
+    # Bù sai số float32 để không loại nhầm người nằm sát ngưỡng
+    EPSILON = 1e-4
+
+    def __init__(self):
+        self.person_ids = []
+        self.person_slots = {}
+        self.person_rows = []
+        self.centroids = np.empty((0, 128), dtype=np.float32)
+        self.radii = np.empty((0,), dtype=np.float32)
+        self.size = 0
+
+    def _update_person(self, slot, matrix):
+        rows = self.person_rows[slot]
+        samples = matrix[rows]
+        centroid = samples.mean(axis=0)
+        self.centroids[slot] = centroid
+        self.radii[slot] = float(np.sqrt(np.max(np.sum((samples - centroid) ** 2, axis=1))))
+
+    def build(self, matrix, ids):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        self.person_ids = []
+        self.person_slots = {}
+        groups = []
+        for row, person_id in enumerate(ids):
+            slot = self.person_slots.get(person_id)
+            if slot is None:
+                slot = len(self.person_ids)
+                self.person_slots[person_id] = slot
+                self.person_ids.append(person_id)
+                groups.append([])
+            groups[slot].append(row)
+        self.person_rows = [np.asarray(rows, dtype=np.int64) for rows in groups]
+        self.centroids = np.zeros((len(groups), matrix.shape[1]), dtype=np.float32)
+        self.radii = np.zeros((len(groups),), dtype=np.float32)
+        for slot in range(len(groups)):
+            self._update_person(slot, matrix)
+        self.size = len(ids)
+
+    def copy(self):
+        """Bản copy để gallery sửa mà không đụng bản đang được đọc"""
+        index = copy.copy(self)
+        index.person_ids = list(self.person_ids)
+        index.person_slots = dict(self.person_slots)
+        index.person_rows = list(self.person_rows)
+        index.centroids = self.centroids.copy()
+        index.radii = self.radii.copy()
+        return index
+
+    def add(self, row, matrix, person_id):
+        """Thêm một sample: chỉ tính lại centroid/bán kính của người đó"""
+        slot = self.person_slots.get(person_id)
+        if slot is None:
+            slot = len(self.person_ids)
+            self.person_slots[person_id] = slot
+            self.person_ids.append(person_id)
+            self.person_rows.append(np.empty((0,), dtype=np.int64))
+            self.centroids = np.vstack([self.centroids, np.zeros((1, matrix.shape[1]), dtype=np.float32)])
+            self.radii = np.append(self.radii, np.float32(0.0))
+        self.person_rows[slot] = np.append(self.person_rows[slot], row)
+        self._update_person(slot, matrix)
+        self.size = row + 1
+
+    def candidates(self, queries, max_distance=None):
+        """Chỉ giữ sample của những người có cận dưới khoảng cách <= max_distance"""
+        if max_distance is None or len(self.person_ids) == 0:
+            return None
+        centroid_dist = np.sqrt(squared_distances(queries, self.centroids))
+        lower_bound = centroid_dist - self.radii[None, :]
+        survivors = lower_bound <= max_distance + self.EPSILON
+        results = []
+        for mask in survivors:
+            slots = np.flatnonzero(mask)
+            if len(slots) == 0:
+                results.append(np.empty((0,), dtype=np.int64))
+            else:
+                results.append(np.concatenate([self.person_rows[slot] for slot in slots]))
+        return results
+
+
+def create_index(kind, n_probe=8):
+    """Factory theo tên cấu hình (FACE_INDEX_TYPE)"""
+    if kind == 'ivf':
+        return IVFIndex(n_probe=n_probe)
+    return ExactIndex()
+
+
+def benchmark_index(gallery, queries=None, n_queries=200, seed=0):
+    """
+    Đo recall@1 và độ trễ của index hiện tại so với quét toàn bộ.
+    Mặc định dùng các encoding trong gallery cộng nhiễu nhỏ làm query.
+    """
+    if len(gallery) == 0:
+        return {}
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        picks = rng.choice(len(gallery), min(n_queries, len(gallery)), replace=False)
+        queries = gallery.encodings[picks] + rng.normal(0, 0.02, (len(picks), gallery.dim)).astype(np.float32)
+    queries = np.asarray(queries, dtype=np.float32).reshape(-1, gallery.dim)
+
+    start = time.perf_counter()
+    _, exact_dist, _ = gallery.match(queries, use_index=False)
+    exact_ms = (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    _, approx_dist, _ = gallery.match(queries, use_index=True)
+    index_ms = (time.perf_counter() - start) * 1000.0
+
+    candidates = gallery.index.candidates(queries) if gallery.index_active() else None
+    # None = index không lọc được cho query đó, gallery quét toàn bộ
+    avg_candidates = (
+        float(np.mean([len(gallery) if c is None else len(c) for c in candidates]))
+        if candidates else float(len(gallery))
+    )
+
+    return {
+        'index': gallery.index.kind if gallery.index_active() else 'exact',
+        'gallery_size': len(gallery),
+        'queries': len(queries),
+        # So theo khoảng cách để các encoding trùng nhau không bị tính là miss
+        'recall_at_1': float(np.mean(approx_dist <= exact_dist + 1e-5)),
+        'exact_ms_per_query': exact_ms / len(queries),
+        'index_ms_per_query': index_ms / len(queries),
+        'speedup': exact_ms / index_ms if index_ms > 0 else 0.0,
+        'avg_candidates': avg_candidates
+    }
@@ -0,0 +1,75 @@
+import cv2
+import face_recognition
+import numpy as np
+
+
+class FaceQualityScorer:
+    """
+    Chấm chất lượng crop khuôn mặt trước khi encode, kiểm tra rẻ trước, đắt sau:
+    kích thước box -> độ sáng -> độ nét (phương sai Laplacian) -> góc quay (yaw từ landmark 5 điểm).
+    Crop không đạt thì không encode; lý do được đếm trong stats.
+    """
+
+    SHARPNESS_SIZE = (96, 96)  # Chuẩn hóa kích thước để phương sai Laplacian so sánh được giữa các box
+
+    def __init__(self, min_sharpness=40.0, min_brightness=40, max_brightness=220, min_size=80, max_yaw=35.0):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_size = min_size
+        self.max_yaw = max_yaw
+        self.stats = {'passed': 0, 'small': 0, 'dark': 0, 'bright': 0, 'blur': 0, 'yaw': 0}
+
+    def params(self):
+        """Tham số khởi tạo (để dựng scorer giống hệt trong process worker)"""
+        return {
+            'min_sharpness': self.min_sharpness,
+            'min_brightness': self.min_brightness,
+            'max_brightness': self.max_brightness,
+            'min_size': self.min_size,
+            'max_yaw': self.max_yaw,
+        }
+
+    def estimate_yaw(self, rgb_frame, location):
+        """Góc quay trái/phải (độ) từ vị trí mũi so với hai mắt; None nếu không lấy được landmark"""
+        landmarks = face_recognition.face_landmarks(rgb_frame, [location], model='small')
+        if not landmarks:
+            return None
+        points = landmarks[0]
+        left_eye = np.mean(points['left_eye'], axis=0)
+        right_eye = np.mean(points['right_eye'], axis=0)
+        nose = np.mean(points['nose_tip'], axis=0)
+        eye_span = right_eye[0] - left_eye[0]
+        if abs(eye_span) < 1.0:
+            return 90.0
+        offset = ((nose[0] - left_eye[0]) / eye_span - 0.5) * 2.0
+        return float(np.degrees(np.arcsin(np.clip(offset, -1.0, 1.0))))
+
+    def assess(self, rgb_frame, location):
+        """Returns: (ok, reason, metrics) - reason là '' khi đạt"""
+        top, right, bottom, left = location
+        metrics = {'size': min(right - left, bottom - top)}
+        reason = ''
+        crop = rgb_frame[max(0, top):bottom, max(0, left):right]
+        if metrics['size'] < self.min_size or crop.size == 0:
+            reason = 'small'
+        else:
+            gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+            metrics['brightness'] = float(gray.mean())
+            if metrics['brightness'] < self.min_brightness:
+                reason = 'dark'
+            elif metrics['brightness'] > self.max_brightness:
+                reason = 'bright'
+            else:
+                gray = cv2.resize(gray, self.SHARPNESS_SIZE, interpolation=cv2.INTER_AREA)
+                metrics['sharpness'] = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+                if metrics['sharpness'] < self.min_sharpness:
+                    reason = 'blur'
+                elif self.max_yaw > 0:
+                    yaw = self.estimate_yaw(rgb_frame, location)
+                    metrics['yaw'] = yaw
+                    if yaw is None or abs(yaw) > self.max_yaw:
+                        reason = 'yaw'
+
+        self.stats[reason or 'passed'] += 1
+        return not reason, reason, metrics
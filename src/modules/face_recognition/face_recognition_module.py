@@ -3,136 +3,305 @@ import cv2
 import face_recognition
 import numpy as np
 from pathlib import Path
-import pickle
 import time
+from collections import Counter
 from datetime import datetime
 
 from ...core.config import (
     FACES_DIR, FACE_RECOGNITION_TOLERANCE, FACE_RECOGNITION_MODEL, 
     FACE_MATCH_MARGIN, STRICT_FOLDER_EXISTENCE, MIN_FACE_DISTANCE, 
     MIN_CONFIDENCE_THRESHOLD, MIN_FACE_SIZE, FACE_DETECTION_UPSAMPLE,
-    ENABLE_PREPROCESSING
+    ENABLE_PREPROCESSING, FACE_INDEX_TYPE, FACE_INDEX_MIN_SIZE, FACE_INDEX_NPROBE,
+    FACE_PROTOTYPE_PRUNING, FACE_TRACKING_ENABLED, FACE_TRACK_IOU_THRESHOLD,
+    FACE_TRACK_REENCODE_INTERVAL, FACE_TRACK_REENCODE_IOU, FACE_TRACK_MAX_MISSES,
+    FACE_TRACKER_BACKEND, FACE_DETECT_INTERVAL, FACE_DETECTION_SCALE,
+    FACE_FULL_SCAN_INTERVAL, FACE_ROI_EXPAND, FACE_ROI_SCALE, FACE_ROI_MOTION_THRESHOLD,
+    FACE_WORKER_PROCESSES, FACE_WORKER_TIMEOUT, FACE_JOURNAL_COMPACT_EVERY, FACE_REBUILD_WORKERS,
+    IDENTITY_POLL_INTERVAL, FACE_NMS_IOU, PREPROCESS_MODE, PREPROCESS_DENOISE,
+    PREPROCESS_DENOISE_SCALE, FACE_QUALITY_ENABLED, FACE_QUALITY_MIN_SHARPNESS,
+    FACE_QUALITY_MIN_BRIGHTNESS, FACE_QUALITY_MAX_BRIGHTNESS, FACE_QUALITY_MIN_SIZE,
+    FACE_QUALITY_MAX_YAW, FACE_HOT_SET_SIZE, FACE_HOT_SET_TTL, FACE_HOT_SET_DISTANCE
 )
-from ...utils.utils import load_image_from_path, resize_image
+from ...utils.utils import resize_image
+from ...utils.frame import Frame, as_frame
+from .face_gallery import FaceGallery
+from .face_boxes import as_boxes, box_nms, dedupe_identities, valid_face_mask
+from .face_gallery_builder import GalleryBuilder
+from .face_quality import FaceQualityScorer
+from .face_index import IVFIndex, create_index
+from .face_store import FaceEncodingStore
+from .face_tracker import FaceTracker
+from .face_worker_pool import FaceWorkerPool
+from .frame_preprocessor import FramePreprocessor
+from .identity_registry import IdentityRegistry
+from .recent_faces import RecentFaceCache
+from .motion_detector import MotionDetector
 
 class FaceRecognitionModule:
     def __init__(self, logger):
         """Initialize the face recognition module"""
         self.logger = logger
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
-        self.encodings_file = FACES_DIR / 'encodings.pkl'
+        self.gallery = self._create_gallery()
+        self.store = FaceEncodingStore(FACES_DIR, compact_every=FACE_JOURNAL_COMPACT_EVERY)
+        self.index_file = FACES_DIR / 'encodings.ivf.npz'
+        self._saved_index_version = 0
+        
+        # Danh sách thư mục người dùng trong RAM, thread nền theo dõi thay đổi
+        self.registry = IdentityRegistry(FACES_DIR, poll_interval=IDENTITY_POLL_INTERVAL)
+        self._registry_version = -1
+        self._changed_persons = set()  # Change feed cho reload_changes()
+        self._added_encodings = 0  # Encoding add_face() thêm kể từ lần reload_changes() trước
+        
+        # Hot set người vừa gặp: so khớp trước, chỉ quét toàn gallery khi không dứt khoát
+        self.recent_faces = None
+        if FACE_HOT_SET_SIZE > 0:
+            self.recent_faces = RecentFaceCache(
+                capacity=FACE_HOT_SET_SIZE,
+                ttl=FACE_HOT_SET_TTL,
+                max_distance=FACE_HOT_SET_DISTANCE,
+                margin=FACE_MATCH_MARGIN
+            )
+        if STRICT_FOLDER_EXISTENCE:
+            self.registry.start()
+        
+        # Tiền xử lý ánh sáng yếu (CLAHE/LUT dùng lại giữa các frame)
+        self.preprocessor = None
+        if ENABLE_PREPROCESSING:
+            self.preprocessor = FramePreprocessor(
+                mode=PREPROCESS_MODE,
+                denoise=PREPROCESS_DENOISE,
+                denoise_scale=PREPROCESS_DENOISE_SCALE
+            )
+        
+        # ROI detection: chỉ quét quanh vị trí khuôn mặt cũ giữa các lần quét toàn frame
+        self.motion_detector = MotionDetector()
+        self._last_face_locations = []
+        self._frames_since_full_scan = 0
+        self.detection_stats = {'full_scans': 0, 'roi_scans': 0, 'motion_scans': 0}
+        
+        # Tracker: identity đi theo track, chỉ encode lại khi cần
+        self.tracker = None
+        if FACE_TRACKING_ENABLED:
+            self.tracker = FaceTracker(
+                iou_threshold=FACE_TRACK_IOU_THRESHOLD,
+                reencode_interval=FACE_TRACK_REENCODE_INTERVAL,
+                reencode_iou=FACE_TRACK_REENCODE_IOU,
+                max_misses=FACE_TRACK_MAX_MISSES,
+                cv_backend=FACE_TRACKER_BACKEND
+            )
+        
+        # Quality gate: không encode crop mờ, thiếu sáng hoặc quay nghiêng
+        self.quality = None
+        if FACE_QUALITY_ENABLED:
+            self.quality = FaceQualityScorer(
+                min_sharpness=FACE_QUALITY_MIN_SHARPNESS,
+                min_brightness=FACE_QUALITY_MIN_BRIGHTNESS,
+                max_brightness=FACE_QUALITY_MAX_BRIGHTNESS,
+                min_size=FACE_QUALITY_MIN_SIZE,
+                max_yaw=FACE_QUALITY_MAX_YAW
+            )
+        
+        # Worker pool: detect + encode trên nhiều process, match vẫn ở process chính
+        self.worker_pool = None
+        if FACE_WORKER_PROCESSES > 0:
+            self.worker_pool = FaceWorkerPool(
+                FACE_WORKER_PROCESSES,
+                model=FACE_RECOGNITION_MODEL,
+                upsample=FACE_DETECTION_UPSAMPLE,
+                scale=FACE_DETECTION_SCALE,
+                task_timeout=FACE_WORKER_TIMEOUT,
+                quality_params=self.quality.params() if self.quality is not None else None,
+                roi_scale=FACE_ROI_SCALE,
+                skip_iou=FACE_TRACK_REENCODE_IOU
+            )
         
         # Load existing face encodings if available
         self.load_known_faces()
     
+    def _create_gallery(self):
+        """Tạo gallery với search index theo cấu hình FACE_INDEX_TYPE"""
+        if FACE_INDEX_TYPE == 'exact':
+            return FaceGallery(use_prototypes=FACE_PROTOTYPE_PRUNING)
+        index_min_size = 1 if FACE_INDEX_TYPE == 'ivf' else FACE_INDEX_MIN_SIZE
+        return FaceGallery(
+            index=create_index('ivf', n_probe=FACE_INDEX_NPROBE),
+            index_min_size=index_min_size,
+            use_prototypes=FACE_PROTOTYPE_PRUNING
+        )
+    
+    def _load_or_build_index(self):
+        """Dùng lại index đã lưu cạnh snapshot encodings nếu còn khớp, nếu không thì build lại"""
+        if self.gallery.index.kind == 'ivf' and len(self.gallery) >= self.gallery.index_min_size:
+            if os.path.exists(self.index_file):
+                try:
+                    index = IVFIndex.load(self.index_file, self.gallery.encodings, n_probe=FACE_INDEX_NPROBE)
+                    if index is not None:
+                        self.gallery.set_index(index)
+                        self._saved_index_version = self.gallery.index_version
+                        return
+                except Exception as e:
+                    print(f"Error loading face index: {e}")
+        self.gallery.build_index()
+        self._save_index()
+    
+    def _save_index(self):
+        """Lưu index khi nó vừa được build lại"""
+        if not self.gallery.index_active() or self.gallery.index_version == self._saved_index_version:
+            return
+        try:
+            self.gallery.index.save(self.index_file)
+            self._saved_index_version = self.gallery.index_version
+        except Exception as e:
+            print(f"Error saving face index: {e}")
+    
+    @property
+    def known_face_encodings(self):
+        """Ma trận float32 (N x 128) của các encoding đã biết"""
+        return self.gallery.encodings
+    
+    @property
+    def known_face_names(self):
+        return self.gallery.names
+    
+    @property
+    def known_face_ids(self):
+        return self.gallery.ids
+    
     def load_known_faces(self):
         """Load known face encodings from file or directory"""
-        # Try to load from pickle file first (faster)
-        if os.path.exists(self.encodings_file):
+        # Identity đang mang theo track có thể đã lỗi thời với gallery mới
+        if self.tracker is not None:
+            self.tracker.reset()
+        if self.recent_faces is not None:
+            self.recent_faces.clear()
+        self.registry.refresh()
+        self._registry_version = -1
+        
+        # Try to load snapshot + journal first (faster)
+        if self.store.exists():
             try:
-                with open(self.encodings_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_face_encodings = data.get('encodings', [])
-                    self.known_face_names = data.get('names', [])
-                    self.known_face_ids = data.get('ids', [])
-                print(f"Loaded {len(self.known_face_encodings)} face encodings from file")
+                matrix, sq_norms, ids, names = self.store.load()
+                self.gallery.set(matrix, ids, names, build_index=False, sq_norms=sq_norms)
+                self._load_or_build_index()
+                if self.store.needs_migration() or self.store.needs_compaction():
+                    self._save_encodings()
+                print(f"Loaded {len(self.gallery)} face encodings from file ({self.store.journal_records} from journal)")
                 return
             except Exception as e:
                 print(f"Error loading face encodings: {e}")
         
-        # If pickle file doesn't exist or has an error, load from image files
+        # If snapshot doesn't exist or has an error, load from image files
         self._load_from_image_files()
     
     def _load_from_image_files(self):
         """Load face encodings from image files in the faces directory"""
-        # Reset lists
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
-        
         # Ensure the faces directory exists
         os.makedirs(FACES_DIR, exist_ok=True)
         
-        # Get all subdirectories (one per person)
-        person_dirs = [d for d in FACES_DIR.iterdir() if d.is_dir()]
+        # Encode song song, ảnh không đổi lấy lại từ cache theo hash nội dung
+        builder = GalleryBuilder(FACES_DIR, workers=FACE_REBUILD_WORKERS)
+        encodings, ids, names = builder.build()
         
-        for person_dir in person_dirs:
-            person_id = person_dir.name
-            
-            # Get person name from metadata file if it exists
-            person_name = person_id
-            metadata_file = person_dir / 'metadata.txt'
-            if metadata_file.exists():
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    person_name = f.read().strip()
-            
-            # Get all image files for this person
-            image_files = list(person_dir.glob('*.jpg')) + list(person_dir.glob('*.png'))
-            
-            if not image_files:
-                continue
-                
-            # Process each image file
-            for image_file in image_files:
-                image = load_image_from_path(image_file)
-                if image is None:
-                    continue
-                
-                # Find face encodings in the image
-                face_encodings = face_recognition.face_encodings(image)
-                
-                if face_encodings:
-                    # Use the first face encoding found
-                    self.known_face_encodings.append(face_encodings[0])
-                    self.known_face_names.append(person_name)
-                    self.known_face_ids.append(person_id)
+        self.gallery.set(encodings, ids, names, build_index=False)
+        self._load_or_build_index()
         
         # Save encodings to file for faster loading next time
-        if self.known_face_encodings:
+        if len(self.gallery) > 0:
             self._save_encodings()
             
-        print(f"Loaded {len(self.known_face_encodings)} face encodings from image files")
+        print(f"Loaded {len(self.gallery)} face encodings from image files")
     
-    def _save_encodings(self):
-        """Save face encodings to a pickle file for faster loading"""
-        data = {
-            'encodings': self.known_face_encodings,
-            'names': self.known_face_names,
-            'ids': self.known_face_ids
-        }
+    def reload_changes(self):
+        """
+        Delta reload: áp dụng encoding mới trong journal (do process khác ghi), loại người
+        đã bị xóa thư mục, và gom các thay đổi của chính process này kể từ lần gọi trước.
+        Chỉ load lại toàn bộ khi snapshot đã bị compact sang generation khác.
+        Returns: dict {persons: set person_id bị ảnh hưởng, added: số encoding thêm (gồm cả
+        add_face của process này), full: bool}
+        """
+        added = 0
+        updates = self.store.read_updates()
+        full = updates is None
+        if full:
+            before = Counter(self.gallery.ids)
+            self.load_known_faces()
+            after = Counter(self.gallery.ids)
+            self._changed_persons.update(p for p in before.keys() | after.keys() if before[p] != after[p])
+            added = max(0, len(self.gallery) - sum(before.values()))
+        else:
+            for encoding, person_id, person_name in updates:
+                self.gallery.add(encoding, person_id, person_name)
+                self._changed_persons.add(person_id)
+            added = len(updates)
+            if self.store.needs_compaction():
+                self._save_encodings()
+            else:
+                self._save_index()
         
-        os.makedirs(FACES_DIR, exist_ok=True)
+        # Thư mục mới/bị xóa kể từ lần quét trước
+        self.registry.refresh()
+        self._sync_registry()
         
-        with open(self.encodings_file, 'wb') as f:
-            pickle.dump(data, f)
+        changed, self._changed_persons = self._changed_persons, set()
+        added += self._added_encodings
+        self._added_encodings = 0
+        if changed and self.tracker is not None:
+            # Track đang mang "Unknown" có thể khớp với người vừa thêm
+            self.tracker.reset()
+        if changed and self.recent_faces is not None:
+            # Người mới có thể gần hơn kết quả hot set
+            self.recent_faces.clear()
+        return {'persons': changed, 'added': added, 'full': full}
+    
+    def _save_encodings(self):
+        """Compact toàn bộ gallery vào snapshot (ghi atomic) và bắt đầu journal mới"""
+        if not self.store.write_snapshot(self.gallery.encodings, self.gallery.ids, self.gallery.names):
+            # Process khác vừa ghi/compact store: lấy thay đổi của nó ở reload_changes rồi compact sau
+            self._save_index()
+            return
+        self._save_index()
+        
+        # Dùng lại bản mmap của snapshot vừa ghi thay cho bản copy trong RAM
+        try:
+            matrix, sq_norms = self.store.open_snapshot()
+            self.gallery.use_storage(matrix, sq_norms)
+        except Exception as e:
+            print(f"Error reopening face store: {e}")
     
     def add_face(self, face_image, person_id, person_name):
         """Add a new face to the known faces"""
         if face_image is None:
             return False
 
-        # Ensure RGB color for encoding
-        try:
-            face_rgb = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-        except Exception:
-            face_rgb = face_image
+        # Ensure RGB color for encoding (Frame: dùng lại view RGB đã có từ bước detect)
+        frame = face_image if isinstance(face_image, Frame) else None
+        if frame is not None:
+            face_rgb = frame.rgb(stage='register')
+        else:
+            try:
+                face_rgb = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
+            except Exception:
+                face_rgb = face_image
         # Get face encoding
         face_encodings = face_recognition.face_encodings(face_rgb)
 
         if not face_encodings:
             return False
 
-        # Add to known faces
-        self.known_face_encodings.append(face_encodings[0])
-        self.known_face_names.append(person_name)
-        self.known_face_ids.append(person_id)
-
-        # Save the face image
+        # Tạo thư mục trước khi thêm vào registry/gallery: nếu watcher quét lại giữa chừng
+        # mà chưa thấy thư mục thì _sync_registry sẽ evict ngay người vừa đăng ký
         person_dir = FACES_DIR / person_id
         os.makedirs(person_dir, exist_ok=True)
 
+        # Add to known faces
+        self.registry.add(person_id)
+        self.gallery.add(face_encodings[0], person_id, person_name)
+        self._changed_persons.add(person_id)
+        self._added_encodings += 1
+        if self.recent_faces is not None:
+            # Khoảng cách tách biệt đã cache của hot set không tính tới sample mới
+            self.recent_faces.clear()
+
         # Save metadata
         with open(person_dir / 'metadata.txt', 'w', encoding='utf-8') as f:
             f.write(person_name)
@@ -142,13 +311,20 @@ class FaceRecognitionModule:
         image_path = person_dir / f"{timestamp}.jpg"
         
         # Convert RGB to BGR for OpenCV
-        try:
-            cv2.imwrite(str(image_path), cv2.cvtColor(face_rgb, cv2.COLOR_RGB2BGR))
-        except Exception:
-            cv2.imwrite(str(image_path), face_image)
+        if frame is not None:
+            cv2.imwrite(str(image_path), frame.image)
+        else:
+            try:
+                cv2.imwrite(str(image_path), cv2.cvtColor(face_rgb, cv2.COLOR_RGB2BGR))
+            except Exception:
+                cv2.imwrite(str(image_path), face_image)
         
-        # Update encodings file
-        self._save_encodings()
+        # Chỉ ghi nối record mới vào journal, compact định kỳ
+        self.store.append(face_encodings[0], person_id, person_name)
+        if self.store.needs_compaction():
+            self._save_encodings()
+        else:
+            self._save_index()
         
         return True
         
@@ -188,171 +364,150 @@ class FaceRecognitionModule:
             print(f"Error capturing face from frame: {e}")
             return None
     
-    def _calculate_face_center(self, location):
-        """Tính tọa độ trung tâm của khuôn mặt"""
-        top, right, bottom, left = location
-        center_x = (left + right) / 2
-        center_y = (top + bottom) / 2
-        return (center_x, center_y)
-    
-    def _calculate_distance(self, point1, point2):
-        """Tính khoảng cách Euclidean giữa 2 điểm"""
-        return np.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
+    def _unique_face_indices(self, face_data_list):
+        """Index các khuôn mặt giữ lại sau khi loại trùng (cùng 1 người được nhận diện nhiều lần)"""
+        if len(face_data_list) <= 1:
+            return list(range(len(face_data_list)))
+        keep = dedupe_identities(
+            [face['person_id'] for face in face_data_list],
+            [face['confidence'] for face in face_data_list],
+            [face['location'] for face in face_data_list],
+            MIN_FACE_DISTANCE
+        )
+        return keep.tolist()
     
     def _remove_duplicate_faces(self, results):
         """Loại bỏ các khuôn mặt trùng lặp (cùng 1 người được nhận diện nhiều lần)"""
-        if len(results) <= 1:
-            return results
-        
-        # Nhóm các khuôn mặt theo person_id
-        person_groups = {}
-        for result in results:
-            person_id = result['person_id']
-            if person_id not in person_groups:
-                person_groups[person_id] = []
-            person_groups[person_id].append(result)
-        
-        # Với mỗi person_id, chỉ giữ lại khuôn mặt có confidence cao nhất
-        filtered_results = []
-        for person_id, faces in person_groups.items():
-            if person_id == "unknown":
-                # Với unknown, kiểm tra khoảng cách giữa các khuôn mặt
-                # Chỉ giữ những khuôn mặt cách xa nhau
-                unique_unknowns = []
-                for face in faces:
-                    face_center = self._calculate_face_center(face['location'])
-                    is_duplicate = False
-                    
-                    for existing_face in unique_unknowns:
-                        existing_center = self._calculate_face_center(existing_face['location'])
-                        distance = self._calculate_distance(face_center, existing_center)
-                        
-                        if distance < MIN_FACE_DISTANCE:
-                            # Đây là duplicate, giữ cái có confidence cao hơn
-                            is_duplicate = True
-                            if face['confidence'] > existing_face['confidence']:
-                                unique_unknowns.remove(existing_face)
-                                unique_unknowns.append(face)
-                            break
-                    
-                    if not is_duplicate:
-                        unique_unknowns.append(face)
-                
-                filtered_results.extend(unique_unknowns)
-            else:
-                # Với người đã biết, chỉ giữ khuôn mặt có confidence cao nhất
-                best_face = max(faces, key=lambda x: x['confidence'])
-                filtered_results.append(best_face)
-        
-        return filtered_results
+        return [results[i] for i in self._unique_face_indices(results)]
+    
+    def _filter_face_locations(self, locations):
+        """Validate tất cả box một lượt rồi NMS (box lớn hơn được ưu tiên). Returns: index box giữ lại"""
+        if not locations:
+            return []
+        valid = np.flatnonzero(valid_face_mask(locations, MIN_FACE_SIZE))
+        if len(valid) <= 1:
+            return valid.tolist()
+        boxes = as_boxes(locations)[valid]
+        areas = (boxes[:, 1] - boxes[:, 3]) * (boxes[:, 2] - boxes[:, 0])
+        return valid[box_nms(boxes, areas, FACE_NMS_IOU)].tolist()
     
     def _preprocess_frame(self, frame):
         """Tiền xử lý frame để cải thiện nhận diện trong điều kiện ánh sáng kém"""
         try:
-            # Chuyển sang grayscale để kiểm tra độ sáng
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Tính độ sáng trung bình
-            brightness = np.mean(gray)
-            
-            # Nếu quá tối hoặc quá sáng, điều chỉnh
-            if brightness < 80:  # Quá tối
-                # Tăng độ sáng
-                frame = cv2.convertScaleAbs(frame, alpha=1.3, beta=30)
-            elif brightness > 180:  # Quá sáng
-                # Giảm độ sáng
-                frame = cv2.convertScaleAbs(frame, alpha=0.8, beta=-20)
-            
-            # Áp dụng histogram equalization để cân bằng ánh sáng
-            lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            l = clahe.apply(l)
-            frame = cv2.merge([l, a, b])
-            frame = cv2.cvtColor(frame, cv2.COLOR_LAB2BGR)
-            
-            # Giảm nhiễu
-            frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
-            
-            return frame
+            # Khử nhiễu chỉ quanh các khuôn mặt đã thấy ở frame trước
+            return self.preprocessor.process(frame, self._face_rois(frame.shape))
         except Exception as e:
             print(f"Lỗi tiền xử lý frame: {e}")
             return frame
     
-    def _is_valid_face(self, location):
-        """Kiểm tra xem khuôn mặt có hợp lệ không (đủ lớn, không bị cắt)"""
-        top, right, bottom, left = location
+    def _sync_registry(self):
+        """Loại khỏi gallery những người đã bị xóa thư mục (chạy trên thread nhận diện, không I/O)"""
+        if not STRICT_FOLDER_EXISTENCE or self.registry.version == self._registry_version:
+            return
+        if not self.registry.available:
+            # Không quét được thư mục faces: bỏ qua, đợi lần refresh thành công
+            return
+        self._registry_version = self.registry.version
+        missing = set(self.gallery.ids) - self.registry.persons
+        if missing:
+            removed = self.gallery.remove_persons(missing)
+            self._changed_persons.update(missing)
+            if self.tracker is not None:
+                self.tracker.reset()
+            if self.recent_faces is not None:
+                self.recent_faces.clear()
+            print(f"Evicted {removed} face encodings of {len(missing)} persons without a folder")
+    
+    def _match_encodings(self, face_encodings):
+        """
+        So khớp tất cả encoding của một frame với gallery trong một lượt vector hóa.
+        Hot set người vừa gặp được thử trước; chỉ các encoding không trúng mới quét gallery.
+        Returns: list các dict {name, person_id, confidence, distance, second_distance, index}
+        (kèm candidate_name khi index >= 0)
+        """
+        # Một snapshot cho cả lượt: index trả về luôn khớp với ids/names đang tra
+        snapshot = self.gallery.snapshot()
+        candidates = [None] * len(face_encodings)
+        if self.recent_faces is not None and len(face_encodings):
+            candidates = self.recent_faces.lookup(face_encodings)
+        misses = [i for i, hit in enumerate(candidates) if hit is None]
         
-        # Kiểm tra kích thước
-        width = right - left
-        height = bottom - top
+        best_idx, best_dist, second_dist = self.gallery.match(
+            [face_encodings[i] for i in misses], max_distance=FACE_RECOGNITION_TOLERANCE, state=snapshot
+        )
+        for i, idx, dist, second in zip(misses, best_idx.tolist(), best_dist.tolist(), second_dist.tolist()):
+            candidates[i] = (idx, dist, second)
         
-        if width < MIN_FACE_SIZE or height < MIN_FACE_SIZE:
-            return False
-        
-        # Kiểm tra tỷ lệ (khuôn mặt thường có tỷ lệ gần 1:1)
-        ratio = width / height if height > 0 else 0
-        if ratio < 0.6 or ratio > 1.4:
-            return False
+        missed = set(misses)
+        matches = []
+        for i, (idx, dist, second) in enumerate(candidates):
+            match = {
+                'name': "Unknown",
+                'person_id': "unknown",
+                'confidence': 0.0,
+                'distance': dist,
+                'second_distance': second,
+                'index': idx
+            }
+            matches.append(match)
+            if idx < 0:
+                continue
+            
+            candidate_id = snapshot.ids[idx]
+            match['candidate_name'] = snapshot.names[idx]
+            candidate_dir_ok = True
+            if STRICT_FOLDER_EXISTENCE:
+                candidate_dir_ok = candidate_id in self.registry
+            
+            # Tính confidence trước
+            temp_confidence = max(0.0, 1.0 - dist)
+            
+            # Decision: chỉ chấp nhận nếu:
+            # 1. Candidate tồn tại trong folder
+            # 2. Distance trong tolerance
+            # 3. Confidence đủ cao (>= MIN_CONFIDENCE_THRESHOLD)
+            if candidate_dir_ok and dist <= FACE_RECOGNITION_TOLERANCE and temp_confidence >= MIN_CONFIDENCE_THRESHOLD:
+                match['name'] = snapshot.names[idx]
+                match['person_id'] = candidate_id
+                match['confidence'] = temp_confidence
+                if i in missed and self.recent_faces is not None and snapshot is self.gallery.snapshot():
+                    rows = self.gallery.person_rows(candidate_id, snapshot)
+                    self.recent_faces.remember(candidate_id, rows, snapshot)
         
-        return True
+        return matches
     
     def recognize_faces(self, frame):
         """Recognize faces in a frame and return results"""
+        self._sync_registry()
+        
         # If no known faces, return empty results
-        if not self.known_face_encodings:
+        if len(self.gallery) == 0:
             return []
         
-        # Resize frame for faster processing (scale down by 0.5)
-        small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-        
-        # Convert the image from BGR color (OpenCV) to RGB color (face_recognition)
-        rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        # Resize frame for faster processing (FACE_DETECTION_SCALE, mặc định 0.5) và chuyển sang RGB
+        # (cùng view với lần quét toàn frame của detect_faces_with_encodings trên frame này)
+        rgb_frame = as_frame(frame).rgb(FACE_DETECTION_SCALE, stage='detect')
         
         # Find all face locations and face encodings in the current frame
         face_locations = face_recognition.face_locations(rgb_frame, model=FACE_RECOGNITION_MODEL)
         face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
         
+        # Match toàn bộ khuôn mặt với gallery trong một lượt
+        matches = self._match_encodings(face_encodings)
+        
         results = []
         
         # Loop through each face found in the frame
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-            name = "Unknown"
-            person_id = "unknown"
-            confidence = 0.0
-
-            # Compute distances to all known encodings
-            if len(self.known_face_encodings) > 0:
-                distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                best_idx = int(np.argmin(distances))
-                best_dist = float(distances[best_idx])
-                candidate_id = self.known_face_ids[best_idx]
-                candidate_dir_ok = True
-                if STRICT_FOLDER_EXISTENCE:
-                    candidate_dir_ok = (FACES_DIR / candidate_id).exists()
-                
-                # Tính confidence trước
-                temp_confidence = max(0.0, 1.0 - best_dist)
-                
-                # Decision: chỉ chấp nhận nếu:
-                # 1. Candidate tồn tại trong folder
-                # 2. Distance trong tolerance
-                # 3. Confidence đủ cao (>= MIN_CONFIDENCE_THRESHOLD)
-                if candidate_dir_ok and best_dist <= FACE_RECOGNITION_TOLERANCE and temp_confidence >= MIN_CONFIDENCE_THRESHOLD:
-                    confidence = temp_confidence
-                    name = self.known_face_names[best_idx]
-                    person_id = candidate_id
-                else:
-                    # Không đạt ngưỡng - đánh dấu là Unknown
-                    name = "Unknown"
-                    person_id = "unknown"
-                    confidence = 0.0
+        for (top, right, bottom, left), match in zip(face_locations, matches):
+            name = match['name']
+            person_id = match['person_id']
+            confidence = match['confidence']
             
             # Scale back coordinates to original frame size
-            top *= 2
-            right *= 2
-            bottom *= 2
-            left *= 2
+            top = int(top / FACE_DETECTION_SCALE)
+            right = int(right / FACE_DETECTION_SCALE)
+            bottom = int(bottom / FACE_DETECTION_SCALE)
+            left = int(left / FACE_DETECTION_SCALE)
             
             # Add to results
             results.append({
@@ -375,101 +530,304 @@ class FaceRecognitionModule:
         """Detect and recognize faces in frame, return list of detected faces"""
         return self.recognize_faces(frame)
     
+    def _detect_in_region(self, frame, region, scale):
+        """Chạy face_locations trên một vùng (top, right, bottom, left) hoặc cả frame, trả về tọa độ frame gốc"""
+        if region is None:
+            top, left = 0, 0
+            rgb_image = frame.rgb(scale, stage='detect')
+        else:
+            top, right, bottom, left = region
+            rgb_image = frame.crop_rgb(region, scale, stage='detect')
+            if rgb_image.size == 0:
+                return []
+        
+        locations = face_recognition.face_locations(
+            rgb_image,
+            model=FACE_RECOGNITION_MODEL,
+            number_of_times_to_upsample=FACE_DETECTION_UPSAMPLE
+        )
+        return [
+            (int(t / scale) + top, int(r / scale) + left, int(b / scale) + top, int(l / scale) + left)
+            for t, r, b, l in locations
+        ]
+    
+    def _face_rois(self, frame_shape):
+        """Vùng tìm kiếm: box cũ nới rộng FACE_ROI_EXPAND mỗi phía, gộp các vùng chồng nhau"""
+        height, width = frame_shape[:2]
+        rois = []
+        for top, right, bottom, left in self._last_face_locations:
+            pad_x = int((right - left) * FACE_ROI_EXPAND)
+            pad_y = int((bottom - top) * FACE_ROI_EXPAND)
+            rois.append([max(0, top - pad_y), min(width, right + pad_x),
+                         min(height, bottom + pad_y), max(0, left - pad_x)])
+        
+        merged = True
+        while merged and len(rois) > 1:
+            merged = False
+            for i in range(len(rois)):
+                for j in range(i + 1, len(rois)):
+                    a, b = rois[i], rois[j]
+                    if a[3] < b[1] and b[3] < a[1] and a[0] < b[2] and b[0] < a[2]:
+                        rois[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                        del rois[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return [tuple(roi) for roi in rois]
+    
+    def _plan_detection(self, frame):
+        """
+        Chọn vùng detect: ROI quanh các khuôn mặt đã biết, hoặc None (quét toàn frame) mỗi
+        FACE_FULL_SCAN_INTERVAL frame, khi có chuyển động ngoài ROI hoặc khi chưa có ROI.
+        """
+        self.motion_detector.update(frame)
+        self._frames_since_full_scan += 1
+        
+        rois = self._face_rois(frame.shape)
+        if not rois or self._frames_since_full_scan >= FACE_FULL_SCAN_INTERVAL:
+            return None
+        if self.motion_detector.changed_fraction(frame.shape, rois) > FACE_ROI_MOTION_THRESHOLD:
+            self.detection_stats['motion_scans'] += 1
+            return None
+        return rois
+    
+    def _count_scan(self, full_scan):
+        if full_scan:
+            self._frames_since_full_scan = 0
+            self.detection_stats['full_scans'] += 1
+        else:
+            self.detection_stats['roi_scans'] += 1
+    
+    def _detect_face_locations(self, frame):
+        """Detect trong ROI theo _plan_detection; ROI mất dấu thì quét toàn frame"""
+        rois = self._plan_detection(frame)
+        if rois is not None:
+            locations = []
+            for roi in rois:
+                locations.extend(self._detect_in_region(frame, roi, FACE_ROI_SCALE))
+            if locations:
+                self._count_scan(False)
+                return locations
+        
+        self._count_scan(True)
+        return self._detect_in_region(frame, None, FACE_DETECTION_SCALE)
+    
     def detect_faces_with_encodings(self, frame):
-        """Detect faces và trả về cả face data và encodings"""
+        """Detect faces và trả về cả face data và encodings (frame: Frame hoặc ảnh BGR)"""
         try:
-            # Tiền xử lý frame (nếu được bật)
+            frame = as_frame(frame)
+            self._sync_registry()
+            
+            # Giữa các lần detect: dời box bằng OpenCV tracker, không detect/encode
+            if (self.tracker is not None and self.tracker.frame_index % FACE_DETECT_INTERVAL != 0
+                    and self.tracker.can_propagate()):
+                tracked = self.tracker.propagate(frame.image)
+                if tracked is not None:
+                    self._last_face_locations = [track.location for track in tracked]
+                    results = []
+                    for track in tracked:
+                        face_data, face_encoding = self.tracker.reuse(track)
+                        results.append({'face_data': face_data, 'encoding': face_encoding})
+                    return results
+            
+            # Tiền xử lý frame (nếu được bật) - ảnh khác nên có bộ view riêng
             if ENABLE_PREPROCESSING:
-                processed_frame = self._preprocess_frame(frame)
+                processed_frame = Frame(self._preprocess_frame(frame.image), frame.timestamp)
             else:
                 processed_frame = frame
             
-            # Resize frame
-            small_frame = cv2.resize(processed_frame, (0, 0), fx=0.5, fy=0.5)
-            rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+            # Detect faces: quanh vị trí cũ ở độ phân giải gốc, định kỳ quét toàn frame
+            face_locations = self._detect_face_locations(processed_frame)
             
-            # Detect faces
-            face_locations = face_recognition.face_locations(
-                rgb_frame,
-                model=FACE_RECOGNITION_MODEL,
-                number_of_times_to_upsample=FACE_DETECTION_UPSAMPLE
-            )
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+            # Validate + NMS trước khi encode (không encode box không hợp lệ hoặc trùng)
+            valid_faces = [face_locations[i] for i in self._filter_face_locations(face_locations)]
+            self._last_face_locations = valid_faces
             
-            results = []
+            # Ghép với track cũ: chỉ encode face mới, quá hạn hoặc track kém tin cậy
+            if self.tracker is not None:
+                associations = self.tracker.update(valid_faces, frame.image)
+            else:
+                associations = [(None, True)] * len(valid_faces)
+            encode_indices = [i for i, (_, needs_encoding) in enumerate(associations) if needs_encoding]
             
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                # Scale back
-                top *= 2
-                right *= 2
-                bottom *= 2
-                left *= 2
-                
-                # Validate
-                if not self._is_valid_face((top, right, bottom, left)):
-                    continue
-                
-                name = "Unknown"
-                person_id = "unknown"
-                confidence = 0.0
-                
-                # Match với known faces
-                if len(self.known_face_encodings) > 0:
-                    distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    best_idx = int(np.argmin(distances))
-                    best_dist = float(distances[best_idx])
-                    candidate_id = self.known_face_ids[best_idx]
-                    candidate_dir_ok = True
-                    
-                    if STRICT_FOLDER_EXISTENCE:
-                        candidate_dir_ok = (FACES_DIR / candidate_id).exists()
-                    
-                    temp_confidence = max(0.0, 1.0 - best_dist)
-                    
-                    # Debug logging
-                    print(f"[DEBUG] Matching: {self.known_face_names[best_idx]} - Distance: {best_dist:.3f}, Confidence: {temp_confidence:.3f}")
-                    print(f"[DEBUG] Thresholds: Tolerance={FACE_RECOGNITION_TOLERANCE}, Min_Confidence={MIN_CONFIDENCE_THRESHOLD}")
-                    
-                    if candidate_dir_ok and best_dist <= FACE_RECOGNITION_TOLERANCE and temp_confidence >= MIN_CONFIDENCE_THRESHOLD:
-                        confidence = temp_confidence
-                        name = self.known_face_names[best_idx]
-                        person_id = candidate_id
-                        print(f"[DEBUG] ✅ MATCHED: {name} (distance: {best_dist:.3f}, confidence: {confidence:.3f})")
-                    else:
-                        print(f"[DEBUG] ❌ NOT MATCHED: distance={best_dist:.3f} > {FACE_RECOGNITION_TOLERANCE} OR confidence={temp_confidence:.3f} < {MIN_CONFIDENCE_THRESHOLD}")
-                
-                # Tạo face data
-                face_data = {
-                    'name': name,
-                    'person_id': person_id,
-                    'confidence': confidence,
-                    'location': (top, right, bottom, left)
-                }
-                
-                # Log nếu là known
-                if name != "Unknown" and confidence >= 0.5:
-                    self.logger.log_recognition(person_id, name, "face", confidence)
-                
+            # Encode trên frame gốc (box đã ở tọa độ frame gốc)
+            face_encodings = []
+            skipped = {}
+            if encode_indices:
+                rgb_frame = processed_frame.rgb(stage='encode')
+                if self.quality is not None:
+                    encode_indices, skipped = self._quality_filter(rgb_frame, valid_faces, encode_indices)
+                if encode_indices:
+                    face_encodings = face_recognition.face_encodings(
+                        rgb_frame, [valid_faces[i] for i in encode_indices]
+                    )
+            
+            return self._build_face_results(valid_faces, associations, encode_indices, face_encodings, skipped)
+            
+        except Exception as e:
+            print(f"Error in detect_faces_with_encodings: {e}")
+            return []
+    
+    def _quality_filter(self, rgb_frame, valid_faces, encode_indices):
+        """Tách các face đủ chất lượng để encode. Returns: (index giữ lại, {index: lý do bỏ qua})"""
+        keep = []
+        skipped = {}
+        for i in encode_indices:
+            ok, reason, _ = self.quality.assess(rgb_frame, valid_faces[i])
+            if ok:
+                keep.append(i)
+            else:
+                skipped[i] = reason
+        return keep, skipped
+    
+    def _build_face_results(self, valid_faces, associations, encode_indices, face_encodings, skipped=None):
+        """
+        Match các encoding mới, gắn identity vào track và loại trùng. Returns: list {face_data, encoding}.
+        skipped: {index: lý do} các face bị quality gate bỏ qua - giữ identity của track nếu có,
+        nếu chưa có thì trả về Unknown không kèm encoding (encode lại ở frame sau).
+        """
+        skipped = skipped or {}
+        # Match toàn bộ khuôn mặt với gallery trong một lượt
+        matches = self._match_encodings(face_encodings)
+        encoded = dict(zip(encode_indices, zip(face_encodings, matches)))
+        
+        results = []
+        
+        for i, (top, right, bottom, left) in enumerate(valid_faces):
+            track = associations[i][0]
+            
+            if i not in encoded:
+                if track is not None and track.identified:
+                    # Identity đi theo track, không cần encode lại
+                    face_data, face_encoding = self.tracker.reuse(track)
+                else:
+                    # Chất lượng kém và chưa có identity: chưa encode
+                    face_data = {
+                        'name': "Unknown",
+                        'person_id': "unknown",
+                        'confidence': 0.0,
+                        'location': (top, right, bottom, left)
+                    }
+                    if track is not None:
+                        face_data['track_id'] = track.track_id
+                    face_encoding = None
+                if i in skipped:
+                    face_data['quality'] = skipped[i]
                 results.append({
                     'face_data': face_data,
                     'encoding': face_encoding
                 })
+                continue
             
-            # Remove duplicates
-            face_data_list = [r['face_data'] for r in results]
-            filtered_face_data = self._remove_duplicate_faces(face_data_list)
+            face_encoding, match = encoded[i]
+            name = match['name']
+            person_id = match['person_id']
+            confidence = match['confidence']
             
-            # Lọc results để chỉ giữ những face không bị duplicate
-            filtered_results = []
-            for r in results:
-                if r['face_data'] in filtered_face_data:
-                    filtered_results.append(r)
+            if match['index'] >= 0:
+                best_dist = match['distance']
+                temp_confidence = max(0.0, 1.0 - best_dist)
+                
+                # Debug logging
+                print(f"[DEBUG] Matching: {match['candidate_name']} - Distance: {best_dist:.3f}, Confidence: {temp_confidence:.3f}")
+                print(f"[DEBUG] Thresholds: Tolerance={FACE_RECOGNITION_TOLERANCE}, Min_Confidence={MIN_CONFIDENCE_THRESHOLD}")
+                
+                if person_id != "unknown":
+                    print(f"[DEBUG] ✅ MATCHED: {name} (distance: {best_dist:.3f}, confidence: {confidence:.3f})")
+                else:
+                    print(f"[DEBUG] ❌ NOT MATCHED: distance={best_dist:.3f} > {FACE_RECOGNITION_TOLERANCE} OR confidence={temp_confidence:.3f} < {MIN_CONFIDENCE_THRESHOLD}")
             
-            return filtered_results
+            # Tạo face data
+            face_data = {
+                'name': name,
+                'person_id': person_id,
+                'confidence': confidence,
+                'location': (top, right, bottom, left)
+            }
+            if track is not None:
+                face_data['track_id'] = track.track_id
+                self.tracker.assign(track, face_data, face_encoding)
             
-        except Exception as e:
-            print(f"Error in detect_faces_with_encodings: {e}")
+            # Log nếu là known
+            if name != "Unknown" and confidence >= 0.5:
+                self.logger.log_recognition(person_id, name, "face", confidence)
+            
+            results.append({
+                'face_data': face_data,
+                'encoding': face_encoding
+            })
+        
+        # Remove duplicates (theo index, không so sánh dict)
+        keep = self._unique_face_indices([r['face_data'] for r in results])
+        return [results[i] for i in keep]
+    
+    def submit_frame(self, frame):
+        """
+        Gửi frame cho worker pool. Returns: seq của frame hoặc None nếu pool không nhận.
+        Worker nhận frame đã tiền xử lý, ROI theo _plan_detection và box các track đã có identity
+        (không encode lại), nên pool giữ các tối ưu của đường tuần tự. Riêng OpenCV tracker
+        (FACE_DETECT_INTERVAL) chỉ chạy ở đường tuần tự: kết quả của pool về trễ vài frame.
+        """
+        if self.worker_pool is None:
+            return None
+        frame = as_frame(frame)
+        image = frame.image
+        if not self.worker_pool.fits(image):
+            return None
+        if ENABLE_PREPROCESSING:
+            image = self._preprocess_frame(image)
+        rois = self._plan_detection(frame)
+        skip_boxes = self.tracker.stable_boxes() if self.tracker is not None else None
+        return self.worker_pool.submit(image, rois, skip_boxes)
+    
+    def collect_frame_results(self, timeout=0.0):
+        """
+        Kết quả detect + encode từ worker pool, theo đúng thứ tự frame.
+        Returns: list (seq, faces_with_encodings) giống detect_faces_with_encodings;
+        faces_with_encodings = None với frame worker không xử lý xong (bị bỏ qua)
+        """
+        if self.worker_pool is None:
             return []
+        self._sync_registry()
+        ready = []
+        for seq, locations, encodings, quality_skipped, full_scan in self.worker_pool.collect(timeout):
+            if locations is None:
+                ready.append((seq, None))
+                continue
+            try:
+                self._count_scan(full_scan)
+                valid = self._filter_face_locations(locations)
+                valid_faces = [locations[i] for i in valid]
+                self._last_face_locations = valid_faces
+                
+                if self.tracker is not None:
+                    associations = self.tracker.update(valid_faces)
+                else:
+                    associations = [(None, True)] * len(valid_faces)
+                # Chỉ dùng encoding của face tracker cần encode; face worker bỏ qua vì trùng track
+                # đã có identity thì giữ identity của track (_build_face_results)
+                encode_indices = [
+                    j for j, i in enumerate(valid) if associations[j][1] and encodings[i] is not None
+                ]
+                face_encodings = [encodings[valid[j]] for j in encode_indices]
+                skipped = {j: quality_skipped[i] for j, i in enumerate(valid) if i in quality_skipped}
+                if self.quality is not None:
+                    # Worker chấm trong process riêng: đếm ở đây, chỉ cho các face hợp lệ
+                    self.quality.stats['passed'] += len(encode_indices)
+                    for reason in skipped.values():
+                        self.quality.stats[reason] += 1
+                ready.append((seq, self._build_face_results(valid_faces, associations, encode_indices, face_encodings, skipped)))
+            except Exception as e:
+                print(f"Error in collect_frame_results: {e}")
+                ready.append((seq, []))
+        return ready
+    
+    def close(self):
+        """Dừng worker pool (nếu có) và thread theo dõi thư mục"""
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        self.registry.stop()
     
     def recognize_face(self, face_location):
         """Recognize a single face from face location data"""
@@ -0,0 +1,360 @@
+import io
+import json
+import os
+import pickle
+import struct
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+JOURNAL_MAGIC = b'FEJ1'
+_JOURNAL_HEADER = struct.Struct('<4sQ')  # magic, generation của snapshot mà journal nối tiếp
+_RECORD_HEADER = struct.Struct('<II')  # độ dài payload, crc32(payload)
+
+
+def atomic_write(path, data):
+    """Ghi file qua file tạm + fsync + os.replace: không bao giờ để lại file ghi dở"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _atomic_save_npy(path, array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    atomic_write(path, buffer.getvalue())
+
+
+class FaceEncodingStore:
+    """
+    Lưu gallery dạng snapshot nhị phân + journal chỉ ghi nối (encodings.journal).
+
+    Snapshot (format 2) gồm ma trận float32 encodings.g<N>.npy, norm bình phương
+    encodings.g<N>.norms.npy (mở bằng mmap, nhiều process dùng chung page cache) và
+    sidecar encodings.meta.json chứa ids/names. meta.json được thay cuối cùng nên là
+    điểm commit của snapshot; file .npy mang số generation nên process khác đang mmap
+    snapshot cũ không bị ảnh hưởng khi compact.
+
+    Thêm một khuôn mặt chỉ append một record vào journal (chi phí không phụ thuộc kích
+    thước gallery); journal được gộp vào snapshot mỗi compact_every record. Journal ghi
+    generation mà nó nối tiếp, nên nếu crash sau khi commit snapshot nhưng trước khi
+    reset journal thì journal cũ bị bỏ qua (các record đó đã nằm trong snapshot mới).
+
+    Nhiều process (kiosk, tools/add_user.py) dùng chung store: load()/read_updates() chỉ đọc,
+    mọi thao tác ghi (append, compact, reset journal, cắt đuôi ghi dở) giữ file lock
+    encodings.lock (fcntl.flock; không có fcntl thì không khóa).
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, directory, compact_every=200, dim=128):
+        self.directory = Path(directory)
+        self.meta_path = self.directory / 'encodings.meta.json'
+        self.legacy_path = self.directory / 'encodings.pkl'
+        self.migrated_path = self.directory / 'encodings.pkl.migrated'
+        self.journal_path = self.directory / 'encodings.journal'
+        self.lock_path = self.directory / 'encodings.lock'
+        self.compact_every = compact_every
+        self.dim = dim
+        self.generation = 0
+        self.journal_records = 0
+        self.journal_offset = 0
+        self._own_offsets = set()
+
+    def _matrix_path(self, generation):
+        return self.directory / f'encodings.g{generation}.npy'
+
+    def _norms_path(self, generation):
+        return self.directory / f'encodings.g{generation}.norms.npy'
+
+    def exists(self):
+        return self.meta_path.exists() or self.legacy_path.exists() or self.journal_path.exists()
+
+    def needs_compaction(self):
+        return self.compact_every > 0 and self.journal_records >= self.compact_every
+
+    def needs_migration(self):
+        """Còn encodings.pkl kiểu cũ: cần ghi sang format mmap (nếu chưa) rồi đổi tên nó"""
+        return self.legacy_path.exists()
+
+    @contextmanager
+    def _writer_lock(self):
+        """Khóa độc quyền giữa các process ghi vào store"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a+b') as f:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def load(self, attempts=3):
+        """
+        Mở snapshot (mmap, không copy) rồi replay journal. Chỉ đọc, không sửa file nào.
+        Nếu process khác compact giữa chừng (journal thuộc generation mới hơn, hoặc file .npy
+        vừa bị xóa) thì đọc lại snapshot.
+        Returns: (matrix, sq_norms, ids, names). Nếu journal có record, matrix là bản
+        copy trong RAM cho tới lần compact tiếp theo.
+        """
+        for attempt in range(attempts):
+            try:
+                matrix, sq_norms, ids, names = self._load_snapshot()
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+                continue
+            generation, records, end = self._read_journal()
+            if generation is not None and generation > self.generation and attempt < attempts - 1:
+                continue
+            break
+
+        self.journal_records = 0
+        self.journal_offset = end if generation == self.generation else _JOURNAL_HEADER.size
+        self._own_offsets.clear()
+        if generation != self.generation:
+            # Journal của snapshot cũ (đã được compact, writer sẽ reset) hoặc không đọc được
+            records = []
+        if records:
+            rows = np.stack([encoding for encoding, _, _ in records])
+            matrix = np.concatenate([matrix, rows])
+            sq_norms = np.concatenate([sq_norms, np.einsum('ij,ij->i', rows, rows)])
+            ids.extend(person_id for _, person_id, _ in records)
+            names.extend(person_name for _, _, person_name in records)
+            self.journal_records = len(records)
+        return matrix, sq_norms, ids, names
+
+    def open_snapshot(self):
+        """mmap (matrix, sq_norms) của snapshot generation hiện tại, không đọc journal và không đổi trạng thái"""
+        if not self._matrix_path(self.generation).exists():
+            return np.empty((0, self.dim), dtype=np.float32), np.empty((0,), dtype=np.float32)
+        return (
+            np.load(self._matrix_path(self.generation), mmap_mode='r'),
+            np.load(self._norms_path(self.generation), mmap_mode='r')
+        )
+
+    def _read_generation(self):
+        """Generation của snapshot đang commit trên đĩa"""
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['generation']
+        return self.generation
+
+    def _load_snapshot(self):
+        matrix = np.empty((0, self.dim), dtype=np.float32)
+        sq_norms = np.empty((0,), dtype=np.float32)
+        ids, names = [], []
+        self.generation = 0
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('format') != self.FORMAT_VERSION:
+                raise ValueError(f"Unsupported face store format: {meta.get('format')}")
+            self.generation = meta['generation']
+            ids = list(meta['ids'])
+            names = list(meta['names'])
+            if meta['count'] > 0:
+                matrix = np.load(self._matrix_path(self.generation), mmap_mode='r')
+                sq_norms = np.load(self._norms_path(self.generation), mmap_mode='r')
+            if len(matrix) != meta['count'] or len(ids) != meta['count']:
+                raise ValueError("Face store snapshot is inconsistent")
+        elif self.legacy_path.exists():
+            with open(self.legacy_path, 'rb') as f:
+                data = pickle.load(f)
+            matrix = np.asarray(data.get('encodings', []), dtype=np.float32).reshape(-1, self.dim)
+            sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+            ids = list(data.get('ids', []))
+            names = list(data.get('names', []))
+            self.generation = data.get('generation', 0)
+        return matrix, sq_norms, ids, names
+
+    def _read_journal(self):
+        """
+        Đọc journal, không sửa file. Phần đuôi ghi dở (crash giữa lúc append) chỉ bị bỏ qua;
+        writer cắt nó trước lần append kế tiếp.
+        Returns: (generation hoặc None nếu không có/không đọc được, list record, offset sau record hợp lệ cuối)
+        """
+        if not self.journal_path.exists():
+            return None, [], _JOURNAL_HEADER.size
+        with open(self.journal_path, 'rb') as f:
+            data = f.read()
+        if len(data) < _JOURNAL_HEADER.size:
+            return None, [], _JOURNAL_HEADER.size
+        magic, generation = _JOURNAL_HEADER.unpack_from(data, 0)
+        if magic != JOURNAL_MAGIC:
+            return None, [], _JOURNAL_HEADER.size
+
+        records, offset = self._parse_records(data, _JOURNAL_HEADER.size)
+        if offset < len(data):
+            print(f"Face journal: bỏ qua {len(data) - offset} byte cuối bị hỏng")
+        return generation, [record for _, record in records], offset
+
+    @staticmethod
+    def _parse_records(data, offset):
+        """Đọc các record nguyên vẹn từ offset. Returns: (list (offset, record), offset sau record cuối)"""
+        records = []
+        while offset + _RECORD_HEADER.size <= len(data):
+            length, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            person_id, person_name, raw = pickle.loads(payload)
+            records.append((offset, (np.frombuffer(raw, dtype=np.float32).copy(), person_id, person_name)))
+            offset = start + length
+        return records, offset
+
+    def read_updates(self):
+        """
+        Change feed: các record được ghi vào journal (bởi process khác, ví dụ tools/add_user.py)
+        kể từ lần load/đọc trước. Returns: list (encoding, person_id, person_name), hoặc
+        None nếu snapshot đã được compact sang generation mới hơn (cần load lại toàn bộ).
+        Journal cũ hơn snapshot (chưa được writer reset) không có gì mới.
+        """
+        if not self.journal_path.exists():
+            return []
+        with open(self.journal_path, 'rb') as f:
+            header = f.read(_JOURNAL_HEADER.size)
+            if len(header) < _JOURNAL_HEADER.size:
+                return []
+            magic, generation = _JOURNAL_HEADER.unpack(header)
+            if magic != JOURNAL_MAGIC or generation < self.generation:
+                return []
+            if generation != self.generation:
+                return None
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self.journal_offset:
+                return None
+            f.seek(self.journal_offset)
+            data = f.read()
+
+        records, end = self._parse_records(data, 0)
+        base = self.journal_offset
+        self.journal_offset = base + end
+        updates = []
+        for offset, record in records:
+            if base + offset in self._own_offsets:
+                # Record do chính process này append, đã có trong gallery
+                self._own_offsets.discard(base + offset)
+                continue
+            updates.append(record)
+        self.journal_records += len(updates)
+        return updates
+
+    def _reset_journal(self):
+        """Journal rỗng cho generation hiện tại (chỉ gọi khi giữ writer lock)"""
+        atomic_write(self.journal_path, _JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.generation))
+        self.journal_records = 0
+        self.journal_offset = _JOURNAL_HEADER.size
+        self._own_offsets.clear()
+
+    def append(self, encoding, person_id, person_name):
+        """Ghi nối một record và fsync trước khi trả về"""
+        raw = np.asarray(encoding, dtype=np.float32).tobytes()
+        payload = pickle.dumps((person_id, person_name, raw), protocol=pickle.HIGHEST_PROTOCOL)
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._writer_lock():
+            generation, _, end = self._read_journal()
+            if generation is None or generation < self.generation:
+                # Chưa có journal, không đọc được, hoặc của snapshot cũ
+                self._reset_journal()
+                generation, end = self.generation, _JOURNAL_HEADER.size
+            with open(self.journal_path, 'r+b') as f:
+                if f.seek(0, os.SEEK_END) > end:
+                    # Cắt đuôi ghi dở để record mới nằm ngay sau record hợp lệ cuối
+                    f.truncate(end)
+                position = f.seek(end)
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+        self.journal_records += 1
+        if generation != self.generation:
+            # Process khác đã compact: read_updates() sẽ load lại toàn bộ, gồm cả record này
+            return
+        if position == self.journal_offset:
+            self.journal_offset = position + len(record)
+        else:
+            # Process khác đã ghi xen vào: read_updates sẽ đọc tới và bỏ qua record này
+            self._own_offsets.add(position)
+
+    def _has_foreign_records(self):
+        """Journal có record của process khác mà process này chưa đọc (hoặc đã bị compact bởi process khác)"""
+        generation, _, _ = self._read_journal()
+        if generation is None or generation < self.generation:
+            return False
+        if generation > self.generation:
+            return True
+        offset = self.journal_offset
+        with open(self.journal_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        parsed, _ = self._parse_records(data, 0)
+        return any(offset + record_offset not in self._own_offsets for record_offset, _ in parsed)
+
+    def write_snapshot(self, encodings, ids, names):
+        """
+        Gộp toàn bộ gallery vào snapshot generation mới và bắt đầu journal rỗng.
+        Returns: False (không ghi gì) nếu process khác đã compact hoặc ghi record mà gallery này
+        chưa có: gọi read_updates()/load() trước rồi compact lại sau.
+        """
+        with self._writer_lock():
+            if self._read_generation() != self.generation or self._has_foreign_records():
+                return False
+            self._write_snapshot(encodings, ids, names)
+        return True
+
+    def _write_snapshot(self, encodings, ids, names):
+        matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim))
+        generation = self.generation + 1
+        if len(matrix):
+            _atomic_save_npy(self._matrix_path(generation), matrix)
+            _atomic_save_npy(self._norms_path(generation), np.einsum('ij,ij->i', matrix, matrix))
+        meta = {
+            'format': self.FORMAT_VERSION,
+            'generation': generation,
+            'count': len(matrix),
+            'dim': self.dim,
+            'ids': list(ids),
+            'names': list(names)
+        }
+        atomic_write(self.meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        self.generation = generation
+        self._reset_journal()
+        self._remove_old_generations()
+        self._retire_legacy()
+
+    def _retire_legacy(self):
+        """
+        Đổi tên encodings.pkl kiểu cũ sau khi đã có snapshot: nếu snapshot bị xóa thì build lại
+        từ ảnh thay vì load lại dữ liệu cũ trong pickle
+        """
+        if not self.legacy_path.exists():
+            return
+        try:
+            os.replace(self.legacy_path, self.migrated_path)
+        except OSError as e:
+            print(f"Cannot rename legacy face encodings {self.legacy_path}: {e}")
+
+    def _remove_old_generations(self):
+        """Xóa file .npy của các generation cũ (bỏ qua nếu đang bị mmap trên Windows)"""
+        current = {self._matrix_path(self.generation).name, self._norms_path(self.generation).name}
+        for path in self.directory.glob('encodings.g*.npy'):
+            if path.name in current:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                pass
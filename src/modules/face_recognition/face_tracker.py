@@ -0,0 +1,223 @@
+import itertools
+import cv2
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU giữa hai tập box (top, right, bottom, left) - trả về ma trận (A x B)"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def _create_cv_tracker(backend):
+    """Tạo OpenCV tracker (kcf/csrt/mosse/mil) nếu bản OpenCV hiện tại hỗ trợ"""
+    factory_name = {
+        'kcf': 'TrackerKCF_create',
+        'csrt': 'TrackerCSRT_create',
+        'mosse': 'TrackerMOSSE_create',
+        'mil': 'TrackerMIL_create',
+    }.get(backend)
+    if not factory_name:
+        return None
+    for namespace in (cv2, getattr(cv2, 'legacy', None)):
+        factory = getattr(namespace, factory_name, None) if namespace is not None else None
+        if factory is not None:
+            try:
+                return factory()
+            except Exception:
+                return None
+    return None
+
+
+class FaceTrack:
+    """Một khuôn mặt được theo dõi qua nhiều frame"""
+
+    def __init__(self, track_id, location, frame_index):
+        self.track_id = track_id
+        self.location = tuple(int(v) for v in location)
+        self.face_data = None
+        self.encoding = None
+        self.last_encoded_frame = -1
+        self.last_seen_frame = frame_index
+        self.match_iou = 0.0
+        self.misses = 0
+        self.cv_tracker = None
+
+    @property
+    def identified(self):
+        return self.face_data is not None and self.encoding is not None
+
+
+class FaceTracker:
+    """
+    Gán track ID ổn định cho khuôn mặt bằng IoU (fallback theo tâm box), để
+    identity đi theo track và chỉ encode lại sau mỗi reencode_interval frame
+    hoặc khi độ tin cậy của track giảm (IoU ghép cặp thấp).
+    """
+
+    def __init__(self, iou_threshold=0.3, reencode_interval=10, reencode_iou=0.5,
+                 max_misses=5, cv_backend='none'):
+        self.iou_threshold = iou_threshold
+        self.reencode_interval = reencode_interval
+        self.reencode_iou = reencode_iou
+        self.max_misses = max_misses
+        self.cv_backend = cv_backend
+        self.tracks = {}
+        self.frame_index = 0
+        self._ids = itertools.count(1)
+        self.stats = {'encoded': 0, 'reused': 0, 'tracks_created': 0}
+
+    def reset(self):
+        """Xóa toàn bộ track (ví dụ sau khi gallery thay đổi)"""
+        self.tracks.clear()
+
+    def _associate(self, tracks, locations):
+        """Ghép greedy theo IoU giảm dần, fallback theo khoảng cách tâm"""
+        pairs = {}
+        if not tracks or not locations:
+            return pairs
+        iou = box_iou([t.location for t in tracks], locations)
+        used_tracks = set()
+        used_dets = set()
+        for flat in np.argsort(-iou, axis=None):
+            ti, di = np.unravel_index(flat, iou.shape)
+            if iou[ti, di] < self.iou_threshold:
+                break
+            if ti in used_tracks or di in used_dets:
+                continue
+            used_tracks.add(ti)
+            used_dets.add(di)
+            pairs[di] = (tracks[ti], float(iou[ti, di]))
+
+        # Fallback: tâm box mới nằm trong box cũ (di chuyển nhanh)
+        for di, location in enumerate(locations):
+            if di in pairs:
+                continue
+            top, right, bottom, left = location
+            cx, cy = (left + right) / 2, (top + bottom) / 2
+            for ti, track in enumerate(tracks):
+                if ti in used_tracks:
+                    continue
+                t_top, t_right, t_bottom, t_left = track.location
+                if t_left <= cx <= t_right and t_top <= cy <= t_bottom:
+                    used_tracks.add(ti)
+                    pairs[di] = (track, float(iou[ti, di]))
+                    break
+        return pairs
+
+    def update(self, locations, frame=None):
+        """
+        Cập nhật track với các box phát hiện được trong frame này.
+        Returns: list (track, needs_encoding) song song với locations.
+        """
+        self.frame_index += 1
+        tracks = list(self.tracks.values())
+        pairs = self._associate(tracks, locations)
+
+        results = []
+        seen = set()
+        for di, location in enumerate(locations):
+            if di in pairs:
+                track, match_iou = pairs[di]
+                track.location = tuple(int(v) for v in location)
+                track.match_iou = match_iou
+            else:
+                track = FaceTrack(next(self._ids), location, self.frame_index)
+                track.match_iou = 1.0
+                self.tracks[track.track_id] = track
+                self.stats['tracks_created'] += 1
+            track.last_seen_frame = self.frame_index
+            track.misses = 0
+            seen.add(track.track_id)
+            if frame is not None and self.cv_backend != 'none':
+                self._init_cv_tracker(track, frame)
+            results.append((track, self._needs_encoding(track)))
+
+        for track_id in list(self.tracks):
+            if track_id in seen:
+                continue
+            track = self.tracks[track_id]
+            track.misses += 1
+            if track.misses > self.max_misses:
+                del self.tracks[track_id]
+
+        return results
+
+    def _needs_encoding(self, track):
+        if not track.identified:
+            return True
+        if self.frame_index - track.last_encoded_frame >= self.reencode_interval:
+            return True
+        return track.match_iou < self.reencode_iou
+
+    def stable_boxes(self):
+        """Box các track đang thấy, đã có identity và chưa tới hạn encode lại ở lần update kế tiếp"""
+        return [
+            track.location for track in self.tracks.values()
+            if track.misses == 0 and track.identified
+            and self.frame_index + 1 - track.last_encoded_frame < self.reencode_interval
+        ]
+
+    def assign(self, track, face_data, encoding):
+        """Gắn identity vừa encode cho track"""
+        track.face_data = dict(face_data)
+        track.encoding = encoding
+        track.last_encoded_frame = self.frame_index
+        self.stats['encoded'] += 1
+
+    def reuse(self, track):
+        """Lấy identity đang mang theo track với vị trí mới"""
+        self.stats['reused'] += 1
+        face_data = dict(track.face_data)
+        face_data['location'] = track.location
+        face_data['track_id'] = track.track_id
+        return face_data, track.encoding
+
+    def _init_cv_tracker(self, track, frame):
+        top, right, bottom, left = track.location
+        cv_tracker = _create_cv_tracker(self.cv_backend)
+        if cv_tracker is None:
+            # OpenCV không có tracker này: chỉ dùng IoU
+            self.cv_backend = 'none'
+            return
+        try:
+            cv_tracker.init(frame, (int(left), int(top), int(right - left), int(bottom - top)))
+            track.cv_tracker = cv_tracker
+        except Exception:
+            track.cv_tracker = None
+
+    def can_propagate(self):
+        """Có thể bỏ qua detect và chỉ dời box bằng OpenCV tracker không"""
+        visible = [t for t in self.tracks.values() if t.misses == 0]
+        return (self.cv_backend != 'none' and bool(visible)
+                and all(t.cv_tracker is not None and t.identified for t in visible))
+
+    def propagate(self, frame):
+        """
+        Dời box của các track bằng OpenCV correlation tracker, không detect/encode.
+        Returns: list track còn bám được, hoặc None nếu có track bị mất (cần detect lại).
+        """
+        self.frame_index += 1
+        tracked = []
+        for track in self.tracks.values():
+            if track.misses > 0:
+                continue
+            try:
+                ok, (x, y, w, h) = track.cv_tracker.update(frame)
+            except Exception:
+                ok = False
+            if not ok:
+                return None
+            track.location = (int(y), int(x + w), int(y + h), int(x))
+            track.last_seen_frame = self.frame_index
+            tracked.append(track)
+        return tracked
@@ -0,0 +1,314 @@
+import itertools
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _detect(frame, region, scale, model, upsample):
+    """face_locations trên một vùng (top, right, bottom, left) hoặc cả frame BGR, trả về tọa độ frame gốc"""
+    import cv2
+    import face_recognition
+
+    top, left = 0, 0
+    image = frame
+    if region is not None:
+        top, right, bottom, left = region
+        image = frame[top:bottom, left:right]
+        if image.size == 0:
+            return []
+    if scale != 1.0:
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+    locations = face_recognition.face_locations(
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB),
+        model=model,
+        number_of_times_to_upsample=upsample
+    )
+    return [
+        (int(t / scale) + top, int(r / scale) + left, int(b / scale) + top, int(l / scale) + left)
+        for t, r, b, l in locations
+    ]
+
+
+def _detect_and_encode(frame, model, upsample, scale, quality=None, regions=None, roi_scale=1.0,
+                       skip_boxes=None, skip_iou=0.5):
+    """
+    Detect trong các ROI nếu có (không thấy gì thì quét toàn frame thu nhỏ), encode trên frame gốc.
+    Không encode face trùng box của track đã có identity (skip_boxes, IoU >= skip_iou) và
+    face không qua quality gate.
+    Returns: (locations, encodings, skipped, full_scan) theo tọa độ frame gốc; encodings[i] = None
+    với face không encode, skipped[i] = lý do nếu do quality gate
+    """
+    import cv2
+    import face_recognition
+    from .face_tracker import box_iou
+
+    locations = []
+    for region in regions or []:
+        locations.extend(_detect(frame, region, roi_scale, model, upsample))
+    full_scan = not locations
+    if full_scan:
+        locations = _detect(frame, None, scale, model, upsample)
+    encodings = [None] * len(locations)
+    skipped = {}
+    if locations:
+        keep = list(range(len(locations)))
+        if skip_boxes:
+            tracked = box_iou(locations, skip_boxes).max(axis=1) >= skip_iou
+            keep = [i for i in keep if not tracked[i]]
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if keep else None
+        if quality is not None:
+            passed = []
+            for i in keep:
+                ok, reason, _ = quality.assess(rgb_frame, locations[i])
+                if ok:
+                    passed.append(i)
+                else:
+                    skipped[i] = reason
+            keep = passed
+        if keep:
+            encoded = face_recognition.face_encodings(rgb_frame, [locations[i] for i in keep])
+            for i, encoding in zip(keep, encoded):
+                encodings[i] = np.asarray(encoding, dtype=np.float32)
+    return locations, encodings, skipped, full_scan
+
+
+def _worker_main(slot_names, task_queue, result_queue, model, upsample, scale, quality_params=None,
+                 roi_scale=1.0, skip_iou=0.5):
+    """Vòng lặp của process worker: đọc frame từ shared memory slot, trả kết quả qua result_queue"""
+    quality = None
+    if quality_params is not None:
+        from .face_quality import FaceQualityScorer
+        quality = FaceQualityScorer(**quality_params)
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            seq, slot, shape, regions, skip_boxes = task
+            frame = None
+            try:
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+                locations, encodings, skipped, full_scan = _detect_and_encode(
+                    frame, model, upsample, scale, quality, regions, roi_scale, skip_boxes, skip_iou
+                )
+                result_queue.put((seq, slot, locations, encodings, skipped, full_scan, None))
+            except Exception as e:
+                result_queue.put((seq, slot, [], [], {}, True, str(e)))
+            finally:
+                # Bỏ view trước khi đóng shared memory
+                del frame
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+class FaceWorkerPool:
+    """
+    Chạy detect + encode khuôn mặt trên N process. Frame được chép vào các slot
+    multiprocessing.shared_memory (không pickle ảnh), mỗi task chỉ gửi (seq, slot, shape, ROI, box track).
+    Kết quả được sắp lại theo thứ tự frame trước khi trả cho main loop.
+    Frame quá task_timeout giây chưa có kết quả bị bỏ qua để các frame sau không bị kẹt; slot của
+    nó bị cách ly tới khi kết quả muộn về (worker có thể vẫn đang đọc slot đó). Worker chết, hoặc
+    slot bị cách ly thêm task_timeout nữa (worker treo), thì khởi động lại cả pool và trả mọi slot.
+    quality_params: tham số FaceQualityScorer để worker chấm chất lượng crop trước khi encode.
+    roi_scale, skip_iou: xem _detect_and_encode (ROI và skip_boxes gửi kèm từng frame ở submit()).
+    """
+
+    def __init__(self, num_workers, model='hog', upsample=1, scale=0.5, slots_per_worker=2, task_timeout=10.0,
+                 quality_params=None, roi_scale=1.0, skip_iou=0.5):
+        self.num_workers = num_workers
+        self.model = model
+        self.upsample = upsample
+        self.scale = scale
+        self.quality_params = quality_params
+        self.roi_scale = roi_scale
+        self.skip_iou = skip_iou
+        self.task_timeout = task_timeout
+        self.num_slots = max(1, num_workers * slots_per_worker)
+        self._ctx = mp.get_context('spawn')  # dlib không an toàn với fork khi đã có thread
+        self._slots = []
+        self._free_slots = []
+        self._slot_size = 0
+        self._processes = []
+        self._task_queue = None
+        self._result_queue = None
+        self._seq = itertools.count()
+        self._next_seq = 0
+        self._pending = {}
+        self._inflight = {}  # seq -> (slot, thời điểm gửi)
+        self._quarantine = {}  # seq đã bỏ qua -> (slot, thời điểm bỏ qua), chờ kết quả muộn
+        self.stats = {'submitted': 0, 'completed': 0, 'dropped': 0, 'errors': 0, 'lost': 0, 'restarts': 0}
+
+    @property
+    def started(self):
+        return bool(self._processes)
+
+    @property
+    def in_flight(self):
+        return self.num_slots - len(self._free_slots) if self.started else 0
+
+    def start(self, frame_nbytes):
+        """Cấp phát slot theo kích thước frame và khởi động các process worker"""
+        self._slot_size = frame_nbytes
+        self._slots = [shared_memory.SharedMemory(create=True, size=frame_nbytes) for _ in range(self.num_slots)]
+        self._free_slots = list(range(self.num_slots))
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._processes = [self._spawn(i) for i in range(self.num_workers)]
+        print(f"[WORKERS] Started {self.num_workers} face worker processes ({self.num_slots} shared frame slots)")
+
+    def _spawn(self, i):
+        slot_names = [shm.name for shm in self._slots]
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(slot_names, self._task_queue, self._result_queue, self.model, self.upsample, self.scale,
+                  self.quality_params, self.roi_scale, self.skip_iou),
+            name=f"face-worker-{i}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _check_workers(self, now):
+        """
+        Worker chết (crash, bị kill) có thể giữ lock của queue mãi mãi, nên khởi động lại cả pool
+        với queue mới. Cũng khởi động lại khi slot bị cách ly quá task_timeout (worker treo).
+        Sau khi mọi worker cũ đã dừng, không ai còn đọc slot: trả hết slot, frame đang xử lý coi như mất.
+        """
+        dead = [process for process in self._processes if not process.is_alive()]
+        stuck = [seq for seq, (_, since) in self._quarantine.items() if now - since > self.task_timeout]
+        if not dead and not stuck:
+            return
+        for process in dead:
+            print(f"[WORKERS] {process.name} exited (exitcode={process.exitcode}), restarting workers")
+        if stuck and not dead:
+            print(f"[WORKERS] No late result for frame {stuck[0]}, restarting workers")
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+            process.join(1.0)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._processes = [self._spawn(i) for i in range(self.num_workers)]
+        for seq, (slot, _) in self._inflight.items():
+            self._free_slots.append(slot)
+            self._pending[seq] = None
+            self.stats['lost'] += 1
+        for slot, _ in self._quarantine.values():
+            self._free_slots.append(slot)
+        self._inflight.clear()
+        self._quarantine.clear()
+        self.stats['restarts'] += 1
+
+    def fits(self, frame):
+        """Frame có gửi được cho worker không (uint8 và vừa slot); không vừa thì caller xử lý đồng bộ"""
+        return frame.dtype == np.uint8 and (not self.started or frame.nbytes <= self._slot_size)
+
+    def submit(self, frame, regions=None, skip_boxes=None):
+        """
+        Gửi frame cho worker. regions: ROI cần detect (None = quét toàn frame),
+        skip_boxes: box của track đã có identity, worker không encode lại.
+        Returns: seq của frame, hoặc None nếu không nhận
+        (hết slot trống, hoặc frame không vừa slot -> caller tự xử lý đồng bộ).
+        """
+        if not self.fits(frame):
+            return None
+        if not self.started:
+            self.start(frame.nbytes)
+        if not self._free_slots:
+            self.stats['dropped'] += 1
+            return None
+
+        slot = self._free_slots.pop()
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._slots[slot].buf)
+        view[...] = frame
+        del view
+
+        seq = next(self._seq)
+        self._inflight[seq] = (slot, time.monotonic())
+        self._task_queue.put((seq, slot, frame.shape, regions, skip_boxes))
+        self.stats['submitted'] += 1
+        return seq
+
+    def collect(self, timeout=0.0):
+        """
+        Lấy các kết quả đã xong theo đúng thứ tự frame.
+        Returns: list (seq, locations, encodings, skipped, full_scan); chờ tối đa timeout giây cho kết quả đầu tiên.
+        encodings[i] = None với face worker không encode (lý do quality gate, nếu có, trong skipped[i]).
+        Frame bị bỏ qua (quá task_timeout, hoặc mất khi khởi động lại worker) có locations = encodings
+        = skipped = full_scan = None.
+        """
+        if not self.started:
+            return []
+        block = timeout > 0
+        while True:
+            try:
+                seq, slot, locations, encodings, skipped, full_scan, error = self._result_queue.get(
+                    block=block, timeout=timeout if block else None
+                )
+            except queue.Empty:
+                break
+            block = False
+            if self._inflight.pop(seq, None) is None:
+                # Kết quả muộn của frame đã bỏ qua: worker đã đọc xong, giờ mới trả slot
+                if self._quarantine.pop(seq, None) is not None:
+                    self._free_slots.append(slot)
+                continue
+            self._free_slots.append(slot)
+            self.stats['completed'] += 1
+            if error:
+                self.stats['errors'] += 1
+                print(f"[WORKERS] Error on frame {seq}: {error}")
+            self._pending[seq] = (locations, encodings, skipped, full_scan)
+
+        now = time.monotonic()
+        self._check_workers(now)
+        ready = []
+        while True:
+            if self._next_seq in self._pending:
+                result = self._pending.pop(self._next_seq)
+                ready.append((self._next_seq,) + (result if result is not None else (None,) * 4))
+            elif self._next_seq in self._inflight and now - self._inflight[self._next_seq][1] > self.task_timeout:
+                # Chưa có kết quả: báo frame mất (None) để thứ tự frame tiếp tục,
+                # slot bị cách ly vì worker có thể vẫn đang đọc nó
+                slot, _ = self._inflight.pop(self._next_seq)
+                self._quarantine[self._next_seq] = (slot, now)
+                self.stats['lost'] += 1
+                print(f"[WORKERS] No result for frame {self._next_seq}, skipping")
+                ready.append((self._next_seq, None, None, None, None))
+            else:
+                break
+            self._next_seq += 1
+        return ready
+
+    def close(self, timeout=2.0):
+        """Dừng worker và giải phóng shared memory"""
+        if not self.started:
+            return
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        for shm in self._slots:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        self._slots = []
+        self._free_slots = []
+        self._pending.clear()
+        self._inflight.clear()
+        self._quarantine.clear()
@@ -0,0 +1,126 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class FramePreprocessor:
+    """
+    Tiền xử lý ánh sáng yếu cho real-time:
+    - ước lượng độ sáng bằng histogram trên ảnh xám thu nhỏ
+    - chỉnh sáng bằng gamma LUT tính sẵn (chọn theo độ sáng), không tính lại mỗi frame
+    - CLAHE trên kênh L, dùng lại một instance
+    - khử nhiễu chỉ trên ROI khuôn mặt (denoise='roi') hoặc ở độ phân giải thấp ('downscale')
+    mode='full' giữ cách cũ (fastNlMeansDenoisingColored toàn frame) để so sánh.
+    Thời gian từng bước được lưu trong timings (ms, trung bình trượt).
+    """
+
+    GAMMAS = (0.4, 0.5, 0.6, 0.7, 0.8, 1.25, 1.5, 1.75, 2.0)
+
+    def __init__(self, mode='fast', denoise='roi', denoise_scale=0.5, dark_threshold=80,
+                 bright_threshold=180, target_brightness=128, clip_limit=2.0, tile_grid=(8, 8),
+                 search_window=11):
+        self.mode = mode
+        self.denoise = denoise
+        self.denoise_scale = denoise_scale
+        self.search_window = search_window  # Cửa sổ tìm kiếm NLM nhỏ hơn mặc định (21) cho real-time
+        self.dark_threshold = dark_threshold
+        self.bright_threshold = bright_threshold
+        self.target_brightness = target_brightness
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid)
+        levels = np.arange(256, dtype=np.float32) / 255.0
+        self.gamma_luts = {
+            gamma: np.clip(np.power(levels, gamma) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+            for gamma in self.GAMMAS
+        }
+        self.timings = {}
+        self.frames = 0
+        self.last_gamma = 1.0
+        self.last_brightness = 0.0
+
+    def _record(self, step, started, alpha=0.1):
+        elapsed = (time.perf_counter() - started) * 1000.0
+        previous = self.timings.get(step)
+        self.timings[step] = elapsed if previous is None else previous + alpha * (elapsed - previous)
+        return time.perf_counter()
+
+    def estimate_brightness(self, frame):
+        """Độ sáng trung bình từ histogram của ảnh xám 160x120"""
+        small = cv2.resize(frame, (160, 120), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        return float(np.dot(hist, np.arange(256)) / max(hist.sum(), 1.0))
+
+    def choose_gamma(self, brightness):
+        """Gamma đưa độ sáng trung bình về gần target; 1.0 nếu độ sáng đã ổn"""
+        if self.dark_threshold <= brightness <= self.bright_threshold:
+            return 1.0
+        mean = min(max(brightness, 1.0), 254.0) / 255.0
+        ideal = np.log(self.target_brightness / 255.0) / np.log(mean)
+        return min(self.GAMMAS, key=lambda gamma: abs(gamma - ideal))
+
+    def _equalize(self, frame):
+        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        l = self.clahe.apply(l)
+        return cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+
+    def _denoise_rois(self, frame, rois):
+        for top, right, bottom, left in rois:
+            region = frame[top:bottom, left:right]
+            if region.size:
+                frame[top:bottom, left:right] = cv2.fastNlMeansDenoisingColored(region, None, 10, 10, 7, self.search_window)
+        return frame
+
+    def _denoise_downscaled(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (0, 0), fx=self.denoise_scale, fy=self.denoise_scale, interpolation=cv2.INTER_AREA)
+        small = cv2.fastNlMeansDenoisingColored(small, None, 10, 10, 7, self.search_window)
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    def process(self, frame, rois=()):
+        """Trả về frame đã xử lý (frame gốc không bị sửa). rois: box (top, right, bottom, left) cần khử nhiễu"""
+        self.frames += 1
+        start = now = time.perf_counter()
+
+        if self.mode == 'full':
+            # Cách cũ: chỉnh sáng tuyến tính + CLAHE + NLM toàn frame
+            brightness = float(np.mean(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)))
+            if brightness < self.dark_threshold:
+                frame = cv2.convertScaleAbs(frame, alpha=1.3, beta=30)
+            elif brightness > self.bright_threshold:
+                frame = cv2.convertScaleAbs(frame, alpha=0.8, beta=-20)
+            now = self._record('brightness', now)
+            frame = self._equalize(frame)
+            now = self._record('clahe', now)
+            frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+            now = self._record('denoise', now)
+            self._record('total', start)
+            return frame
+
+        brightness = self.estimate_brightness(frame)
+        gamma = self.choose_gamma(brightness)
+        self.last_brightness = brightness
+        self.last_gamma = gamma
+        now = self._record('estimate', now)
+
+        if gamma != 1.0:
+            frame = cv2.LUT(frame, self.gamma_luts[gamma])
+        now = self._record('lut', now)
+
+        frame = self._equalize(frame)
+        now = self._record('clahe', now)
+
+        if self.denoise == 'roi' and rois:
+            frame = self._denoise_rois(frame, rois)
+        elif self.denoise == 'downscale':
+            frame = self._denoise_downscaled(frame)
+        now = self._record('denoise', now)
+
+        self._record('total', start)
+        return frame
+
+    def timing_report(self):
+        """Chuỗi tóm tắt thời gian từng bước (ms)"""
+        steps = ', '.join(f"{step}={ms:.1f}ms" for step, ms in self.timings.items())
+        return f"mode={self.mode}, denoise={self.denoise}, frames={self.frames}, {steps}"
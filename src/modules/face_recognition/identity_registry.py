@@ -0,0 +1,111 @@
+import os
+import threading
+from pathlib import Path
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+
+class IdentityRegistry:
+    """
+    Tập person_id có thư mục trong data/faces, giữ trong RAM để frame loop không
+    phải stat filesystem. Một thread nền làm mới tập này khi thư mục thay đổi:
+    dùng inotify nếu có (inotify_simple, Linux), nếu không thì poll mtime thư mục.
+    available = False khi chưa quét được thư mục (thiếu/không đọc được): khi đó persons
+    không có nghĩa là "không còn ai", người dùng không được evict dựa trên nó.
+    """
+
+    def __init__(self, faces_dir, poll_interval=2.0):
+        self.faces_dir = Path(faces_dir)
+        self.poll_interval = poll_interval
+        self._persons = frozenset()
+        self._lock = threading.Lock()
+        self._dir_mtime = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.version = 0
+        self.available = False
+        self.watch_mode = 'none'
+        self.refresh()
+
+    def __contains__(self, person_id):
+        # Chỉ đọc frozenset hiện tại, không có I/O
+        return person_id in self._persons
+
+    @property
+    def persons(self):
+        return self._persons
+
+    def refresh(self):
+        """Quét lại thư mục faces. Returns: (added, removed)"""
+        try:
+            with os.scandir(self.faces_dir) as entries:
+                persons = frozenset(entry.name for entry in entries if entry.is_dir())
+        except OSError as e:
+            # Giữ nguyên tập cũ: thư mục thiếu/không đọc được là "không có thông tin", không phải "đã xóa hết"
+            print(f"Error scanning faces directory: {e}")
+            self.available = False
+            return set(), set()
+        with self._lock:
+            self.available = True
+            added = persons - self._persons
+            removed = self._persons - persons
+            if added or removed:
+                self._persons = persons
+                self.version += 1
+        return added, removed
+
+    def add(self, person_id):
+        """Đăng ký ngay một người vừa tạo thư mục (không chờ watcher)"""
+        with self._lock:
+            if person_id not in self._persons:
+                self._persons = self._persons | {person_id}
+                self.version += 1
+
+    def start(self):
+        """Chạy thread theo dõi thư mục"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        target = self._watch_inotify if INOTIFY_AVAILABLE else self._watch_poll
+        self.watch_mode = 'inotify' if INOTIFY_AVAILABLE else 'poll'
+        self._thread = threading.Thread(target=target, name="identity-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _watch_poll(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.faces_dir).st_mtime_ns
+            except OSError:
+                continue
+            # mtime của thư mục đổi khi có thư mục con được tạo/xóa/đổi tên
+            if mtime != self._dir_mtime:
+                self._dir_mtime = mtime
+                self.refresh()
+
+    def _watch_inotify(self):
+        try:
+            inotify = INotify()
+            mask = (inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MOVED_FROM
+                    | inotify_flags.MOVED_TO | inotify_flags.DELETE_SELF)
+            inotify.add_watch(str(self.faces_dir), mask)
+        except OSError as e:
+            print(f"inotify unavailable, polling faces directory: {e}")
+            self.watch_mode = 'poll'
+            self._watch_poll()
+            return
+        try:
+            while not self._stop_event.is_set():
+                if inotify.read(timeout=int(self.poll_interval * 1000)):
+                    self.refresh()
+        finally:
+            inotify.close()
@@ -0,0 +1,104 @@
+import time
+import cv2
+import numpy as np
+
+from ...utils.frame import as_frame
+
+
+class MotionDetector:
+    """
+    Phát hiện thay đổi trên ảnh xám thu nhỏ, bằng frame differencing (mode='diff')
+    hoặc so với background model cập nhật dần (mode='background').
+    """
+
+    def __init__(self, size=(160, 120), pixel_threshold=25, mode='diff', background_alpha=0.05):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.mode = mode
+        self.background_alpha = background_alpha
+        self._previous = None
+        self._background = None
+        self.mask = None
+        self.score = 1.0
+
+    def update(self, frame):
+        """Cập nhật với frame mới (Frame hoặc ảnh BGR), trả về mask (bool) các pixel thay đổi ở độ phân giải thu nhỏ"""
+        # View xám thu nhỏ dùng chung giữa các detector trên cùng frame
+        gray = as_frame(frame).gray(self.size, blur=5, stage='motion')
+
+        if self._previous is None:
+            # Frame đầu tiên: coi như toàn bộ đều thay đổi
+            self.mask = np.ones(gray.shape, dtype=bool)
+            self._background = gray.astype(np.float32)
+        elif self.mode == 'background':
+            reference = cv2.convertScaleAbs(self._background)
+            self.mask = cv2.absdiff(gray, reference) > self.pixel_threshold
+            cv2.accumulateWeighted(gray, self._background, self.background_alpha)
+        else:
+            self.mask = cv2.absdiff(gray, self._previous) > self.pixel_threshold
+        self._previous = gray
+        self.score = float(np.count_nonzero(self.mask)) / self.mask.size
+        return self.mask
+
+    def changed_fraction(self, frame_shape, exclude_boxes=()):
+        """Tỉ lệ pixel thay đổi, bỏ qua các box (top, right, bottom, left) theo tọa độ frame gốc"""
+        if self.mask is None:
+            return 1.0
+        mask = self.mask
+        if exclude_boxes:
+            mask = mask.copy()
+            sx = self.size[0] / float(frame_shape[1])
+            sy = self.size[1] / float(frame_shape[0])
+            for top, right, bottom, left in exclude_boxes:
+                mask[int(top * sy):int(np.ceil(bottom * sy)), int(left * sx):int(np.ceil(right * sx))] = False
+        return float(np.count_nonzero(mask)) / mask.size
+
+    def reset(self):
+        self._previous = None
+        self._background = None
+        self.mask = None
+        self.score = 1.0
+
+
+class MotionGate:
+    """
+    Quyết định có chạy face pipeline cho frame hiện tại không: chạy ngay khi có
+    chuyển động, tiếp tục hold_sec sau khi hết chuyển động (để nhận diện tư thế
+    cuối), và làm mới mỗi refresh_sec kể cả khi cảnh đứng yên (0 = tắt).
+    """
+
+    def __init__(self, detector, threshold=0.005, hold_sec=1.0, refresh_sec=5.0):
+        self.detector = detector
+        self.threshold = threshold
+        self.hold_sec = hold_sec
+        self.refresh_sec = refresh_sec
+        self._last_motion_time = 0.0
+        self._last_processed_time = 0.0
+        self.stats = {'processed': 0, 'skipped': 0, 'score': 0.0, 'reason': ''}
+
+    def should_process(self, frame, force=False):
+        """Cập nhật detector với frame và trả về True nếu cần chạy face pipeline"""
+        now = time.time()
+        self.detector.update(frame)
+        score = self.detector.score
+        self.stats['score'] = score
+
+        if score >= self.threshold:
+            self._last_motion_time = now
+            reason = 'motion'
+        elif force:
+            reason = 'forced'
+        elif now - self._last_motion_time < self.hold_sec:
+            reason = 'hold'
+        elif self.refresh_sec > 0 and now - self._last_processed_time >= self.refresh_sec:
+            reason = 'refresh'
+        else:
+            reason = 'static'
+
+        self.stats['reason'] = reason
+        if reason == 'static':
+            self.stats['skipped'] += 1
+            return False
+        self.stats['processed'] += 1
+        self._last_processed_time = now
+        return True
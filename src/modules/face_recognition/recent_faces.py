@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .face_index import squared_distances
+
+
+class RecentFaceCache:
+    """
+    Hot set các người vừa được nhận diện (LRU + TTL), được so khớp trước gallery đầy đủ.
+    Mỗi người giữ bản copy các sample của mình trong gallery cùng index các dòng đó.
+    Chỉ coi là trúng khi kết quả dứt khoát: khoảng cách <= max_distance (chặt hơn tolerance),
+    cách người gần thứ hai trong hot set ít nhất margin, và mọi người khác trong gallery đều chắc
+    chắn xa hơn, nên kết quả luôn trùng với quét toàn gallery; còn lại vẫn quét toàn gallery.
+    Điều kiện cuối dùng khoảng cách tách biệt sep(x) của mỗi sample x (tới người khác gần nhất),
+    tính một lần lúc remember(): theo bất đẳng thức tam giác mọi sample y của người khác có
+    ||q - y|| >= sep(x) - ||q - x||, nên trúng khi sep(x) - best > best. Mỗi lookup vì vậy chỉ
+    tốn O(hot set), và chạy được cả khi tắt prototype (sep tính trên các dòng gallery).
+    Gallery thay đổi (xóa người / load lại / thêm người) thì phải clear() vì index và sep có thể lệch.
+    """
+
+    def __init__(self, capacity=64, ttl=300.0, max_distance=0.45, margin=0.06, dim=128):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.margin = margin
+        self.dim = dim
+        self._entries = OrderedDict()  # person_id -> [samples (k x dim), gallery rows (k), sep (k), last_seen]
+        self._matrix = None
+        self._row_owner = None
+        self._row_index = None
+        self._row_separation = None
+        self._person_ids = []
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def _expire(self, now):
+        # OrderedDict theo thứ tự dùng gần nhất: entry cũ nhất ở đầu
+        while self._entries:
+            person_id, entry = next(iter(self._entries.items()))
+            if now - entry[3] <= self.ttl:
+                break
+            del self._entries[person_id]
+            self._matrix = None
+            self.stats['expired'] += 1
+
+    def _rows(self):
+        """Ma trận sample của hot set, chỉ dựng lại khi tập người thay đổi"""
+        if self._matrix is None:
+            self._person_ids = list(self._entries)
+            entries = [self._entries[p] for p in self._person_ids]
+            self._matrix = np.concatenate([e[0] for e in entries]).reshape(-1, self.dim)
+            self._row_index = np.concatenate([e[1] for e in entries])
+            self._row_separation = np.concatenate([e[2] for e in entries])
+            self._row_owner = np.repeat(np.arange(len(entries)), [len(e[1]) for e in entries])
+        return self._matrix
+
+    @staticmethod
+    def _separation(person_id, rows, state):
+        """
+        sep của từng sample: cận dưới khoảng cách tới sample gần nhất của người khác.
+        Dùng centroid - bán kính của prototypes nếu có (O(k x số người)), không thì quét các dòng gallery.
+        """
+        samples = state.matrix[rows]
+        prototypes = state.prototypes
+        if prototypes is not None:
+            others = np.ones(len(prototypes.person_ids), dtype=bool)
+            slot = prototypes.person_slots.get(person_id)
+            if slot is not None:
+                others[slot] = False
+            if not others.any():
+                return np.full(len(rows), np.inf)
+            centroid_dist = np.sqrt(squared_distances(samples, prototypes.centroids[others]))
+            lower_bound = centroid_dist - prototypes.radii[others][None, :]
+            return lower_bound.min(axis=1) - prototypes.EPSILON
+        others = np.flatnonzero(np.asarray(state.ids[:state.size], dtype=object) != person_id)
+        if len(others) == 0:
+            return np.full(len(rows), np.inf)
+        d2 = squared_distances(samples, state.matrix[others], state.sq_norms[others])
+        return np.sqrt(d2.min(axis=1)) - 1e-4
+
+    def lookup(self, query_encodings):
+        """
+        So khớp các encoding với hot set.
+        Returns: list dài M, mỗi phần tử (gallery index, distance, second_distance) khi trúng,
+        None khi phải quét gallery
+        """
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.dim)
+        now = time.monotonic()
+        self._expire(now)
+        if not self._entries:
+            self.stats['misses'] += len(queries)
+            return [None] * len(queries)
+
+        rows = self._rows()
+        dists = np.linalg.norm(queries[:, None, :] - rows[None, :, :], axis=2)
+        results = []
+        for q in range(len(queries)):
+            best_row = int(np.argmin(dists[q]))
+            best = float(dists[q, best_row])
+            owner = self._row_owner[best_row]
+            # Người gần thứ hai: sample gần nhất không thuộc người tốt nhất
+            others = dists[q, self._row_owner != owner]
+            second = float(others.min()) if len(others) else np.inf
+            # Người khác (kể cả ngoài hot set) cách query ít nhất sep - best
+            outside = self._row_separation[best_row] - best
+            if best > self.max_distance or second - best < self.margin or outside <= best:
+                self.stats['misses'] += 1
+                results.append(None)
+                continue
+            person_id = self._person_ids[owner]
+            self._entries[person_id][3] = now
+            self._entries.move_to_end(person_id)
+            self.stats['hits'] += 1
+            results.append((int(self._row_index[best_row]), best, second))
+        return results
+
+    def remember(self, person_id, rows, state):
+        """Thêm/cập nhật một người vừa khớp từ gallery đầy đủ (rows: các dòng của người đó trong state)"""
+        entry = self._entries.get(person_id)
+        if entry is not None and len(entry[1]) == len(rows):
+            entry[3] = time.monotonic()
+            self._entries.move_to_end(person_id)
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        samples = np.array(state.matrix[rows], dtype=np.float32).reshape(-1, self.dim)
+        separation = self._separation(person_id, rows, state)
+        self._entries[person_id] = [samples, rows, separation, time.monotonic()]
+        self._entries.move_to_end(person_id)
+        self._matrix = None
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.stats['evicted'] += 1
@@ -0,0 +1,244 @@
+import hmac
+import ipaddress
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import cv2
+
+
+# Lệnh HTTP -> phím tắt tương ứng của _handle_key
+COMMANDS = {
+    'quit': 'q',
+    'stop_speech': 's',
+    'help': 'h',
+    'reload': 'r',
+    'clear_cache': 'c',
+    'finish_registration': 'f',
+}
+
+INDEX_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>AI Receptionist</title></head>
+<body style="background:#222;color:#eee;font-family:sans-serif">
+<img src="/stream" style="max-width:100%"><br>
+{buttons}
+<pre id="status"></pre>
+<script>
+var token = new URLSearchParams(location.search).get('token') || '';
+function send(name) {{ fetch('/command/' + name, {{method: 'POST', headers: {{'X-Auth-Token': token}}}}); }}
+setInterval(function() {{
+  fetch('/status').then(r => r.json()).then(s => {{
+    document.getElementById('status').textContent = JSON.stringify(s, null, 2);
+  }});
+}}, 1000);
+</script>
+</body></html>
+"""
+
+
+class LiveViewServer:
+    """
+    HTTP server nội bộ cho chế độ headless:
+        GET  /              trang xem nhanh (stream + nút lệnh + status)
+        GET  /stream        MJPEG (multipart/x-mixed-replace)
+        GET  /snapshot.jpg  một frame JPEG
+        GET  /status        JSON từ status_provider()
+        POST /command/<tên> lệnh thay cho phím tắt (xem COMMANDS), cần token (header X-Auth-Token
+                            hoặc ?token=) nếu có; không có token thì chỉ nhận lệnh khi bind loopback
+    Main loop chỉ compose overlay và encode JPEG khi wants_frame() (có người xem, chưa vượt max_fps),
+    JPEG encode một lần rồi dùng chung cho mọi người xem. Lệnh được đưa vào hàng đợi để main loop xử lý.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080, max_fps=10, jpeg_quality=80, status_provider=None, token=''):
+        self.host = host
+        self.token = token or ''
+        self.port = port
+        self.max_fps = max_fps
+        self.jpeg_quality = jpeg_quality
+        self.status_provider = status_provider or (lambda: {})
+        self.commands = queue.Queue()
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._viewers = 0
+        self._last_encode = 0.0
+        self._server = None
+        self._thread = None
+        self.running = False
+        self.stats = {'encoded': 0, 'sent': 0, 'commands': 0, 'peak_viewers': 0}
+
+    def start(self):
+        """Mở cổng và chạy server trên thread riêng. Returns: True nếu thành công"""
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        except OSError as e:
+            print(f"[LIVE VIEW] Cannot listen on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        if not self.token and not self.is_loopback():
+            print(f"[LIVE VIEW] {self.host} is not loopback and LIVE_VIEW_TOKEN is empty: commands are disabled")
+        self.running = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="live-view", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def is_loopback(self):
+        if self.host == 'localhost':
+            return True
+        try:
+            return ipaddress.ip_address(self.host).is_loopback
+        except ValueError:
+            return False
+
+    def authorized(self, supplied):
+        """Lệnh hợp lệ khi token khớp; không cấu hình token thì chỉ cho phép khi bind loopback"""
+        if not self.token:
+            return self.is_loopback()
+        return hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8'))
+
+    @property
+    def viewers(self):
+        return self._viewers
+
+    def wants_frame(self):
+        """Có người xem và đã tới lượt encode (giới hạn max_fps)"""
+        if self._viewers <= 0:
+            return False
+        return self.max_fps <= 0 or time.monotonic() - self._last_encode >= 1.0 / self.max_fps
+
+    def publish(self, image):
+        """Encode frame đã compose (BGR) thành JPEG và phát cho người xem"""
+        self._last_encode = time.monotonic()
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        with self._cond:
+            self._jpeg = buffer.tobytes()
+            self._seq += 1
+            self.stats['encoded'] += 1
+            self._cond.notify_all()
+
+    def next_command(self, timeout=0.0):
+        """Mã phím của lệnh kế tiếp (giống cv2.waitKey & 0xFF), 255 nếu không có lệnh trong timeout"""
+        try:
+            if timeout > 0:
+                return ord(self.commands.get(timeout=timeout))
+            return ord(self.commands.get_nowait())
+        except queue.Empty:
+            return 255
+
+    def _wait_jpeg(self, after_seq, timeout=1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or not self.running, timeout)
+            if self._seq > after_seq:
+                return self._jpeg, self._seq
+            return None, after_seq
+
+    def _add_viewer(self, delta):
+        with self._cond:
+            self._viewers += delta
+            self.stats['peak_viewers'] = max(self.stats['peak_viewers'], self._viewers)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+                self._send(status, body, 'application/json; charset=utf-8')
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                try:
+                    if path == '/':
+                        buttons = ' '.join(
+                            f'<button onclick="send(\'{name}\')">{name}</button>' for name in COMMANDS
+                        )
+                        self._send(200, INDEX_HTML.format(buttons=buttons).encode('utf-8'), 'text/html; charset=utf-8')
+                    elif path == '/stream':
+                        self._stream()
+                    elif path == '/snapshot.jpg':
+                        self._snapshot()
+                    elif path == '/status':
+                        self._send_json(server.status_provider())
+                    else:
+                        self._send_json({'error': 'not found'}, 404)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def do_POST(self):
+                path, _, query = self.path.partition('?')
+                if not path.startswith('/command/'):
+                    self._send_json({'error': 'not found'}, 404)
+                    return
+                supplied = self.headers.get('X-Auth-Token') or parse_qs(query).get('token', [''])[0]
+                if not server.authorized(supplied):
+                    self._send_json({'error': 'forbidden'}, 403)
+                    return
+                name = path[len('/command/'):]
+                if name not in COMMANDS:
+                    self._send_json({'error': f'unknown command: {name}', 'commands': list(COMMANDS)}, 400)
+                    return
+                server.commands.put(COMMANDS[name])
+                server.stats['commands'] += 1
+                self._send_json({'ok': True, 'command': name})
+
+            def _snapshot(self):
+                server._add_viewer(1)
+                try:
+                    jpeg, _ = server._wait_jpeg(server._seq, timeout=2.0)
+                finally:
+                    server._add_viewer(-1)
+                if jpeg is None:
+                    self._send_json({'error': 'no frame'}, 503)
+                else:
+                    self._send(200, jpeg, 'image/jpeg')
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                server._add_viewer(1)
+                try:
+                    seq = 0
+                    while server.running:
+                        jpeg, seq = server._wait_jpeg(seq)
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(
+                            b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                            + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n'
+                        )
+                        server.stats['sent'] += 1
+                finally:
+                    server._add_viewer(-1)
+
+        return Handler
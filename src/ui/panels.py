@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+from ..utils.buffer_pool import display_buffers
+
+
+class CachedPanel:
+    """
+    Panel UI vẽ off-screen, chỉ vẽ lại khi version nội dung hoặc kích thước đổi.
+    Hàm paint(canvas) vẽ bằng các thao tác OpenCV/Pillow bình thường (kể cả addWeighted bán trong suốt)
+    theo tọa độ cục bộ của panel. Panel được vẽ hai lần trên nền đen và nền trắng để tách
+    màu premultiplied và phần nền còn xuyên qua (inv = trắng - đen), nên mỗi frame chỉ cần
+    out = (frame * inv + đen * 255) / 255 trên đúng vùng của panel, tính trong buffer scratch dùng lại.
+    """
+
+    def __init__(self, paint, name=None, buffers=display_buffers):
+        self.paint = paint
+        self.name = name or f"panel-{id(self)}"
+        self.buffers = buffers
+        self._key = None
+        self._black = None
+        self._inv = None
+        self._premul = None
+        self._opaque = False
+        self.stats = {'rebuilds': 0, 'composites': 0}
+
+    def _rebuild(self, width, height):
+        black = np.zeros((height, width, 3), dtype=np.uint8)
+        white = np.full((height, width, 3), 255, dtype=np.uint8)
+        self.paint(black)
+        self.paint(white)
+        inv = cv2.subtract(white, black)
+        self._black = black
+        self._inv = inv.astype(np.uint16)
+        self._premul = black.astype(np.uint16) * 255 + 127  # +127 để làm tròn khi chia 255
+        self._opaque = not inv.any()
+        self.stats['rebuilds'] += 1
+
+    def composite(self, frame, x, y, width, height, version):
+        """Blend panel (góc trên trái x, y) vào frame tại chỗ; phần ngoài frame bị cắt"""
+        frame_h, frame_w = frame.shape[:2]
+        x, y = max(0, x), max(0, y)
+        width = min(width, frame_w - x)
+        height = min(height, frame_h - y)
+        if width <= 0 or height <= 0:
+            return frame
+        key = (version, width, height)
+        if key != self._key:
+            self._rebuild(width, height)
+            self._key = key
+
+        roi = frame[y:y + height, x:x + width]
+        if self._opaque:
+            np.copyto(roi, self._black)
+        else:
+            scratch = self.buffers.get(self.name, roi.shape, np.uint16)
+            np.multiply(roi, self._inv, out=scratch)
+            np.add(scratch, self._premul, out=scratch)
+            np.floor_divide(scratch, 255, out=scratch)
+            np.copyto(roi, scratch, casting='unsafe')
+        self.stats['composites'] += 1
+        return frame
@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+
+class ResultInterpolator:
+    """
+    Dự đoán vị trí box giữa các lần nhận diện để render mượt ở tốc độ hiển thị.
+    Mỗi track (track_id) có bộ lọc alpha-beta (vận tốc không đổi) trên 4 cạnh box:
+        dự đoán  x' = x + v * dt
+        sai số   r  = đo - x'
+        cập nhật x = x' + alpha * r,  v = v + beta * r / dt
+    Box không có track_id chỉ được giữ nguyên vị trí. Ngoại suy tối đa max_extrapolation giây
+    kể từ lần đo cuối, sau đó box đứng yên cho tới kết quả kế tiếp.
+    update() chạy trên thread recognition, predict() trên thread render.
+    """
+
+    def __init__(self, alpha=0.7, beta=0.3, max_extrapolation=0.5):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_extrapolation = max_extrapolation
+        self._lock = threading.Lock()
+        self._tracks = {}  # track_id -> (location, velocity, timestamp)
+        self._faces = []
+        self._timestamp = None
+        self.updates = 0
+
+    def update(self, faces, timestamp):
+        """Kết quả nhận diện mới (list face_data) của frame chụp lúc timestamp"""
+        tracks = {}
+        for face in faces:
+            track_id = face.get('track_id')
+            if track_id is None:
+                continue
+            measured = np.asarray(face['location'], dtype=np.float32)
+            previous = self._tracks.get(track_id)
+            if previous is None or timestamp <= previous[2]:
+                tracks[track_id] = (measured, np.zeros(4, dtype=np.float32), timestamp)
+                continue
+            location, velocity, last = previous
+            dt = timestamp - last
+            predicted = location + velocity * dt
+            residual = measured - predicted
+            tracks[track_id] = (predicted + self.alpha * residual, velocity + self.beta * residual / dt, timestamp)
+
+        with self._lock:
+            self._tracks = tracks
+            self._faces = list(faces)
+            self._timestamp = timestamp
+            self.updates += 1
+
+    def predict(self, timestamp):
+        """Danh sách face_data với 'location' dự đoán tại thời điểm timestamp (thời điểm chụp frame đang render)"""
+        with self._lock:
+            faces, tracks = self._faces, self._tracks
+        results = []
+        for face in faces:
+            state = tracks.get(face.get('track_id'))
+            if state is None:
+                results.append(face)
+                continue
+            location, velocity, last = state
+            dt = min(max(timestamp - last, 0.0), self.max_extrapolation)
+            top, right, bottom, left = (int(round(v)) for v in location + velocity * dt)
+            predicted = dict(face)
+            predicted['location'] = (top, right, bottom, left)
+            results.append(predicted)
+        return results
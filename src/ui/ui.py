@@ -1,20 +1,27 @@
 import cv2
 import numpy as np
 import time
+import threading
 from datetime import datetime
 from collections import deque
 
 from ..core.config import UI_WINDOW_NAME, UI_WINDOW_WIDTH, UI_WINDOW_HEIGHT, get_greeting
-from ..utils.utils import draw_text_with_background, resize_image
+from ..utils.utils import draw_text_with_background
+from ..utils.frame import Frame
+from ..utils.text_renderer import default_renderer
+from ..utils.buffer_pool import display_buffers
+from .panels import CachedPanel
 
 class UI:
-    def __init__(self):
-        """Initialize the UI"""
+    def __init__(self, headless=False):
+        """Initialize the UI (headless: không mở cửa sổ HighGUI, chỉ compose khi được gọi)"""
+        self.headless = headless
         self.window_name = UI_WINDOW_NAME
         self.width = UI_WINDOW_WIDTH
         self.height = UI_WINDOW_HEIGHT
         self.frame = None
         self.recognition_results = []
+        self.box_scale = 1.0  # Tọa độ box (theo frame camera) -> tọa độ frame hiển thị
         self.messages = []
         self.max_messages = 5  # Maximum number of messages to display
         self.greeted_people = set()  # Track people who have been greeted
@@ -29,12 +36,36 @@ class UI:
         self.log_messages = deque(maxlen=10)  # Chỉ giữ 10 dòng log gần nhất
         self.log_area_height = 200  # Chiều cao vùng log
         
+        # Panel vẽ sẵn, chỉ vẽ lại khi nội dung đổi (version tăng mỗi lần nội dung thay đổi)
+        self.msg_area_height = 150
+        self.dialog_width = 400
+        self.dialog_height = 200
+        self.dialog_margin = 2  # Viền dày 2px tràn ra ngoài hộp thoại
+        self.versions = {'messages': 0, 'registration': 0, 'log': 0}
+        # Message/log/đăng ký được cập nhật từ thread recognition/voice trong khi main thread render:
+        # mọi thay đổi (kể cả version) giữ lock, hàm paint chỉ đọc bản snapshot lấy dưới lock
+        self._lock = threading.Lock()
+        self._messages_view = []
+        self._log_view = []
+        self._registration_view = ("", "", "")
+        self.message_panel = CachedPanel(self._paint_messages, name='ui-messages')
+        self.registration_panel = CachedPanel(self._paint_registration_dialog, name='ui-registration')
+        self.log_panel = CachedPanel(self._paint_log_area, name='ui-log')
+        
+        # Frame hiển thị và frame vẽ overlay nằm trong buffer dùng lại, không cấp phát mỗi frame
+        self.buffers = display_buffers
     
     def update_frame(self, frame):
         """Update the current frame"""
-        if frame is not None:
-            # Resize frame to fit window
-            self.frame = resize_image(frame.copy(), width=self.width)
+        image = frame.image if isinstance(frame, Frame) else frame
+        if image is None:
+            return
+        # Resize frame to fit window (giữ tỉ lệ như resize_image), ghi thẳng vào buffer dùng lại
+        h, w = image.shape[:2]
+        size = (self.width, int(h * (self.width / float(w))))
+        buffer = self.buffers.get('ui-frame', (size[1], size[0]) + image.shape[2:])
+        self.frame = cv2.resize(image, size, dst=buffer, interpolation=cv2.INTER_AREA)
+        self.box_scale = self.width / w
     
     def update_recognition_results(self, face_results, voice_result=None):
         """Update recognition results"""
@@ -48,30 +79,45 @@ class UI:
     def add_message(self, message):
         """Add a message to the UI"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.messages.append({
-            'text': message,
-            'timestamp': timestamp,
-            'time': time.time()
-        })
-        
-        # Keep only the most recent messages
-        if len(self.messages) > self.max_messages:
-            self.messages.pop(0)
+        with self._lock:
+            self.messages.append({
+                'text': message,
+                'timestamp': timestamp,
+                'time': time.time()
+            })
+            self.versions['messages'] += 1
+            
+            # Keep only the most recent messages
+            if len(self.messages) > self.max_messages:
+                self.messages.pop(0)
     
     def render(self):
         """Render the UI"""
+        display_frame = self.compose()
+        if not self.headless:
+            # Show the frame
+            cv2.imshow(self.window_name, display_frame)
+        return display_frame
+    
+    def compose(self):
+        """
+        Frame hiển thị kèm mọi overlay (box, thông báo, hộp thoại đăng ký, log, đồng hồ).
+        Kết quả là buffer dùng lại: chỉ hợp lệ tới lần compose() kế tiếp.
+        """
         if self.frame is None:
             # Create a blank frame if no camera frame is available
-            self.frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+            self.frame = self.buffers.get('ui-blank', (self.height, self.width, 3))
+            self.frame.fill(0)
         
-        # Create a copy of the frame to draw on
-        display_frame = self.frame.copy()
+        # Copy the frame into the drawing buffer
+        display_frame = self.buffers.get('ui-display', self.frame.shape)
+        np.copyto(display_frame, self.frame)
         
         # Draw face recognition results
         for result in self.recognition_results:
             name = result['name']
             confidence = result['confidence']
-            top, right, bottom, left = result['location']
+            top, right, bottom, left = (int(round(v * self.box_scale)) for v in result['location'])
 
             # Draw a box around the face
             cv2.rectangle(display_frame, (left, top), (right, bottom), (0, 255, 0), 2)
@@ -102,27 +148,30 @@ class UI:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         draw_text_with_background(display_frame, current_time, (10, 30), 
                                 bg_color=(50, 50, 50))
-        
-        # Show the frame
-        cv2.imshow(self.window_name, display_frame)
+        return display_frame
     
     def _draw_messages(self, frame):
-        """Draw messages on the frame"""
-        # Calculate message area
-        msg_area_height = 150
-        msg_area_y = self.height - msg_area_height
+        """Draw messages on the frame (panel vẽ sẵn, chỉ blend vùng message)"""
+        msg_area_y = self.height - self.msg_area_height
+        with self._lock:
+            version = self.versions['messages']
+            self._messages_view = list(self.messages)
+        self.message_panel.composite(frame, 0, msg_area_y, self.width, self.msg_area_height, version)
+    
+    def _paint_messages(self, panel):
+        """Vẽ vùng message lên panel (tọa độ cục bộ)"""
+        height, width = panel.shape[:2]
         
         # Draw semi-transparent background for message area
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, msg_area_y), (self.width, self.height), 
-                     (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+        overlay = panel.copy()
+        cv2.rectangle(overlay, (0, 0), (width, height), (0, 0, 0), -1)
+        cv2.addWeighted(overlay, 0.7, panel, 0.3, 0, panel)
         
         # Draw messages
-        y_pos = msg_area_y + 30
-        for msg in reversed(self.messages):
+        y_pos = 30
+        for msg in reversed(self._messages_view):
             text = f"[{msg['timestamp']}] {msg['text']}"
-            draw_text_with_background(frame, text, (10, y_pos), 
+            draw_text_with_background(panel, text, (10, y_pos), 
                                     bg_color=(50, 50, 50))
             y_pos += 30
     
@@ -138,74 +187,93 @@ class UI:
     
     def show_registration_ui(self, status="Đang đăng ký người dùng mới...", name="", info=""):
         """Show registration dialog"""
-        self.show_registration_dialog = True
-        self.registration_status = status
-        self.registration_name = name
-        self.registration_info = info
+        with self._lock:
+            self.show_registration_dialog = True
+            self.registration_status = status
+            self.registration_name = name
+            self.registration_info = info
+            self.versions['registration'] += 1
         
     def hide_registration_ui(self):
         """Hide registration dialog"""
-        self.show_registration_dialog = False
-        self.registration_status = ""
-        self.registration_name = ""
-        self.registration_info = ""
+        with self._lock:
+            self.show_registration_dialog = False
+            self.registration_status = ""
+            self.registration_name = ""
+            self.registration_info = ""
+            self.versions['registration'] += 1
         
     def update_registration_status(self, status, name="", info=""):
         """Update registration dialog content"""
-        self.registration_status = status
-        if name:
-            self.registration_name = name
-        if info:
-            self.registration_info = info
+        with self._lock:
+            self.registration_status = status
+            if name:
+                self.registration_name = name
+            if info:
+                self.registration_info = info
+            self.versions['registration'] += 1
             
     def _draw_registration_dialog(self, frame):
         """Draw registration dialog overlay"""
-        # Dialog dimensions
-        dialog_width = 400
-        dialog_height = 200
-        dialog_x = (self.width - dialog_width) // 2
-        dialog_y = (self.height - dialog_height) // 2
-        
-        # Draw semi-transparent background
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (self.width, self.height), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.5, frame, 0.5, 0, frame)
+        # Làm tối toàn bộ khung hình một nửa (tương đương addWeighted với nền đen 0.5), tại chỗ
+        cv2.convertScaleAbs(frame, frame, alpha=0.5)
+        
+        # Hộp thoại vẽ sẵn, chỉ blend vùng hộp thoại
+        margin = self.dialog_margin
+        dialog_x = (self.width - self.dialog_width) // 2
+        dialog_y = (self.height - self.dialog_height) // 2
+        with self._lock:
+            version = self.versions['registration']
+            self._registration_view = (self.registration_status, self.registration_name, self.registration_info)
+        # Panel kéo tới mép phải cửa sổ: dòng chữ dài có thể tràn ra ngoài hộp thoại
+        self.registration_panel.composite(
+            frame, dialog_x - margin, dialog_y - margin,
+            self.width - dialog_x + margin, self.dialog_height + 2 * margin + 1,
+            version
+        )
+    
+    def _paint_registration_dialog(self, panel):
+        """Vẽ hộp thoại đăng ký lên panel (tọa độ cục bộ, hộp bắt đầu sau lề viền)"""
+        dialog_width = self.dialog_width
+        dialog_height = self.dialog_height
+        dialog_x = dialog_y = self.dialog_margin
+        registration_status, registration_name, registration_info = self._registration_view
         
         # Draw dialog box
-        cv2.rectangle(frame, (dialog_x, dialog_y), 
+        cv2.rectangle(panel, (dialog_x, dialog_y), 
                      (dialog_x + dialog_width, dialog_y + dialog_height), 
                      (255, 255, 255), -1)
-        cv2.rectangle(frame, (dialog_x, dialog_y), 
+        cv2.rectangle(panel, (dialog_x, dialog_y), 
                      (dialog_x + dialog_width, dialog_y + dialog_height), 
                      (0, 0, 0), 2)
         
         # Draw title
         title = "ĐĂNG KÝ NGƯỜI DÙNG MỚI"
-        draw_text_with_background(frame, title, (dialog_x + 20, dialog_y + 30), 
+        draw_text_with_background(panel, title, (dialog_x + 20, dialog_y + 30), 
                                 bg_color=(255, 255, 255), text_color=(0, 0, 0))
         
         # Draw status
-        if self.registration_status:
-            draw_text_with_background(frame, self.registration_status, 
+        if registration_status:
+            draw_text_with_background(panel, registration_status, 
                                     (dialog_x + 20, dialog_y + 70), 
                                     bg_color=(255, 255, 255), text_color=(0, 100, 0))
         
         # Draw name if available
-        if self.registration_name:
-            name_text = f"Tên: {self.registration_name}"
-            draw_text_with_background(frame, name_text, 
+        if registration_name:
+            name_text = f"Tên: {registration_name}"
+            draw_text_with_background(panel, name_text, 
                                     (dialog_x + 20, dialog_y + 100), 
                                     bg_color=(255, 255, 255), text_color=(0, 0, 0))
         
         # Draw additional info if available
-        if self.registration_info:
-            draw_text_with_background(frame, self.registration_info, 
+        if registration_info:
+            draw_text_with_background(panel, registration_info, 
                                     (dialog_x + 20, dialog_y + 130), 
                                     bg_color=(255, 255, 255), text_color=(0, 0, 100))
         
         # Draw instruction
         instruction = "Vui lòng nói tên và mục đích của bạn"
-        draw_text_with_background(frame, instruction, 
+        draw_text_with_background(panel, instruction, 
                                 (dialog_x + 20, dialog_y + 160), 
                                 bg_color=(255, 255, 255), text_color=(100, 100, 100))
     
@@ -213,50 +281,43 @@ class UI:
         """Add a log message to display"""
         timestamp = time.strftime("%H:%M:%S")
         formatted_msg = f"[{timestamp}] {message}"
-        self.log_messages.append(formatted_msg)
+        with self._lock:
+            self.log_messages.append(formatted_msg)
+            self.versions['log'] += 1
     
     def _draw_log_area(self, frame):
-        """Draw log area at bottom of frame"""
-        from PIL import Image, ImageDraw, ImageFont
-        import numpy as np
-        
+        """Draw log area at bottom of frame (panel vẽ sẵn, chỉ blend vùng log)"""
         height, width = frame.shape[:2]
+        # Thêm 1 dòng phía trên cho viền dày 2px
+        with self._lock:
+            version = self.versions['log']
+            self._log_view = list(self.log_messages)
+        self.log_panel.composite(frame, 0, height - self.log_area_height - 1, width, self.log_area_height + 1,
+                                 version)
+    
+    def _paint_log_area(self, panel):
+        """Vẽ vùng log lên panel (tọa độ cục bộ): nền bán trong suốt, viền, tiêu đề, các dòng log"""
+        height, width = panel.shape[:2]
         
         # Draw semi-transparent black background for log area
-        log_y_start = height - self.log_area_height
-        overlay = frame.copy()
+        log_y_start = 1
+        overlay = panel.copy()
         cv2.rectangle(overlay, (0, log_y_start), (width, height), (0, 0, 0), -1)
         # Alpha blend: 0.7 = 70% transparent
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+        cv2.addWeighted(overlay, 0.7, panel, 0.3, 0, panel)
         
         # Draw border
-        cv2.rectangle(frame, (0, log_y_start), (width, height), (100, 100, 100), 2)
+        cv2.rectangle(panel, (0, log_y_start), (width, height), (100, 100, 100), 2)
         
         # Draw title using cv2 (English only)
-        cv2.putText(frame, "SYSTEM LOG", (10, log_y_start + 25), 
+        cv2.putText(panel, "SYSTEM LOG", (10, log_y_start + 25), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
         
-        # Convert to PIL Image for Vietnamese text
-        frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(frame_pil)
-        
-        # Try to load a font that supports Vietnamese
-        try:
-            # Windows fonts
-            font = ImageFont.truetype("arial.ttf", 14)
-        except:
-            try:
-                # Linux fonts
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-            except:
-                # Fallback to default
-                font = ImageFont.load_default()
-        
-        # Draw log messages
+        # Draw log messages (sprite chữ cache sẵn, không chuyển cả frame sang PIL)
         y_offset = log_y_start + 50
         line_height = 20
         
-        for i, log_msg in enumerate(self.log_messages):
+        for i, log_msg in enumerate(self._log_view):
             if y_offset + line_height > height - 10:
                 break
             
@@ -277,14 +338,11 @@ class UI:
             if len(log_msg) > 100:
                 log_msg = log_msg[:97] + "..."
             
-            # Draw text with PIL (supports Vietnamese)
-            draw.text((10, y_offset), log_msg, font=font, fill=color)
+            # Draw text (supports Vietnamese)
+            default_renderer.draw(panel, log_msg, (10, y_offset), size=14, text_color=color, bg_color=None, padding=0)
             y_offset += line_height
-        
-        # Convert back to OpenCV format
-        frame_cv = cv2.cvtColor(np.array(frame_pil), cv2.COLOR_RGB2BGR)
-        frame[:] = frame_cv
     
     def close(self):
         """Close the UI window"""
-        cv2.destroyWindow(self.window_name)
\ No newline at end of file
+        if not self.headless:
+            cv2.destroyWindow(self.window_name)
\ No newline at end of file
@@ -0,0 +1,47 @@
+import math
+import threading
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    Buffer ndarray cấp phát sẵn, dùng lại giữa các frame cho đường render (frame hiển thị,
+    scratch uint16 khi blend panel/nhãn chữ). Mỗi tên giữ một buffer phẳng chỉ lớn lên khi cần.
+    get() trả về view đúng shape của buffer đó, nên ở trạng thái ổn định không cấp phát gì.
+    Nội dung buffer không được khởi tạo; người gọi phải ghi đè toàn bộ (dst=, np.copyto, fill).
+    Mỗi tên chỉ nên dùng trên một thread.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self.stats = {'allocations': 0, 'allocated_bytes': 0, 'reuses': 0}
+
+    def get(self, name, shape, dtype=np.uint8):
+        """View shape/dtype trên buffer tên name (cấp phát lại chỉ khi buffer cũ nhỏ hơn hoặc khác dtype)"""
+        dtype = np.dtype(dtype)
+        size = math.prod(shape)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            with self._lock:
+                self._buffers[name] = buffer
+                self.stats['allocations'] += 1
+                self.stats['allocated_bytes'] += buffer.nbytes
+        else:
+            with self._lock:
+                self.stats['reuses'] += 1
+        return buffer[:size].reshape(shape)
+
+    def report(self):
+        """Chuỗi tóm tắt số lần cấp phát / dùng lại và dung lượng đang giữ"""
+        with self._lock:
+            held = sum(buffer.nbytes for buffer in self._buffers.values())
+            return (
+                f"allocations={self.stats['allocations']} ({self.stats['allocated_bytes'] / 1e6:.1f} MB), "
+                f"reuses={self.stats['reuses']}, held={held / 1e6:.1f} MB in {len(self._buffers)} buffers"
+            )
+
+
+display_buffers = BufferPool()
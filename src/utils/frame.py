@@ -0,0 +1,90 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameViewStats:
+    """Đếm số view được tính mới / dùng lại theo từng stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, stage, reused):
+        with self._lock:
+            counts = self.counts.setdefault(stage, {'computed': 0, 'reused': 0})
+            counts['reused' if reused else 'computed'] += 1
+
+    def report(self):
+        """Chuỗi tóm tắt: stage=computed/reused (reused = số lần chuyển đổi tránh được)"""
+        with self._lock:
+            return ', '.join(
+                f"{stage}: computed={c['computed']}, avoided={c['reused']}" for stage, c in sorted(self.counts.items())
+            )
+
+
+frame_stats = FrameViewStats()
+
+
+class Frame:
+    """
+    Một frame camera (BGR gốc) kèm các view dẫn xuất tính lười và memo theo frame:
+    resize, RGB, xám thu nhỏ, crop. Mỗi view chỉ tính một lần dù nhiều
+    stage (motion, detect, encode, đăng ký) cùng dùng. Các view là chỉ đọc:
+    stage nào cần vẽ lên thì phải copy.
+    Hai thread cùng hỏi một view chưa có thì có thể tính hai lần (kết quả như nhau).
+    """
+
+    def __init__(self, image, timestamp=None):
+        self.image = image
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self._views = {}
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def view(self, key, build, stage='default'):
+        """View theo key, tính bằng build() ở lần đầu"""
+        view = self._views.get(key)
+        frame_stats.record(stage, view is not None)
+        if view is None:
+            view = build()
+            self._views[key] = view
+        return view
+
+    def resized(self, scale=1.0, stage='default'):
+        """BGR thu nhỏ theo tỉ lệ (INTER_LINEAR như cv2.resize mặc định)"""
+        if scale == 1.0:
+            return self.image
+        return self.view(('bgr', scale), lambda: cv2.resize(self.image, (0, 0), fx=scale, fy=scale), stage)
+
+    def rgb(self, scale=1.0, stage='default'):
+        """RGB (cho face_recognition), tùy chọn thu nhỏ"""
+        return self.view(('rgb', scale), lambda: cv2.cvtColor(self.resized(scale, stage), cv2.COLOR_BGR2RGB), stage)
+
+    def gray(self, size=None, blur=0, stage='default'):
+        """Ảnh xám, tùy chọn thu nhỏ về size (w, h) bằng INTER_AREA và làm mờ Gaussian blur x blur"""
+        def build():
+            image = self.image if size is None else cv2.resize(self.image, size, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            return cv2.GaussianBlur(gray, (blur, blur), 0) if blur else gray
+        return self.view(('gray', size, blur), build, stage)
+
+    def crop_rgb(self, box, scale=1.0, stage='default'):
+        """RGB của vùng (top, right, bottom, left), tùy chọn thu nhỏ"""
+        def build():
+            top, right, bottom, left = box
+            image = self.image[top:bottom, left:right]
+            if image.size and scale != 1.0:
+                image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.size else image
+        return self.view(('crop_rgb', tuple(box), scale), build, stage)
+
+
+def as_frame(image, timestamp=None):
+    """Bọc ndarray thành Frame (Frame có sẵn thì giữ nguyên)"""
+    if image is None or isinstance(image, Frame):
+        return image
+    return Frame(image, timestamp)
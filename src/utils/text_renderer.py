@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .buffer_pool import display_buffers
+
+
+class TextRenderer:
+    """
+    Vẽ chữ Unicode (tiếng Việt có dấu) lên frame OpenCV mà không chuyển cả frame sang PIL:
+    - font TrueType load một lần cho mỗi cỡ chữ
+    - sprite (BGR + alpha) của từng nhãn được cache LRU theo (text, cỡ, màu chữ, màu nền, padding)
+    - chỉ alpha-blend vùng chữ nhật của nhãn vào frame bằng NumPy, trong buffer scratch dùng lại
+    Màu truyền vào theo thứ tự RGB (giống draw_text_with_background cũ dùng PIL).
+    """
+
+    FONT_CANDIDATES = (
+        "arial.ttf",
+        "times.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    )
+
+    def __init__(self, capacity=256, buffers=display_buffers):
+        self.capacity = capacity
+        self.buffers = buffers
+        self._fonts = {}
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def font(self, size):
+        """Font cho cỡ chữ size, chỉ đọc file font ở lần đầu"""
+        font = self._fonts.get(size)
+        if font is None:
+            for path in self.FONT_CANDIDATES:
+                try:
+                    font = ImageFont.truetype(path, size)
+                    break
+                except OSError:
+                    continue
+            if font is None:
+                font = ImageFont.load_default()
+            self._fonts[size] = font
+        return font
+
+    def _rasterize(self, text, size, text_color, bg_color, padding):
+        font = self.font(size)
+        left, top, right, bottom = font.getbbox(text)
+        text_w = right - left
+        text_h = bottom - top
+        # Giữ đúng bố cục cũ: nền từ (x - padding, y - padding) tới (x + w + padding, y + h + padding),
+        # chữ vẽ tại (x, y) nên glyph có thể thò xuống dưới nền một đoạn bằng top
+        width = max(text_w, right) + 2 * padding + 1
+        height = max(text_h, bottom) + 2 * padding + 1
+        canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(canvas)
+        if bg_color is not None:
+            draw.rectangle([0, 0, text_w + 2 * padding, text_h + 2 * padding], fill=tuple(bg_color) + (255,))
+        draw.text((padding, padding), text, font=font, fill=tuple(text_color) + (255,))
+
+        rgba = np.asarray(canvas)
+        bgr = np.ascontiguousarray(rgba[:, :, 2::-1])
+        alpha = rgba[:, :, 3:4].astype(np.uint16)
+        return bgr, alpha, 255 - alpha
+
+    def sprite(self, text, size, text_color=(255, 255, 255), bg_color=(0, 0, 0), padding=5):
+        """Returns: (bgr, alpha, 255 - alpha) của nhãn, lấy từ cache nếu đã vẽ"""
+        key = (text, size, tuple(text_color), None if bg_color is None else tuple(bg_color), padding)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.stats['hits'] += 1
+                return sprite
+        sprite = self._rasterize(text, size, text_color, bg_color, padding)
+        with self._lock:
+            self._sprites[key] = sprite
+            self.stats['misses'] += 1
+            while len(self._sprites) > self.capacity:
+                self._sprites.popitem(last=False)
+                self.stats['evicted'] += 1
+        return sprite
+
+    def draw(self, image, text, position, size=21, text_color=(255, 255, 255), bg_color=(0, 0, 0), padding=5):
+        """Vẽ nhãn lên image (BGR, sửa tại chỗ), góc trên trái của chữ tại position. Returns: image"""
+        if not text:
+            return image
+        bgr, alpha, inv_alpha = self.sprite(text, size, text_color, bg_color, padding)
+        x0 = int(position[0]) - padding
+        y0 = int(position[1]) - padding
+        height, width = image.shape[:2]
+
+        # Cắt sprite theo biên frame
+        left, top = max(0, x0), max(0, y0)
+        right = min(width, x0 + bgr.shape[1])
+        bottom = min(height, y0 + bgr.shape[0])
+        if right <= left or bottom <= top:
+            return image
+        sx, sy = left - x0, top - y0
+        patch = bgr[sy:sy + bottom - top, sx:sx + right - left]
+        a = alpha[sy:sy + bottom - top, sx:sx + right - left]
+        inv_a = inv_alpha[sy:sy + bottom - top, sx:sx + right - left]
+
+        roi = image[top:bottom, left:right]
+        with self._lock:
+            # (patch * a + roi * (255 - a) + 127) // 255, không tạo mảng tạm
+            blended = self.buffers.get('text-blend', roi.shape, np.uint16)
+            scratch = self.buffers.get('text-scratch', roi.shape, np.uint16)
+            np.multiply(patch, a, out=blended)
+            np.multiply(roi, inv_a, out=scratch)
+            np.add(blended, scratch, out=blended)
+            np.add(blended, 127, out=blended)
+            np.floor_divide(blended, 255, out=blended)
+            np.copyto(roi, blended, casting='unsafe')
+        return image
+
+
+default_renderer = TextRenderer()
@@ -71,69 +71,12 @@ def load_image_from_path(image_path):
 def draw_text_with_background(image, text, position, font_scale=0.7, thickness=1, 
                              font=cv2.FONT_HERSHEY_SIMPLEX, text_color=(255, 255, 255),
                              bg_color=(0, 0, 0), padding=5):
-    """Draw text with a background on an image using Pillow for Unicode support"""
-    from PIL import Image, ImageDraw, ImageFont
-    import numpy as np
+    """Draw text with a background on an image (Unicode, sprite cache, chỉ blend vùng của nhãn)"""
+    from .text_renderer import default_renderer
     
-    # Convert OpenCV image to PIL image
-    pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    draw = ImageDraw.Draw(pil_img)
-    
-    # Try to load a TrueType font that supports Vietnamese
-    try:
-        # Try to use a system font that supports Vietnamese
-        font_size = int(font_scale * 30)  # Convert scale to approximate font size
-        try:
-            # Try Arial first (common font with good Unicode support)
-            pil_font = ImageFont.truetype("arial.ttf", font_size)
-        except:
-            try:
-                # Try Times New Roman as fallback
-                pil_font = ImageFont.truetype("times.ttf", font_size)
-            except:
-                # Use default font as last resort
-                pil_font = ImageFont.load_default()
-    except Exception as e:
-        print(f"Font loading error: {e}")
-        pil_font = ImageFont.load_default()
-    
-    # Get text size with the selected font
-    text_bbox = draw.textbbox((0, 0), text, font=pil_font)
-    text_w = text_bbox[2] - text_bbox[0]
-    text_h = text_bbox[3] - text_bbox[1]
-    
-    # Calculate background rectangle coordinates
-    x, y = position
-    
-    # Draw background rectangle
-    draw.rectangle([x - padding, y - padding, x + text_w + padding, y + text_h + padding], 
-                  fill=bg_color)
-    
-    # Draw text
-    draw.text((x, y), text, font=pil_font, fill=text_color)
-    
-    # Convert back to OpenCV image
-    result_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-    
-    # Copy the result back to the original image
-    image[:] = result_img
-    
-    return image
-
-def load_face_encodings():
-    """Load face encodings from pickle file"""
-    encodings_file = FACES_DIR / 'encodings.pkl'
-    
-    if encodings_file.exists():
-        try:
-            with open(encodings_file, 'rb') as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"Error loading face encodings: {e}")
-            return {}
-    else:
-        print(f"Face encodings file not found: {encodings_file}")
-        return {}
+    font_size = int(font_scale * 30)  # Convert scale to approximate font size
+    return default_renderer.draw(image, text, position, size=font_size, text_color=text_color,
+                                 bg_color=bg_color, padding=padding)
 
 def load_voice_patterns():
     """Load voice patterns from pickle file"""
@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+
+from src.modules.face_recognition.face_boxes import box_nms, dedupe_identities, valid_face_mask
+from src.modules.face_recognition.face_tracker import box_iou
+
+MIN_FACE_SIZE = 30
+MIN_FACE_DISTANCE = 50
+
+
+# Bản vòng lặp cũ (trước khi vector hóa) dùng làm chuẩn so sánh
+
+def _old_is_valid_face(location):
+    top, right, bottom, left = location
+    width = right - left
+    height = bottom - top
+    if width < MIN_FACE_SIZE or height < MIN_FACE_SIZE:
+        return False
+    ratio = width / height if height > 0 else 0
+    if ratio < 0.6 or ratio > 1.4:
+        return False
+    return True
+
+
+def _center(location):
+    top, right, bottom, left = location
+    return ((left + right) / 2, (top + bottom) / 2)
+
+
+def _old_remove_duplicate_faces(results):
+    if len(results) <= 1:
+        return results
+    person_groups = {}
+    for result in results:
+        person_groups.setdefault(result['person_id'], []).append(result)
+
+    filtered_results = []
+    for person_id, faces in person_groups.items():
+        if person_id == "unknown":
+            unique_unknowns = []
+            for face in faces:
+                face_center = _center(face['location'])
+                is_duplicate = False
+                for existing_face in unique_unknowns:
+                    existing_center = _center(existing_face['location'])
+                    distance = np.sqrt((face_center[0] - existing_center[0]) ** 2 +
+                                       (face_center[1] - existing_center[1]) ** 2)
+                    if distance < MIN_FACE_DISTANCE:
+                        is_duplicate = True
+                        if face['confidence'] > existing_face['confidence']:
+                            unique_unknowns.remove(existing_face)
+                            unique_unknowns.append(face)
+                        break
+                if not is_duplicate:
+                    unique_unknowns.append(face)
+            filtered_results.extend(unique_unknowns)
+        else:
+            filtered_results.append(max(faces, key=lambda x: x['confidence']))
+    return filtered_results
+
+
+def _loop_nms(locations, scores, iou_threshold):
+    order = sorted(range(len(locations)), key=lambda i: -scores[i])
+    keep = []
+    for i in order:
+        box = np.asarray([locations[i]], dtype=np.float32)
+        if all(box_iou(box, np.asarray([locations[k]], dtype=np.float32))[0, 0] <= iou_threshold for k in keep):
+            keep.append(i)
+    return sorted(keep)
+
+
+def _kept_by_old(results):
+    kept = _old_remove_duplicate_faces(results)
+    return sorted(next(i for i, r in enumerate(results) if r is face) for face in kept)
+
+
+def _kept_by_new(results):
+    keep = dedupe_identities(
+        [r['person_id'] for r in results],
+        [r['confidence'] for r in results],
+        [r['location'] for r in results],
+        MIN_FACE_DISTANCE
+    )
+    return keep.tolist()
+
+
+def _face(person_id, confidence, cx, cy, size=60):
+    half = size // 2
+    return {'person_id': person_id, 'confidence': confidence,
+            'location': (cy - half, cx + half, cy + half, cx - half)}
+
+
+def test_valid_face_mask_matches_loop():
+    rng = np.random.default_rng(0)
+    tops = rng.integers(0, 200, 500)
+    lefts = rng.integers(0, 200, 500)
+    heights = rng.integers(0, 80, 500)
+    widths = rng.integers(0, 80, 500)
+    locations = [(t, l + w, t + h, l) for t, l, h, w in zip(tops, lefts, heights, widths)]
+    # Biên: đúng ngưỡng kích thước/tỷ lệ và chiều cao 0
+    locations += [(0, 30, 30, 0), (0, 42, 30, 0), (0, 18, 30, 0), (0, 30, 50, 0), (0, 40, 0, 0)]
+
+    expected = [_old_is_valid_face(location) for location in locations]
+    assert valid_face_mask(locations, MIN_FACE_SIZE).tolist() == expected
+
+
+def test_valid_face_mask_empty():
+    assert valid_face_mask([], MIN_FACE_SIZE).tolist() == []
+
+
+def test_box_nms_matches_loop_on_overlapping_boxes():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        n = int(rng.integers(2, 12))
+        tops = rng.integers(0, 120, n)
+        lefts = rng.integers(0, 120, n)
+        sizes = rng.integers(20, 80, n)
+        locations = [(int(t), int(l + s), int(t + s), int(l)) for t, l, s in zip(tops, lefts, sizes)]
+        scores = [float(s * s) for s in sizes]
+        assert box_nms(locations, scores, 0.3).tolist() == _loop_nms(locations, scores, 0.3)
+
+
+def test_box_nms_tie_keeps_first():
+    locations = [(0, 60, 60, 0), (5, 65, 65, 5), (200, 260, 260, 200)]
+    assert box_nms(locations, [1.0, 1.0, 1.0], 0.3).tolist() == [0, 2]
+
+
+def test_box_nms_empty_and_single():
+    assert box_nms([], [], 0.3).tolist() == []
+    assert box_nms([(0, 60, 60, 0)], [1.0], 0.3).tolist() == [0]
+
+
+@pytest.mark.parametrize('results', [
+    [],
+    [_face('a', 0.9, 100, 100)],
+    # Cùng người: giữ confidence cao nhất, hòa thì cái trước
+    [_face('a', 0.7, 100, 100), _face('a', 0.9, 300, 100), _face('b', 0.8, 500, 100)],
+    [_face('a', 0.8, 100, 100), _face('a', 0.8, 300, 100), _face('b', 0.8, 500, 100)],
+    # Unknown chồng lên nhau: giữ cái tốt hơn, hòa thì cái trước
+    [_face('unknown', 0.3, 100, 100), _face('unknown', 0.5, 120, 110)],
+    [_face('unknown', 0.5, 100, 100), _face('unknown', 0.5, 120, 110)],
+    # Unknown xa nhau: giữ cả hai
+    [_face('unknown', 0.3, 100, 100), _face('unknown', 0.5, 300, 100)],
+    # Trộn known/unknown ở cùng vị trí: không loại chéo
+    [_face('a', 0.9, 100, 100), _face('unknown', 0.4, 100, 100), _face('unknown', 0.6, 110, 100)],
+])
+def test_dedupe_matches_loop(results):
+    assert _kept_by_new(results) == _kept_by_old(results)
+
+
+def test_dedupe_matches_loop_randomized():
+    # Các cụm unknown cách xa nhau (tâm trong cụm < MIN_FACE_DISTANCE), known trùng id và hòa confidence
+    rng = np.random.default_rng(2)
+    for _ in range(300):
+        results = []
+        for cluster in range(int(rng.integers(0, 4))):
+            for _ in range(int(rng.integers(1, 3))):
+                cx = 150 * cluster + int(rng.integers(0, 20))
+                cy = int(rng.integers(0, 20))
+                results.append(_face('unknown', float(rng.integers(0, 4)) / 4, cx, cy))
+        for _ in range(int(rng.integers(0, 6))):
+            person_id = str(rng.integers(0, 3))
+            results.append(_face(person_id, float(rng.integers(0, 4)) / 4,
+                                 int(rng.integers(0, 600)), int(rng.integers(0, 600))))
+        order = rng.permutation(len(results))
+        results = [results[i] for i in order]
+        assert _kept_by_new(results) == _kept_by_old(results)
@@ -0,0 +1,128 @@
+import numpy as np
+
+from src.modules.face_recognition.face_gallery import FaceGallery
+from src.modules.face_recognition.face_index import IVFIndex, benchmark_index
+
+
+def _clustered(n_people=100, samples=4, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.12, (n_people, 128)).astype(np.float32)
+    encodings = np.repeat(centers, samples, axis=0) + rng.normal(0, 0.02, (n_people * samples, 128)).astype(np.float32)
+    ids = [f'p{i // samples}' for i in range(len(encodings))]
+    return encodings, ids
+
+
+def _ivf_gallery(encodings, ids, n_probe=8):
+    gallery = FaceGallery(index=IVFIndex(n_probe=n_probe), index_min_size=1)
+    gallery.set(encodings, ids, ids)
+    return gallery
+
+
+def test_build_assigns_every_row_once():
+    encodings, _ = _clustered()
+    index = IVFIndex()
+    index.build(encodings)
+    assert index.size == index.built_size == len(encodings)
+    rows = np.sort(np.concatenate(index.lists))
+    np.testing.assert_array_equal(rows, np.arange(len(encodings)))
+
+
+def test_add_and_needs_rebuild():
+    encodings, _ = _clustered()
+    index = IVFIndex()
+    index.build(encodings[:100])
+    index.add(100, encodings[100:199])
+    assert index.size == 199 and not index.needs_rebuild()
+    index.add(199, encodings[199:200])
+    assert index.size == 200 and index.needs_rebuild()
+    rows = np.sort(np.concatenate(index.lists))
+    np.testing.assert_array_equal(rows, np.arange(200))
+
+
+def test_recall_against_exact_search():
+    encodings, ids = _clustered(seed=1)
+    gallery = _ivf_gallery(encodings, ids)
+    rng = np.random.default_rng(2)
+    queries = encodings[rng.choice(len(encodings), 100)] + rng.normal(0, 0.02, (100, 128)).astype(np.float32)
+
+    exact_idx, exact_dist, _ = gallery.match(queries, use_index=False)
+    approx_idx, approx_dist, _ = gallery.match(queries)
+    assert gallery.index_active()
+    assert np.mean(approx_dist <= exact_dist + 1e-5) >= 0.95
+    # Khoảng cách trả về luôn là khoảng cách thật tới dòng được chọn
+    np.testing.assert_allclose(approx_dist, np.linalg.norm(queries - encodings[approx_idx], axis=1), atol=1e-4)
+
+
+def test_save_load_round_trip(tmp_path):
+    encodings, _ = _clustered()
+    index = IVFIndex(n_probe=4)
+    index.build(encodings[:300])
+    index.add(300, encodings[300:320])
+    path = tmp_path / 'encodings.ivf.npz'
+    index.save(path)
+
+    loaded = IVFIndex.load(path, encodings[:320])
+    assert loaded is not None
+    assert loaded.size == 320 and loaded.built_size == 300 and loaded.n_probe == 4
+    np.testing.assert_array_equal(loaded.assignments, index.assignments)
+    # Gallery dài hơn (dòng chưa index) vẫn dùng được, FaceGallery.set_index sẽ add phần còn lại
+    assert IVFIndex.load(path, encodings) is not None
+
+
+def test_load_rejects_mismatched_gallery(tmp_path):
+    encodings, _ = _clustered()
+    index = IVFIndex()
+    index.build(encodings[:300])
+    index.add(300, encodings[300:320])
+    path = tmp_path / 'encodings.ivf.npz'
+    index.save(path)
+
+    assert IVFIndex.load(path, encodings[:310]) is None  # ngắn hơn số dòng đã gán cụm
+    changed = encodings[:320].copy()
+    changed[[0, 1]] = changed[[1, 0]]  # đổi chỗ: tổng không đổi
+    assert IVFIndex.load(path, changed) is None
+    changed = encodings[:320].copy()
+    changed[310] += 0.01  # dòng add() sau build
+    assert IVFIndex.load(path, changed) is None
+
+
+def test_load_returns_none_for_truncated_file(tmp_path):
+    encodings, _ = _clustered()
+    index = IVFIndex()
+    index.build(encodings)
+    path = tmp_path / 'encodings.ivf.npz'
+    index.save(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    assert IVFIndex.load(path, encodings) is None
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_benchmark_index_reports_recall_and_candidates():
+    encodings, ids = _clustered(seed=3)
+    gallery = _ivf_gallery(encodings, ids, n_probe=4)
+    report = benchmark_index(gallery, n_queries=50)
+    assert report['index'] == 'ivf'
+    assert report['gallery_size'] == len(encodings) and report['queries'] == 50
+    assert report['recall_at_1'] >= 0.9
+    assert 0 < report['avg_candidates'] < len(encodings)
+
+
+def test_benchmark_index_counts_unfiltered_queries_as_full_scan():
+    encodings, ids = _clustered(seed=4)
+    gallery = _ivf_gallery(encodings, ids)
+    # Mọi cụm đều rỗng: index không lọc được, mỗi query quét toàn gallery
+    index = gallery.index
+    index.lists = [np.empty((0,), dtype=np.int64) for _ in index.lists]
+    report = benchmark_index(gallery, n_queries=20)
+    assert report['avg_candidates'] == len(encodings)
+    assert report['recall_at_1'] == 1.0
+
+
+def test_benchmark_index_on_exact_gallery():
+    encodings, ids = _clustered(seed=5)
+    gallery = FaceGallery()
+    gallery.set(encodings, ids, ids)
+    report = benchmark_index(gallery, n_queries=10)
+    assert report['index'] == 'exact' and report['avg_candidates'] == len(encodings)
+    assert benchmark_index(FaceGallery()) == {}
@@ -0,0 +1,161 @@
+import json
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from src.modules.face_recognition import face_store
+from src.modules.face_recognition.face_store import FaceEncodingStore
+
+
+def _rows(n, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, (n, 128)).astype(np.float32)
+
+
+def _store(path, rows=()):
+    """Store có snapshot rỗng (generation 1) và các record rows trong journal"""
+    store = FaceEncodingStore(path)
+    store.write_snapshot(np.empty((0, 128), np.float32), [], [])
+    for i, row in enumerate(rows):
+        store.append(row, f'p{i}', f'P{i}')
+    return store
+
+
+def _assert_loaded(path, rows):
+    matrix, sq_norms, ids, names = FaceEncodingStore(path).load()
+    assert ids == [f'p{i}' for i in range(len(rows))]
+    assert names == [f'P{i}' for i in range(len(rows))]
+    np.testing.assert_array_equal(np.asarray(matrix), rows.reshape(-1, 128))
+    np.testing.assert_allclose(sq_norms, np.einsum('ij,ij->i', rows, rows), rtol=1e-6)
+
+
+def test_journal_records_round_trip(tmp_path):
+    rows = _rows(3)
+    _store(tmp_path, rows)
+    _assert_loaded(tmp_path, rows)
+
+
+def test_torn_tail_is_skipped_by_load_and_truncated_by_writer(tmp_path):
+    rows = _rows(3)
+    _store(tmp_path, rows)
+    journal = tmp_path / 'encodings.journal'
+    data = journal.read_bytes()
+    journal.write_bytes(data[:-10])  # crash giữa lúc ghi record cuối
+
+    _assert_loaded(tmp_path, rows[:2])
+    assert journal.stat().st_size == len(data) - 10  # load chỉ đọc
+
+    writer = FaceEncodingStore(tmp_path)
+    writer.load()
+    extra = _rows(1, seed=1)[0]
+    writer.append(extra, 'p2', 'P2')
+    _assert_loaded(tmp_path, np.vstack([rows[:2], extra]))
+
+
+def test_corrupted_record_fails_crc(tmp_path):
+    rows = _rows(3)
+    _store(tmp_path, rows)
+    journal = tmp_path / 'encodings.journal'
+    data = bytearray(journal.read_bytes())
+    data[-5] ^= 0xFF
+    journal.write_bytes(bytes(data))
+    _assert_loaded(tmp_path, rows[:2])
+
+
+def test_snapshot_commit_resets_journal(tmp_path):
+    rows = _rows(4)
+    store = _store(tmp_path, rows)
+    matrix, _, ids, names = store.load()
+    assert store.write_snapshot(matrix, ids, names)
+
+    meta = json.loads((tmp_path / 'encodings.meta.json').read_text(encoding='utf-8'))
+    assert meta['generation'] == 2 and meta['count'] == 4
+    assert not list(tmp_path.glob('encodings.g1*.npy'))
+    _assert_loaded(tmp_path, rows)
+    assert FaceEncodingStore(tmp_path).load()[0].shape == (4, 128)
+
+
+def test_stale_journal_after_crash_is_ignored(tmp_path):
+    rows = _rows(2)
+    store = _store(tmp_path, rows)
+    journal = tmp_path / 'encodings.journal'
+    stale = journal.read_bytes()
+    matrix, _, ids, names = store.load()
+    store.write_snapshot(matrix, ids, names)
+    # Crash sau khi commit meta.json nhưng trước khi reset journal: record đã nằm trong snapshot
+    journal.write_bytes(stale)
+    _assert_loaded(tmp_path, rows)
+    assert FaceEncodingStore(tmp_path).load()[0].shape == (2, 128)
+
+
+def test_read_updates_between_processes(tmp_path):
+    a = _store(tmp_path)
+    b = FaceEncodingStore(tmp_path)
+    b.load()
+    rows = _rows(3)
+
+    a.append(rows[0], 'p0', 'P0')
+    updates = b.read_updates()
+    assert [person_id for _, person_id, _ in updates] == ['p0']
+    np.testing.assert_array_equal(updates[0][0], rows[0])
+    assert b.read_updates() == []
+
+    b.append(rows[1], 'p1', 'P1')
+    a.append(rows[2], 'p2', 'P2')
+    # Mỗi bên chỉ thấy record của bên kia, không thấy lại record của chính mình
+    assert [person_id for _, person_id, _ in a.read_updates()] == ['p1']
+    assert [person_id for _, person_id, _ in b.read_updates()] == ['p2']
+
+
+def test_write_snapshot_loses_race(tmp_path):
+    a = _store(tmp_path)
+    b = FaceEncodingStore(tmp_path)
+    b.load()
+    rows = _rows(2)
+
+    b.append(rows[0], 'p0', 'P0')
+    # a chưa đọc record của b: compact lúc này sẽ làm mất nó
+    assert not a.write_snapshot(np.empty((0, 128), np.float32), [], [])
+    updates = a.read_updates()
+    assert a.write_snapshot(np.stack([u[0] for u in updates]), ['p0'], ['P0'])
+
+    # b thấy snapshot mới: phải load lại toàn bộ, và không được compact đè lên nó
+    assert b.read_updates() is None
+    assert not b.write_snapshot(rows[:1], ['p0'], ['P0'])
+    b.load()
+    b.append(rows[1], 'p1', 'P1')
+    _assert_loaded(tmp_path, rows)
+
+
+@pytest.mark.skipif(not face_store.FCNTL_AVAILABLE, reason="fcntl.flock không có trên nền tảng này")
+def test_writer_lock_serializes_appends(tmp_path):
+    holder = _store(tmp_path)
+    writer = FaceEncodingStore(tmp_path)
+    writer.load()
+    done = threading.Event()
+
+    def append():
+        writer.append(_rows(1)[0], 'p0', 'P0')
+        done.set()
+
+    with holder._writer_lock():
+        thread = threading.Thread(target=append)
+        thread.start()
+        assert not done.wait(0.3)
+    thread.join(5)
+    assert done.is_set()
+    _assert_loaded(tmp_path, _rows(1))
+
+
+def test_migrated_pickle_is_retired(tmp_path):
+    rows = _rows(2)
+    with open(tmp_path / 'encodings.pkl', 'wb') as f:
+        pickle.dump({'encodings': list(rows), 'ids': ['p0', 'p1'], 'names': ['P0', 'P1']}, f)
+    store = FaceEncodingStore(tmp_path)
+    matrix, _, ids, names = store.load()
+    assert store.needs_migration()
+    assert store.write_snapshot(matrix, ids, names)
+    assert not store.needs_migration()
+    assert (tmp_path / 'encodings.pkl.migrated').exists()
+    _assert_loaded(tmp_path, rows)
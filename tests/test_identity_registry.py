@@ -0,0 +1,66 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.modules.face_recognition.face_gallery import FaceGallery
+from src.modules.face_recognition.identity_registry import IdentityRegistry
+
+
+def _module(registry, monkeypatch):
+    """FaceRecognitionModule tối thiểu để chạy _sync_registry"""
+    module = pytest.importorskip('src.modules.face_recognition.face_recognition_module')
+    monkeypatch.setattr(module, 'STRICT_FOLDER_EXISTENCE', True)
+    gallery = FaceGallery()
+    rng = np.random.default_rng(0)
+    gallery.set(rng.normal(0, 0.1, (2, 128)), ['alice', 'bob'], ['Alice', 'Bob'])
+    stub = SimpleNamespace(
+        registry=registry, gallery=gallery, _registry_version=-1,
+        _changed_persons=set(), tracker=None, recent_faces=None
+    )
+    return module.FaceRecognitionModule._sync_registry, stub
+
+
+def test_missing_root_is_unavailable(tmp_path):
+    registry = IdentityRegistry(tmp_path / 'missing')
+    assert not registry.available
+    assert registry.persons == frozenset()
+
+
+def test_unreadable_root_keeps_previous_persons(tmp_path):
+    (tmp_path / 'faces' / 'alice').mkdir(parents=True)
+    registry = IdentityRegistry(tmp_path / 'faces')
+    assert registry.available and 'alice' in registry
+    version = registry.version
+    (tmp_path / 'faces').rename(tmp_path / 'gone')
+    assert registry.refresh() == (set(), set())
+    assert not registry.available
+    assert 'alice' in registry and registry.version == version
+
+
+def test_sync_skips_when_root_missing_at_start(tmp_path, monkeypatch):
+    sync, stub = _module(IdentityRegistry(tmp_path / 'missing'), monkeypatch)
+    sync(stub)
+    assert len(stub.gallery) == 2 and not stub._changed_persons
+
+
+def test_sync_skips_when_root_becomes_unreadable(tmp_path, monkeypatch):
+    root = tmp_path / 'faces'
+    for person in ('alice', 'bob'):
+        (root / person).mkdir(parents=True)
+    registry = IdentityRegistry(root)
+    sync, stub = _module(registry, monkeypatch)
+    sync(stub)
+    assert len(stub.gallery) == 2
+    # Xóa một người rồi mất quyền đọc thư mục gốc: lần quét lỗi không được evict ai
+    os.rmdir(root / 'bob')
+    root.rename(tmp_path / 'moved')
+    registry.refresh()
+    sync(stub)
+    assert len(stub.gallery) == 2
+    # Thư mục quay lại: lần quét thành công mới evict người thật sự bị xóa
+    (tmp_path / 'moved').rename(root)
+    registry.refresh()
+    sync(stub)
+    assert stub.gallery.ids == ['alice'] and stub._changed_persons == {'bob'}
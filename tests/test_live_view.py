@@ -0,0 +1,59 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip('cv2')
+
+from src.ui.live_view import LiveViewServer
+
+
+def _post(server, path, headers=None):
+    port = server._server.server_address[1]
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=b'', headers=headers or {}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(**kwargs):
+        server = LiveViewServer(port=0, **kwargs)
+        assert server.start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+def test_command_requires_matching_token(make_server):
+    server = make_server(token='secret')
+    assert _post(server, '/command/quit') == 403
+    assert _post(server, '/command/quit', {'X-Auth-Token': 'wrong'}) == 403
+    assert server.next_command() == 255
+
+    assert _post(server, '/command/quit', {'X-Auth-Token': 'secret'}) == 200
+    assert _post(server, '/command/help?token=secret') == 200
+    assert server.next_command() == ord('q')
+    assert server.next_command() == ord('h')
+
+
+def test_loopback_without_token_accepts_commands(make_server):
+    server = make_server()
+    assert _post(server, '/command/quit') == 200
+    assert server.next_command() == ord('q')
+
+
+def test_non_loopback_without_token_refuses_commands():
+    server = LiveViewServer(host='0.0.0.0')
+    assert not server.authorized('')
+    assert not server.authorized('anything')
+    assert LiveViewServer(host='0.0.0.0', token='secret').authorized('secret')
+    assert LiveViewServer(host='localhost').authorized('')
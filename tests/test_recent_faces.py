@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from src.modules.face_recognition.face_gallery import FaceGallery
+from src.modules.face_recognition.recent_faces import RecentFaceCache
+
+
+def _gallery(rng, use_prototypes=True):
+    base = rng.normal(0, 1, 128).astype(np.float32)
+    base /= np.linalg.norm(base)
+    direction = rng.normal(0, 1, 128).astype(np.float32)
+    direction /= np.linalg.norm(direction)
+    encodings = [
+        base,                      # hot: 0.40 từ query
+        base + 0.70 * direction,   # outside: 0.30 từ query
+    ]
+    gallery = FaceGallery(use_prototypes=use_prototypes)
+    gallery.set(encodings, ['hot', 'outside'], ['Hot', 'Outside'])
+    return gallery, base + 0.40 * direction
+
+
+def _remember(cache, gallery, person_id):
+    rows = gallery.person_rows(person_id)
+    cache.remember(person_id, rows, gallery.snapshot())
+
+
+def test_hot_hit_rejected_when_closer_person_outside_hot_set():
+    gallery, query = _gallery(np.random.default_rng(0))
+    cache = RecentFaceCache(max_distance=0.45, margin=0.06)
+    _remember(cache, gallery, 'hot')
+
+    assert cache.lookup([query]) == [None]
+    best_idx, best_dist, _ = gallery.match([query])
+    assert gallery.ids[best_idx[0]] == 'outside'
+    assert best_dist[0] < 0.40
+
+
+def test_hot_hit_matches_full_gallery_when_outside_is_farther():
+    gallery, query = _gallery(np.random.default_rng(1))
+    cache = RecentFaceCache(max_distance=0.45, margin=0.06)
+    _remember(cache, gallery, 'outside')
+
+    hit = cache.lookup([query])[0]
+    assert hit is not None
+    best_idx, best_dist, _ = gallery.match([query])
+    assert hit[0] == best_idx[0]
+    assert abs(hit[1] - best_dist[0]) < 1e-4
+
+
+@pytest.mark.parametrize('use_prototypes', [True, False])
+def test_lookup_with_and_without_prototypes(use_prototypes):
+    gallery, query = _gallery(np.random.default_rng(2), use_prototypes)
+    assert (gallery.prototypes is None) == (not use_prototypes)
+
+    cache = RecentFaceCache(max_distance=0.45, margin=0.06)
+    _remember(cache, gallery, 'outside')
+    hit = cache.lookup([query])[0]
+    assert hit is not None and gallery.ids[hit[0]] == 'outside'
+
+    cache = RecentFaceCache(max_distance=0.45, margin=0.06)
+    _remember(cache, gallery, 'hot')
+    assert cache.lookup([query]) == [None]
+
+
+@pytest.mark.parametrize('use_prototypes', [True, False])
+def test_hot_hits_agree_with_full_scan(use_prototypes):
+    rng = np.random.default_rng(3)
+    centers = rng.normal(0, 0.12, (200, 128)).astype(np.float32)
+    encodings = np.repeat(centers, 3, axis=0) + rng.normal(0, 0.02, (600, 128)).astype(np.float32)
+    ids = [f'p{i // 3}' for i in range(600)]
+    gallery = FaceGallery(use_prototypes=use_prototypes)
+    gallery.set(encodings, ids, ids)
+    cache = RecentFaceCache(max_distance=0.6, margin=0.0)
+    for person in range(0, 200, 10):
+        _remember(cache, gallery, f'p{person}')
+
+    queries = encodings[rng.choice(600, 300)] + rng.normal(0, 0.03, (300, 128)).astype(np.float32)
+    hits = cache.lookup(queries)
+    best_idx, best_dist, _ = gallery.match(queries, use_index=False)
+    assert any(hit is not None for hit in hits)
+    for hit, idx, dist in zip(hits, best_idx, best_dist):
+        if hit is not None:
+            assert hit[0] == idx
+            assert abs(hit[1] - dist) < 1e-4